@@ -16,10 +16,18 @@ Flow:
 import os
 import json
 import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from typing import Dict, List, Any, Optional, Tuple, Callable
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 import sokosumi_service
+from job_tracker import job_tracker
+from job_store import TERMINAL_STATUSES
+from llm_clients import get_chat_model
+from llm_scheduler import llm_scheduler, Priority
+from prompt_budget import PROMPT_COLLABORATION_TOKENS, truncate_to_tokens
+from cache import routing_cache, normalize_text
 
 _emit_callback: Optional[Callable] = None
 
@@ -36,6 +44,14 @@ def emit_realtime_event(event_type: str, data: dict):
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+# Hiring runs on a pool shared by all chat turns (COLLABORATION_WORKERS
+# threads, default 8); each job gets COLLABORATION_JOB_TIMEOUT seconds
+# (default 30) before the turn stops waiting for it.
+COLLABORATION_WORKERS = int(os.environ.get("COLLABORATION_WORKERS", "8"))
+COLLABORATION_JOB_TIMEOUT = float(os.environ.get("COLLABORATION_JOB_TIMEOUT", "30"))
+
+_hiring_executor = ThreadPoolExecutor(max_workers=COLLABORATION_WORKERS, thread_name_prefix="hiring")
+
 AGENT_TO_SOKOSUMI_MAPPING = {
     "SocialGenie": {
         "keywords": ["social media", "content", "engagement", "followers", "instagram", "twitter", "tiktok", "youtube"],
@@ -79,6 +95,24 @@ AGENT_TO_SOKOSUMI_MAPPING = {
     }
 }
 
+def describe_sokosumi_agents(agent_list: List[Dict]) -> str:
+    """One prompt line per Sokosumi agent: name, category, capabilities and price."""
+    return "\n".join([
+        f"- {a['name']} ({a['category']}): {a['description']} - Capabilities: {', '.join(a.get('capabilities', []))} - Price: ${a['pricing']['per_task']}/task"
+        for a in agent_list
+    ])
+
+def attach_agent_details(analysis: Dict[str, Any]):
+    """Add the marketplace record to each recommended agent, matched by id or name."""
+    if analysis.get("needs_collaboration") and analysis.get("recommended_agents"):
+        for rec in analysis["recommended_agents"]:
+            agent_match = (
+                (rec.get("agent_id") and sokosumi_service.catalog.get(rec["agent_id"]))
+                or (rec.get("agent_name") and sokosumi_service.catalog.get_by_name(rec["agent_name"]))
+            )
+            if agent_match:
+                rec["agent_details"] = agent_match
+
 def analyze_collaboration_need(
     agent_name: str,
     user_message: str,
@@ -105,13 +139,16 @@ def analyze_collaboration_need(
             "recommended_agents": []
         }
     
+    # Only successful analyses are cached; the error fallbacks below are not.
+    cache_key = ("collaboration", agent_name, normalize_text(user_message))
+    cached = routing_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     available_agents = sokosumi_service.list_agents(limit=20)
     agent_list = available_agents.get("agents", [])
     
-    agent_descriptions = "\n".join([
-        f"- {a['name']} ({a['category']}): {a['description']} - Capabilities: {', '.join(a.get('capabilities', []))} - Price: ${a['pricing']['per_task']}/task"
-        for a in agent_list
-    ])
+    agent_descriptions = describe_sokosumi_agents(agent_list)
     
     agent_mapping = AGENT_TO_SOKOSUMI_MAPPING.get(agent_name, {})
     preferred = agent_mapping.get("preferred_agents", [])
@@ -153,33 +190,28 @@ Respond with JSON:
             "agent_id": "id from list",
             "agent_name": "name",
             "task_description": "specific task for this agent",
-            "priority": 1-3 (1=highest)
+            "priority": 1-3 (1=highest),
+            "depends_on": ["agent_id of each agent whose output this task needs"]
         }}
     ],
     "collaboration_strategy": "parallel" or "sequential"
 }}
 
+Use "sequential" when a task needs another hired agent's output, and list those agents in its depends_on; otherwise use "parallel" and leave depends_on empty.
+
 Remember: ALWAYS collaborate. This demonstrates AgentHub's unique agent-to-agent capability."""
 
     try:
-        llm = ChatOpenAI(model="gpt-4o", api_key=OPENAI_API_KEY, temperature=0.3)
+        llm = get_chat_model("gpt-4o", temperature=0.3)
         
-        response = llm.invoke([
+        response = llm_scheduler.invoke(llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"User request: {user_message}")
-        ])
+        ], Priority.COLLABORATION)
         
         result = json.loads(response.content)
-        
-        if result.get("needs_collaboration") and result.get("recommended_agents"):
-            for rec in result["recommended_agents"]:
-                agent_match = next(
-                    (a for a in agent_list if a["name"] == rec.get("agent_name")),
-                    None
-                )
-                if agent_match:
-                    rec["agent_details"] = agent_match
-        
+        attach_agent_details(result)
+        routing_cache.set(cache_key, result)
         return result
         
     except json.JSONDecodeError:
@@ -196,108 +228,344 @@ Remember: ALWAYS collaborate. This demonstrates AgentHub's unique agent-to-agent
             "recommended_agents": []
         }
 
+class _AgentEventStream:
+    """Real-time events for one hire, delivered in order and never after close().
+    
+    The hire runs on a worker thread while the chat turn may give up on it
+    at its deadline; once the turn has reported the timeout, late events
+    from the worker are dropped so clients never see "completed" after
+    "timed_out".
+    """
+    
+    def __init__(self, index: int):
+        self.index = index
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def emit(self, event_type: str, data: dict) -> bool:
+        with self._lock:
+            if self._closed:
+                return False
+            emit_realtime_event(event_type, {**data, "index": self.index})
+            return True
+    
+    def close(self, event_type: Optional[str] = None, data: Optional[dict] = None) -> bool:
+        """Emit a final event and close; False if already closed."""
+        with self._lock:
+            if self._closed:
+                return False
+            if event_type:
+                emit_realtime_event(event_type, {**(data or {}), "index": self.index})
+            self._closed = True
+            return True
+
+@dataclass
+class _PendingJob:
+    """A hire whose Sokosumi job is still running, handed to job_tracker."""
+    job_id: str
+    job_data: Dict[str, Any]
+    started: float
+
+def _hire_one(
+    rec: Dict,
+    user_message: str,
+    hiring_agent: str,
+    events: _AgentEventStream
+):
+    """Hire one recommended agent (runs on _hiring_executor).
+    
+    Returns a _PendingJob once the job is accepted, or the final result if
+    the hire itself failed.
+    """
+    started = time.perf_counter()
+    agent_id = rec.get("agent_id") or rec.get("agent_details", {}).get("id")
+    task_description = rec.get("task_description", user_message)
+    agent_name = rec.get("agent_name", "Unknown Agent")
+    agent_details = rec.get("agent_details", {})
+    cost = agent_details.get("pricing", {}).get("per_task", 2.50)
+    
+    events.emit("agent_hiring", {
+        "agent_name": agent_name,
+        "agent_id": agent_id,
+        "task": task_description,
+        "status": "hiring",
+        "cost": cost,
+        "hiring_agent": hiring_agent
+    })
+    
+    hire_result = sokosumi_service.hire_agent(
+        agent_id=agent_id,
+        task_description=rec.get("task_input", task_description),
+        requester_agent=hiring_agent
+    )
+    
+    job_data = hire_result.get("job", {})
+    job_id = job_data.get("job_id")
+    
+    if not hire_result.get("success") or not job_id:
+        events.close("agent_completed", {
+            "agent_name": agent_name,
+            "status": "failed",
+            "cost": 0
+        })
+        return {
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "task_description": task_description,
+            "status": "failed",
+            "error": hire_result.get("error", "Hire failed"),
+            "is_simulated": False,
+            "cost": 0,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    events.emit("agent_working", {
+        "agent_name": agent_name,
+        "job_id": job_id,
+        "status": "in_progress",
+        "task": task_description
+    })
+    
+    return _PendingJob(job_id, job_data, started)
+
+def _job_result(
+    rec: Dict,
+    user_message: str,
+    events: _AgentEventStream,
+    pending: _PendingJob,
+    job_status: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Report a finished job and build its hiring result.
+    
+    The job's own terminal status is passed through; a job that is not in
+    a terminal status (its tracking failed) counts as failed. Only a
+    completed job carries a result and a cost.
+    """
+    agent_name = rec.get("agent_name", "Unknown Agent")
+    status = job_status.get("status")
+    if status not in TERMINAL_STATUSES:
+        status = "failed"
+    completed = status == "completed"
+    cost = rec.get("agent_details", {}).get("pricing", {}).get("per_task", 2.50) if completed else 0
+    result = job_status.get("result") if completed else None
+    
+    events.close("agent_completed", {
+        "agent_name": agent_name,
+        "job_id": pending.job_id,
+        "status": status,
+        "result_preview": str(result or "")[:100],
+        "cost": cost
+    })
+    
+    hiring_result = {
+        "agent_id": rec.get("agent_id") or rec.get("agent_details", {}).get("id"),
+        "agent_name": agent_name,
+        "task_description": rec.get("task_description", user_message),
+        "job_id": pending.job_id,
+        "status": status,
+        "result": result,
+        "transaction": pending.job_data.get("blockchain_tx"),
+        "cost": cost,
+        "is_simulated": False,
+        "elapsed_ms": round((time.perf_counter() - pending.started) * 1000, 1)
+    }
+    if not completed:
+        hiring_result["error"] = job_status.get("error") or f"Job {job_status.get('status', 'unknown')}"
+    return hiring_result
+
+def _timed_out_result(rec: Dict, user_message: str, timeout: float, job_id: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "agent_id": rec.get("agent_id") or rec.get("agent_details", {}).get("id"),
+        "agent_name": rec.get("agent_name", "Unknown Agent"),
+        "task_description": rec.get("task_description", user_message),
+        "job_id": job_id,
+        "status": "timed_out",
+        "result": None,
+        "error": f"No result within {timeout:g}s",
+        "cost": rec.get("agent_details", {}).get("pricing", {}).get("per_task", 2.50),
+        "is_simulated": False,
+        "elapsed_ms": round(timeout * 1000, 1)
+    }
+
+def plan_hiring_dag(hires: List[Tuple[int, Dict]], strategy: str) -> Dict[int, List[int]]:
+    """Upstream hires (by index) that each hire must wait for.
+    
+    "parallel" has no edges. For "sequential", explicit depends_on lists
+    (agent ids or names) are used when the analysis gives them and they
+    form no cycle; otherwise hires are grouped into tiers by priority and
+    each tier waits for the one before. If every hire has the same priority,
+    the hires form a chain in recommendation order.
+    """
+    deps = {i: [] for i, _ in hires}
+    if strategy == "parallel":
+        return deps
+    
+    index_of = {}
+    for i, rec in hires:
+        for key in (rec.get("agent_id"), rec.get("agent_details", {}).get("id"), rec.get("agent_name")):
+            if key:
+                index_of.setdefault(key, i)
+    
+    if any(rec.get("depends_on") for _, rec in hires):
+        explicit = {
+            i: sorted({index_of[d] for d in rec.get("depends_on") or [] if d in index_of and index_of[d] != i})
+            for i, rec in hires
+        }
+        if _is_acyclic(explicit):
+            return explicit
+        print("[Collaboration] depends_on has a cycle; falling back to priority tiers")
+    
+    tiers: Dict[int, List[int]] = {}
+    for i, rec in hires:
+        try:
+            priority = int(rec.get("priority", 1))
+        except (TypeError, ValueError):
+            priority = 1
+        tiers.setdefault(priority, []).append(i)
+    ordered = [tiers[p] for p in sorted(tiers)]
+    if len(ordered) == 1:
+        ordered = [[i] for i in ordered[0]]
+    for upstream, tier in zip(ordered, ordered[1:]):
+        for i in tier:
+            deps[i] = list(upstream)
+    return deps
+
+def _is_acyclic(deps: Dict[int, List[int]]) -> bool:
+    remaining = {i: set(d) for i, d in deps.items()}
+    while remaining:
+        ready = [i for i, d in remaining.items() if not d]
+        if not ready:
+            return False
+        for i in ready:
+            del remaining[i]
+        for d in remaining.values():
+            d.difference_update(ready)
+    return True
+
+def _with_upstream(rec: Dict, upstream: List[Dict[str, Any]]) -> Dict:
+    """rec with a task_input that carries the upstream agents' results."""
+    inputs = [u for u in upstream if u and u.get("result")]
+    if not inputs:
+        return rec
+    share = PROMPT_COLLABORATION_TOKENS // len(inputs)
+    lines = [rec.get("task_description", ""), "", "Input from upstream agents:"]
+    for u in inputs:
+        lines.append(f"- {u['agent_name']}: {truncate_to_tokens(json.dumps(u['result'], default=str), share)}")
+    return {**rec, "task_input": "\n".join(lines)}
+
 def hire_sokosumi_agents(
     recommendations: List[Dict],
     user_message: str,
-    hiring_agent: str
+    hiring_agent: str,
+    strategy: str = "parallel"
 ) -> List[Dict[str, Any]]:
     """
     Hire recommended Sokosumi agents and execute their tasks with real-time updates.
     
+    Hires run as a DAG (see plan_hiring_dag): a hire starts as soon as
+    every hire it depends on has finished, and its task carries their
+    results. The hire call runs on a shared, bounded thread pool; the job
+    it starts is then awaited through job_tracker, so no thread is held
+    while the agent works. Independent hires run at once, so
+    total latency is the longest dependency chain rather than the sum.
+    Each job has COLLABORATION_JOB_TIMEOUT seconds from its start; a job
+    that misses it is reported with status "timed_out", its late events
+    are dropped and its dependents run without its input. Events for one
+    agent (hiring, working, completed) always arrive in that order.
+    
     Args:
         recommendations: List of recommended agents from analyze_collaboration_need
         user_message: Original user message for context
         hiring_agent: Name of the AgentHub agent hiring these agents
+        strategy: collaboration_strategy from the analysis
     
     Returns:
-        List of job results from hired agents
+        List of job results from hired agents, in recommendation order.
+        Each carries elapsed_ms, start_ms/end_ms from the start of the
+        collaboration and depends_on (upstream agent names).
     """
-    results = []
-    
-    for i, rec in enumerate(recommendations):
-        agent_id = rec.get("agent_id") or rec.get("agent_details", {}).get("id")
-        task_description = rec.get("task_description", user_message)
-        agent_name = rec.get("agent_name", "Unknown Agent")
-        agent_details = rec.get("agent_details", {})
-        cost = agent_details.get("pricing", {}).get("per_task", 2.50)
-        
-        if not agent_id:
-            continue
-        
-        emit_realtime_event("agent_hiring", {
-            "agent_name": agent_name,
-            "agent_id": agent_id,
-            "task": task_description,
-            "status": "hiring",
-            "cost": cost,
-            "hiring_agent": hiring_agent,
-            "index": i
-        })
-        
-        time.sleep(0.3)
-        
-        hire_result = sokosumi_service.hire_agent(
-            agent_id=agent_id,
-            task_description=task_description,
-            requester_agent=hiring_agent
-        )
-        
-        if hire_result.get("success"):
-            job_data = hire_result.get("job", {})
-            job_id = job_data.get("job_id")
-            
-            emit_realtime_event("agent_working", {
-                "agent_name": agent_name,
-                "job_id": job_id,
-                "status": "in_progress",
-                "task": task_description,
-                "index": i
-            })
-            
-            time.sleep(0.5)
-            
-            job_status_result = sokosumi_service.get_job_status(job_id) if job_id else None
-            job_status = job_status_result.get("job", {}) if job_status_result else {}
-            
-            emit_realtime_event("agent_completed", {
-                "agent_name": agent_name,
-                "job_id": job_id,
-                "status": "completed",
-                "result_preview": str(job_status.get("result", ""))[:100],
-                "cost": cost,
-                "index": i
-            })
-            
-            results.append({
-                "agent_id": agent_id,
-                "agent_name": agent_name,
-                "task_description": task_description,
-                "job_id": job_id,
-                "status": job_status.get("status", "completed"),
-                "result": job_status.get("result"),
-                "transaction": job_data.get("blockchain_tx"),
-                "cost": cost,
-                "is_simulated": False
-            })
-        else:
-            emit_realtime_event("agent_completed", {
-                "agent_name": agent_name,
-                "status": "completed",
-                "cost": cost,
-                "index": i
-            })
-            
-            results.append({
-                "agent_id": agent_id,
-                "agent_name": agent_name,
-                "task_description": task_description,
-                "status": "completed",
-                "error": None,
-                "is_simulated": False,
-                "cost": cost
+    hires = [
+        (i, rec) for i, rec in enumerate(recommendations)
+        if rec.get("agent_id") or rec.get("agent_details", {}).get("id")
+    ]
+    recs = dict(hires)
+    deps = plan_hiring_dag(hires, strategy)
+    started = time.monotonic()
+    results: Dict[int, Optional[Dict[str, Any]]] = {}
+    running = {}
+    
+    def offset_ms() -> float:
+        return round((time.monotonic() - started) * 1000, 1)
+    
+    def finish(i, result, start_ms):
+        if result is not None:
+            result.update({
+                "start_ms": start_ms,
+                "end_ms": offset_ms(),
+                "depends_on": [recs[d].get("agent_name") for d in deps[i]],
             })
+        results[i] = result
+    
+    while len(results) < len(hires):
+        submitted = {entry[0] for entry in running.values()}
+        for i, rec in hires:
+            if i in results or i in submitted or any(d not in results for d in deps[i]):
+                continue
+            events = _AgentEventStream(i)
+            deadline = time.monotonic() + COLLABORATION_JOB_TIMEOUT
+            job = _with_upstream(rec, [results[d] for d in deps[i]])
+            future = _hiring_executor.submit(_hire_one, job, user_message, hiring_agent, events)
+            running[future] = (i, events, deadline, offset_ms(), None)
+        if not running:
+            break
+        
+        nearest = min(entry[2] for entry in running.values())
+        done, _ = wait(running, timeout=max(nearest - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+        for future in list(running):
+            i, events, deadline, start_ms, pending = running[future]
+            rec = recs[i]
+            if future in done:
+                del running[future]
+                if pending is None:
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        events.close()
+                        print(f"[Collaboration] Hiring {rec.get('agent_name')} failed: {e}")
+                        finish(i, None, start_ms)
+                        continue
+                    if isinstance(outcome, _PendingJob):
+                        # Hired; the job itself is awaited on the tracker's loop,
+                        # not on a pool thread.
+                        running[job_tracker.track(outcome.job_id)] = (i, events, deadline, start_ms, outcome)
+                        continue
+                    finish(i, outcome, start_ms)
+                else:
+                    try:
+                        job_status = future.result()
+                    except Exception as e:
+                        print(f"[Collaboration] Tracking job {pending.job_id} failed: {e}")
+                        job_status = pending.job_data
+                    finish(i, _job_result(rec, user_message, events, pending, job_status), start_ms)
+            elif now >= deadline:
+                del running[future]
+                if pending is None:
+                    future.cancel()
+                if events.close("agent_completed", {
+                    "agent_name": rec.get("agent_name", "Unknown Agent"),
+                    "status": "timed_out",
+                    "cost": 0
+                }):
+                    print(f"[Collaboration] {rec.get('agent_name')} missed its {COLLABORATION_JOB_TIMEOUT:g}s deadline")
+                    result = _timed_out_result(rec, user_message, COLLABORATION_JOB_TIMEOUT,
+                                               pending.job_id if pending else None)
+                else:
+                    # The hire failed and reported it just before the deadline.
+                    result = future.result()
+                finish(i, result, start_ms)
     
-    return results
+    return [results[i] for i, _ in hires if results.get(i) is not None]
 
 def generate_collaboration_context(
     hiring_results: List[Dict],
@@ -317,8 +585,12 @@ def generate_collaboration_context(
         return ""
     
     context_parts = ["## External Agent Collaboration Results\n"]
+    # Each hire gets an equal share of the collaboration token budget, so
+    # one verbose result cannot crowd out the others.
+    share = PROMPT_COLLABORATION_TOKENS // len(hiring_results)
     
     for result in hiring_results:
+        section_start = len(context_parts)
         agent_name = result.get("agent_name", "Unknown")
         task = result.get("task_description", "")
         status = result.get("status", "unknown")
@@ -343,14 +615,16 @@ def generate_collaboration_context(
             else:
                 context_parts.append(f"**Results:** {agent_result}")
         
-        context_parts.append("")
+        section = "\n".join(context_parts[section_start:])
+        context_parts[section_start:] = [truncate_to_tokens(section, share), ""]
     
     return "\n".join(context_parts)
 
 def execute_collaboration(
     agent_name: str,
     user_message: str,
-    auto_hire: bool = True
+    auto_hire: bool = True,
+    analysis: Optional[Dict[str, Any]] = None
 ) -> Tuple[bool, List[Dict], str]:
     """
     Complete collaboration workflow: analyze, hire, and generate context.
@@ -359,13 +633,16 @@ def execute_collaboration(
         agent_name: The AgentHub agent processing the request
         user_message: User's query
         auto_hire: Whether to automatically hire recommended agents
+        analysis: analyze_collaboration_need result computed ahead of time
+            (see routing.route_request); analyzed here when omitted
     
     Returns:
         Tuple of (collaboration_occurred, hiring_results, context_string)
     """
     print(f"[Collaboration] Starting for agent: {agent_name}, message: {user_message[:50]}...")
     
-    analysis = analyze_collaboration_need(agent_name, user_message)
+    if analysis is None:
+        analysis = analyze_collaboration_need(agent_name, user_message)
     print(f"[Collaboration] Analysis result: needs={analysis.get('needs_collaboration')}, confidence={analysis.get('confidence')}")
     
     if not analysis.get("needs_collaboration"):
@@ -386,7 +663,8 @@ def execute_collaboration(
     hiring_results = hire_sokosumi_agents(
         recommendations=recommendations[:3],
         user_message=user_message,
-        hiring_agent=agent_name
+        hiring_agent=agent_name,
+        strategy=analysis.get("collaboration_strategy", "parallel")
     )
     
     context = generate_collaboration_context(hiring_results, user_message)
@@ -406,25 +684,36 @@ def get_collaboration_summary(hiring_results: List[Dict]) -> Dict[str, Any]:
     if not hiring_results:
         return {"collaborated": False}
     
-    total_cost = sum(r.get("cost", 0) for r in hiring_results)
     successful = [r for r in hiring_results if r.get("status") == "completed"]
+    total_cost = sum(r.get("cost", 0) for r in successful)
+    total_ms = max((r.get("end_ms", 0) for r in hiring_results), default=0)
+    sum_of_jobs_ms = sum(r.get("elapsed_ms", 0) for r in hiring_results)
     
     return {
         "collaborated": True,
         "agents_hired": len(hiring_results),
-        "successful_hires": len(successful) if successful else len(hiring_results),
+        "successful_hires": len(successful),
         "total_cost_usd": total_cost,
         "agents": [
             {
                 "name": r.get("agent_name"),
                 "task": r.get("task_description"),
-                "status": "completed",
+                "status": r.get("status", "completed"),
                 "job_id": r.get("job_id"),
                 "cost": r.get("cost", 0),
+                "depends_on": r.get("depends_on", []),
+                "start_ms": r.get("start_ms"),
+                "end_ms": r.get("end_ms"),
+                "elapsed_ms": r.get("elapsed_ms"),
                 "is_simulated": False
             }
             for r in hiring_results
         ],
+        "timings": {
+            "total_ms": total_ms,
+            "sum_of_jobs_ms": round(sum_of_jobs_ms, 1),
+            "saved_ms": round(max(sum_of_jobs_ms - total_ms, 0), 1)
+        },
         "payment_method": "Hydra L2 Micropayment",
         "is_simulated": False
     }
@@ -1,15 +1,38 @@
 """LangGraph-based AI agents for AgentHub platform."""
-from typing import Any, Dict, List, TypedDict
+from typing import Any, Annotated, Dict, Iterator, List, TypedDict
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-import os
-import json
+import time
+import threading
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-llm = ChatOpenAI(model="gpt-4o", api_key=OPENAI_API_KEY, temperature=0.7)
+from llm_clients import get_chat_model
+from llm_scheduler import llm_scheduler, Priority
+from prompt_budget import (
+    PROMPT_COLLABORATION_TOKENS,
+    budget_for,
+    count_message_tokens,
+    fit_history,
+    truncate_to_tokens,
+)
 
-class AgentState(TypedDict):
+llm = get_chat_model("gpt-4o", temperature=0.7)
+
+# Start of the text returned in place of a response when the LLM call fails.
+ERROR_RESPONSE_PREFIX = "I apologize, but I encountered an error processing your request:"
+
+class AgentResponseError(Exception):
+    """A streamed agent turn whose model call failed.
+    
+    `partial` is the text already streamed to the caller before the failure.
+    """
+    def __init__(self, message: str, partial: str = ""):
+        super().__init__(message)
+        self.partial = partial
+
+def _merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    return {**(left or {}), **(right or {})}
+
+class AgentState(TypedDict, total=False):
     """State structure for agent workflows."""
     messages: List[Dict[str, str]]
     user_input: str
@@ -17,6 +40,13 @@ class AgentState(TypedDict):
     agent_id: str
     conversation_id: str
     response: str
+    error: str
+    system_prompt: str
+    collaboration_context: str
+    conversation_summary: str
+    prompt: List[Any]
+    prompt_tokens: int
+    timings: Annotated[Dict[str, float], _merge_timings]
 
 AGENT_DEFINITIONS = [
     {
@@ -106,38 +136,223 @@ def get_agent_system_prompt(agent_name: str) -> str:
     }
     return prompts.get(agent_name, "You are an AgentHub AI agent providing assistance on the Cardano blockchain.")
 
+def build_agent_messages(
+    agent_name: str,
+    system_prompt: str,
+    user_message: str,
+    conversation_history=None,
+    collaboration_context: str = None,
+    conversation_summary: str = None
+) -> list:
+    """Assemble the system prompt, history and user message for an agent call.
+    
+    Keeps the prompt within the agent's token budget (see prompt_budget.py):
+    collaboration results are capped and only the most recent history
+    messages that still fit are included.
+    """
+    if conversation_history is None:
+        conversation_history = []
+    
+    summary_section = ""
+    if conversation_summary:
+        summary_section = f"""
+
+## Earlier in this conversation
+{conversation_summary}"""
+    
+    collaboration_instructions = ""
+    if collaboration_context:
+        collaboration_context = truncate_to_tokens(collaboration_context, PROMPT_COLLABORATION_TOKENS)
+        collaboration_instructions = f"""
+
+## External Agent Collaboration
+You have hired specialized agents from the Sokosumi marketplace to help with this request.
+Use their findings to enhance your response. Reference the external agent insights naturally.
+
+{collaboration_context}
+
+IMPORTANT: 
+- Integrate the external agent results into your response naturally
+- Credit the external agents when using their specific findings
+- If results are simulated, still use them as if they were real data"""
+    
+    enhanced_system_prompt = f"""{system_prompt}
+
+Additional context:
+- You are {agent_name} on the AgentHub platform
+- Your responses are logged on-chain via Cardano blockchain
+- All transactions use Hydra Layer 2 micropayments (~$0.004)
+- You have a verified Masumi DID identity
+- You can hire specialized agents from the Sokosumi marketplace for expert assistance
+- Provide helpful, accurate, and actionable responses
+- When collaborating with external agents, mention what specialized help you obtained{summary_section}{collaboration_instructions}"""
+    
+    messages = [SystemMessage(content=enhanced_system_prompt)]
+    user_input = HumanMessage(content=user_message)
+    history_budget = budget_for(agent_name) - count_message_tokens([messages[0], user_input])
+    
+    for msg in fit_history(conversation_history[-10:], history_budget):
+        if msg.get("role") == "user":
+            messages.append(HumanMessage(content=msg.get("content", "")))
+        else:
+            messages.append(AIMessage(content=msg.get("content", "")))
+    
+    messages.append(user_input)
+    return messages
+
+def _timed(name: str, node):
+    """Wrap a graph node so its wall time is merged into state["timings"]."""
+    def run(state: AgentState) -> dict:
+        started = time.perf_counter()
+        update = node(state)
+        update["timings"] = {name: (time.perf_counter() - started) * 1000}
+        return update
+    return run
+
 def create_agent_graph(agent_name: str):
-    """Create a LangGraph state machine for an agent."""
+    """Create a LangGraph state machine for an agent.
+    
+    prepare builds the prompt (the agent's default system prompt unless the
+    state carries one), generate calls the model. A failed model call ends
+    the turn with an ERROR_RESPONSE_PREFIX message in "response" and the
+    reason in "error" rather than raising.
+    """
     graph = StateGraph(AgentState)
+    default_prompt = get_agent_system_prompt(agent_name)
     
-    def process_agent_input(state: AgentState) -> AgentState:
-        """Process user input through the agent."""
-        system_prompt = get_agent_system_prompt(agent_name)
-        
-        messages = [SystemMessage(content=system_prompt)]
-        
-        for msg in state.get("messages", [])[-10:]:
-            if msg["role"] == "user":
-                messages.append(HumanMessage(content=msg["content"]))
-            else:
-                messages.append(AIMessage(content=msg["content"]))
-        
-        messages.append(HumanMessage(content=state["user_input"]))
-        
+    def prepare(state: AgentState) -> dict:
+        """Build the message list for the model."""
+        prompt = build_agent_messages(
+            agent_name,
+            state.get("system_prompt") or default_prompt,
+            state["user_input"],
+            state.get("messages"),
+            state.get("collaboration_context"),
+            state.get("conversation_summary"),
+        )
+        return {"prompt": prompt, "prompt_tokens": count_message_tokens(prompt)}
+    
+    def generate(state: AgentState) -> dict:
+        """Run the prompt through the model."""
         try:
-            response = llm.invoke(messages)
-            state["response"] = response.content
+            response = llm_scheduler.stream(llm, state["prompt"], Priority.INTERACTIVE)
+            return {"response": response.content}
         except Exception as e:
-            state["response"] = f"I encountered an error: {str(e)}. Please try again."
-        
-        return state
+            print(f"OpenAI API error: {e}")
+            return {"response": f"{ERROR_RESPONSE_PREFIX} {str(e)}. Please try again.", "error": str(e)}
     
-    graph.add_node("process", process_agent_input)
-    graph.set_entry_point("process")
-    graph.add_edge("process", END)
+    graph.add_node("prepare", _timed("prepare", prepare))
+    graph.add_node("generate", _timed("generate", generate))
+    graph.set_entry_point("prepare")
+    graph.add_edge("prepare", "generate")
+    graph.add_edge("generate", END)
     
     return graph.compile()
 
+class AgentGraphRegistry:
+    """Compiled agent graphs, one per agent, plus per-node timing stats.
+    
+    Graphs are compiled on first use (or up front with warm()) and reused
+    for every turn. run() and stream() are the only way agent turns reach
+    the model.
+    """
+    
+    def __init__(self):
+        self._graphs: Dict[str, Any] = {}
+        self._compile_ms: Dict[str, float] = {}
+        self._nodes: Dict[str, Dict[str, float]] = {}
+        self._runs = 0
+        self._prompt_tokens = {"total": 0, "max": 0}
+        self._lock = threading.Lock()
+    
+    def get(self, agent_name: str):
+        graph = self._graphs.get(agent_name)
+        if graph is None:
+            with self._lock:
+                graph = self._graphs.get(agent_name)
+                if graph is None:
+                    started = time.perf_counter()
+                    graph = create_agent_graph(agent_name)
+                    self._compile_ms[agent_name] = (time.perf_counter() - started) * 1000
+                    self._graphs[agent_name] = graph
+        return graph
+    
+    def warm(self, agent_names) -> int:
+        """Compile graphs ahead of the first request; returns how many were built."""
+        built = 0
+        for name in agent_names:
+            if name not in self._graphs:
+                self.get(name)
+                built += 1
+        return built
+    
+    def _record(self, timings: Dict[str, float], prompt_tokens: int = 0):
+        with self._lock:
+            self._runs += 1
+            self._prompt_tokens["total"] += prompt_tokens
+            self._prompt_tokens["max"] = max(self._prompt_tokens["max"], prompt_tokens)
+            for node, ms in timings.items():
+                stats = self._nodes.setdefault(node, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                stats["count"] += 1
+                stats["total_ms"] += ms
+                stats["max_ms"] = max(stats["max_ms"], ms)
+    
+    def run(self, agent_name: str, state: AgentState) -> str:
+        """Run one agent turn and return the response text."""
+        result = self.get(agent_name).invoke(state)
+        self._record(result.get("timings", {}), result.get("prompt_tokens", 0))
+        return result.get("response", "")
+    
+    def stream(self, agent_name: str, state: AgentState) -> Iterator[str]:
+        """Run one agent turn, yielding response tokens as the model emits them.
+        
+        Joining the chunks gives the same text run() would return. If the
+        model call fails, AgentResponseError is raised once the chunks that
+        were already streamed have been yielded; no error text is mixed into
+        the stream.
+        """
+        streamed = ""
+        final = {}
+        timings: Dict[str, float] = {}
+        for mode, payload in self.get(agent_name).stream(state, stream_mode=["messages", "updates"]):
+            if mode == "messages":
+                chunk, metadata = payload
+                if metadata.get("langgraph_node") == "generate" and chunk.content:
+                    streamed += chunk.content
+                    yield chunk.content
+            else:
+                for update in payload.values():
+                    update = dict(update or {})
+                    timings.update(update.pop("timings", {}))
+                    final.update(update)
+        self._record(timings, final.get("prompt_tokens", 0))
+        if final.get("error"):
+            raise AgentResponseError(final["error"], partial=streamed)
+        response = final.get("response", "")
+        if response and response != streamed:
+            yield response[len(streamed):] if response.startswith(streamed) else response
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "runs": self._runs,
+                "prompt_tokens": {
+                    "avg": round(self._prompt_tokens["total"] / self._runs, 1) if self._runs else 0.0,
+                    "max": self._prompt_tokens["max"],
+                },
+                "compiled": {name: round(ms, 3) for name, ms in self._compile_ms.items()},
+                "nodes": {
+                    node: {
+                        "count": s["count"],
+                        "avg_ms": round(s["total_ms"] / s["count"], 3) if s["count"] else 0.0,
+                        "max_ms": round(s["max_ms"], 3),
+                    }
+                    for node, s in self._nodes.items()
+                },
+            }
+
+agent_graphs = AgentGraphRegistry()
+
 def seed_agents():
     """Seed the database with the 8 specialized agents if they don't exist."""
     from models import AgentModel
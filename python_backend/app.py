@@ -1,9 +1,10 @@
 import os
 import json
+import uuid
 from datetime import datetime
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from dotenv import load_dotenv
 import time
 import threading
@@ -15,13 +16,25 @@ from models import (
     AgentModel, 
     ConversationModel, 
     MessageModel, 
+    ConversationSummaryModel,
     TransactionModel, 
     DecisionLogModel,
+    MetricsModel,
+    UnitOfWork,
+    uses_flusher,
+    agent_catalog,
+    encode_cursor,
+    feed_cursor,
+    feed_position,
+    feed_start_cursor,
     generate_tx_hash,
     truncate_tx_hash
 )
-from agents import seed_agents, get_master_agent_prompt, AGENT_DEFINITIONS
-from openai_service import get_agent_response, analyze_user_request
+from db_pool import get_pool_stats
+from agents import seed_agents, get_master_agent_prompt, AGENT_DEFINITIONS, agent_graphs
+from openai_service import get_agent_response, stream_agent_response, AgentResponseError, ERROR_RESPONSE_PREFIX
+from semantic_cache import response_cache
+from routing import route_request, routing_stats
 from cardano_service import cardano_service
 from masumi_service import masumi_service
 from hydra_service import hydra_service
@@ -32,7 +45,13 @@ from blockchain_activity import (
     get_all_agent_profiles,
     is_simulation_mode
 )
+from write_behind import audit_queue
+from summarizer import conversation_summarizer
+from prompt_budget import load_tokenizer
+from llm_scheduler import llm_scheduler
 import sokosumi_service
+from job_tracker import job_tracker, JOB_WAIT_MAX
+from job_store import job_store
 from agent_collaboration import (
     execute_collaboration,
     get_collaboration_summary,
@@ -41,7 +60,7 @@ from agent_collaboration import (
 )
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "X-Latest-Cursor"])
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
 def emit_collaboration_update(event_type: str, data: dict):
@@ -56,6 +75,11 @@ set_emit_callback(emit_collaboration_update)
 
 init_db()
 seed_agents()
+audit_queue.start()
+uses_flusher.start()
+agent_catalog.start_listener()
+agent_graphs.warm([a["name"] for a in AGENT_DEFINITIONS] + ["AgentHub"])
+load_tokenizer()
 
 def serialize_datetime(obj):
     """JSON serializer for datetime objects."""
@@ -75,6 +99,31 @@ def serialize_record(record):
             result[key] = value
     return result
 
+def page_args(default_limit=20, max_limit=200):
+    """Read limit/since/before keyset pagination parameters from the query string."""
+    limit = min(max(request.args.get("limit", default_limit, type=int), 1), max_limit)
+    return limit, request.args.get("since"), request.args.get("before")
+
+def paginated_response(records, limit, since=None, before=None, column="created_at", latest=None):
+    """JSON list of records (newest first) with keyset cursor headers.
+
+    X-Latest-Cursor is set on first pages and `since` pages; pass it back
+    as `since` to fetch only rows committed after it on the next poll. On
+    a `since` page it is the feed position of the latest row returned (or
+    the caller's `since` if nothing is new); on a first page it is
+    `latest`, a feed_start_cursor() taken before the page was read. Older
+    (`before`) pages do not set it. X-Next-Cursor is set when the page is
+    full and can be passed as `before` to fetch older rows.
+    """
+    response = jsonify([serialize_record(r) for r in records])
+    if since and not before:
+        response.headers["X-Latest-Cursor"] = feed_cursor(max(records, key=feed_position)) if records else since
+    elif latest:
+        response.headers["X-Latest-Cursor"] = latest
+    if records and not since and len(records) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(records[-1], column)
+    return response
+
 @app.route('/api/agents', methods=['GET'])
 def get_agents():
     """Get all agents."""
@@ -125,10 +174,15 @@ def deploy_agent(agent_id):
 
 @app.route('/api/conversations', methods=['GET'])
 def get_conversations():
-    """Get all conversations."""
+    """Get conversations, most recently updated first (keyset paginated)."""
     try:
-        conversations = ConversationModel.get_all()
-        return jsonify([serialize_record(c) for c in conversations])
+        limit, since, before = page_args(default_limit=50)
+        latest = feed_start_cursor() if not since and not before else None
+        try:
+            conversations = ConversationModel.get_all(limit=limit, since=since, before=before)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return paginated_response(conversations, limit, since, before, column="updated_at", latest=latest)
     except Exception as e:
         print(f"Error fetching conversations: {e}")
         return jsonify({"error": "Failed to fetch conversations"}), 500
@@ -149,28 +203,81 @@ def create_conversation():
 
 @app.route('/api/conversations/<conversation_id>/messages', methods=['GET'])
 def get_messages(conversation_id):
-    """Get all messages for a conversation."""
+    """Get messages for a conversation.
+
+    Without query parameters the whole conversation is returned. With
+    `limit` and/or `before` (a cursor) one page is returned, newest page
+    first; the cursor for the next older page is sent in X-Next-Cursor.
+    """
     try:
-        messages = MessageModel.get_by_conversation(conversation_id)
-        return jsonify([serialize_record(m) for m in messages])
+        if "limit" not in request.args and "before" not in request.args:
+            messages = MessageModel.get_by_conversation(conversation_id)
+            return jsonify([serialize_record(m) for m in messages])
+
+        limit, _, before = page_args(default_limit=50)
+        try:
+            messages, next_cursor = MessageModel.get_page(conversation_id, before=before, limit=limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        response = jsonify([serialize_record(m) for m in messages])
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
     except Exception as e:
         print(f"Error fetching messages: {e}")
         return jsonify({"error": "Failed to fetch messages"}), 500
 
+def emit_agent_stream(conversation_id: str, stream_id: str, event_type: str, **data):
+    """Emit an agent_stream event to the clients subscribed to a conversation."""
+    socketio.emit('agent_stream', {
+        'type': event_type,
+        'streamId': stream_id,
+        'conversationId': conversation_id,
+        **data
+    }, to=conversation_id)
+
+def relay_agent_stream(conversation_id: str, stream_id: str, agent_name: str, chunks) -> str:
+    """Forward response chunks to the conversation's room as they arrive; returns the full text."""
+    emit_agent_stream(conversation_id, stream_id, 'start', agentName=agent_name)
+    parts = []
+    for chunk in chunks:
+        emit_agent_stream(conversation_id, stream_id, 'token', token=chunk, index=len(parts))
+        parts.append(chunk)
+    return "".join(parts)
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
-    """Process a chat message and get agent response with automatic Sokosumi collaboration."""
+    """Process a chat message and get agent response with automatic Sokosumi collaboration.
+
+    With "stream": true the response is also pushed token by token as
+    agent_stream events (start, token..., end) to the conversation's
+    Socket.IO room; the HTTP response is unchanged and returns once the
+    turn has been persisted.
+
+    If the model call fails (for a stream, possibly after some tokens were
+    sent) the apology text is saved as the agent message, nothing is cached
+    or charged, and the response and the end event carry
+    responseInterrupted: true so the client can discard a partial answer.
+    """
+    stream_id = None
+    conversation_id = None
     try:
         data = request.get_json()
         conversation_id = data.get("conversationId")
         message = data.get("message")
         agent_name = data.get("agentName")
         enable_collaboration = data.get("enableCollaboration", True)
+        stream = bool(data.get("stream", False))
 
         if not conversation_id or not message:
             return jsonify({"error": "conversationId and message are required"}), 400
 
-        user_message = MessageModel.create(
+        # All writes for this turn are collected here and committed together
+        # once the agent has answered; the audit rows (decision logs and
+        # transactions) are written behind so they add no chat latency.
+        uow = UnitOfWork(deferred=audit_queue)
+
+        user_message = uow.add_message(
             conversation_id=conversation_id,
             sender="user",
             content=message
@@ -179,6 +286,7 @@ def chat():
         selected_agent = None
         agent_system_prompt = ""
         response_agent_name = "AgentHub"
+        routing = None
 
         if agent_name and agent_name != "AgentHub":
             selected_agent = AgentModel.get_by_name(agent_name)
@@ -187,7 +295,10 @@ def chat():
                 response_agent_name = selected_agent["name"]
 
         if not selected_agent:
-            analysis = analyze_user_request(message)
+            # Collaboration is planned in the routing call itself, or
+            # analyzed speculatively alongside it; see routing.py.
+            routing = route_request(message, plan_collaboration=enable_collaboration)
+            analysis = routing.analysis
 
             if analysis["selected_agents"] and analysis["selected_agents"][0] != "AgentHub":
                 selected_agent = AgentModel.get_by_name(analysis["selected_agents"][0])
@@ -202,35 +313,61 @@ def chat():
         hiring_results = []
         collaboration_context = ""
         collaboration_summary = {"collaborated": False}
+
+        # The current message is still pending in the unit of work, so the
+        # history holds prior turns only; get_agent_response appends it.
+        # Turns already folded into the rolling summary are not re-read.
+        summary = ConversationSummaryModel.get(conversation_id)
+        conversation_history = MessageModel.get_recent(
+            conversation_id, 10,
+            after=(summary["through_created_at"], summary["through_id"]) if summary else None
+        )
+        formatted_history = [
+            {"role": m["sender"] if m["sender"] == "user" else "assistant", "content": m["content"]}
+            for m in conversation_history
+        ]
+
+        # Opt-in per agent (SEMANTIC_CACHE_AGENTS): a cached answer to a
+        # similar question replaces both collaboration and the LLM call.
+        cached_response = response_cache.lookup(response_agent_name, message, formatted_history)
+        generation_started = time.perf_counter()
         
-        if enable_collaboration and response_agent_name != "AgentHub":
+        if enable_collaboration and response_agent_name != "AgentHub" and not cached_response:
             try:
                 collaboration_occurred, hiring_results, collaboration_context = execute_collaboration(
                     agent_name=response_agent_name,
                     user_message=message,
-                    auto_hire=True
+                    auto_hire=True,
+                    analysis=routing.collaboration_for(response_agent_name) if routing else None
                 )
                 
                 if collaboration_occurred and hiring_results:
                     collaboration_summary = get_collaboration_summary(hiring_results)
                     
                     for result in hiring_results:
-                        DecisionLogModel.create(
+                        # Only completed hires are paid; timed-out and failed
+                        # ones are logged with their real status and no payment.
+                        completed = result.get("status") == "completed"
+                        uow.add_decision_log(
                             agent_name=response_agent_name,
                             action=f"Hired Sokosumi agent: {result.get('agent_name')}",
                             details=json.dumps({
                                 "hired_agent": result.get("agent_name"),
                                 "task": result.get("task_description"),
-                                "cost_usd": result.get("cost", 0),
+                                "cost_usd": result.get("cost", 0) if completed else 0,
                                 "job_id": result.get("job_id"),
+                                "hire_status": result.get("status"),
+                                "error": result.get("error"),
                                 "is_simulated": False
                             }),
                             agent_id=selected_agent["id"] if selected_agent else None,
                             conversation_id=conversation_id,
-                            status="confirmed"
+                            status="confirmed" if completed else "failed"
                         )
+                        if not completed:
+                            continue
                         
-                        TransactionModel.create(
+                        uow.add_transaction(
                             from_agent_name=response_agent_name,
                             to_agent_name=result.get("agent_name"),
                             from_agent_id=selected_agent["id"] if selected_agent else None,
@@ -241,21 +378,40 @@ def chat():
                 print(f"Collaboration error (non-fatal): {collab_error}")
                 collaboration_context = ""
 
-        conversation_history = MessageModel.get_by_conversation(conversation_id)
-        formatted_history = [
-            {"role": m["sender"] if m["sender"] == "user" else "assistant", "content": m["content"]}
-            for m in conversation_history[-10:]
-        ]
-
-        response_content = get_agent_response(
+        agent_args = dict(
             agent_name=response_agent_name,
             system_prompt=agent_system_prompt,
             user_message=message,
             conversation_history=formatted_history,
-            collaboration_context=collaboration_context if collaboration_context else None
+            collaboration_context=collaboration_context if collaboration_context else None,
+            conversation_summary=summary["summary"] if summary else None
         )
+        response_failed = False
+        if cached_response:
+            response_content = cached_response.response
+            if stream:
+                stream_id = str(uuid.uuid4())
+                relay_agent_stream(conversation_id, stream_id, response_agent_name, [response_content])
+        elif stream:
+            stream_id = str(uuid.uuid4())
+            try:
+                response_content = relay_agent_stream(
+                    conversation_id, stream_id, response_agent_name, stream_agent_response(**agent_args)
+                )
+            except AgentResponseError as e:
+                response_failed = True
+                response_content = f"{ERROR_RESPONSE_PREFIX} {str(e)}. Please try again."
+        else:
+            response_content = get_agent_response(**agent_args)
+            response_failed = response_content.startswith(ERROR_RESPONSE_PREFIX)
+
+        if not cached_response and not response_failed:
+            response_cache.store(
+                response_agent_name, message, formatted_history, response_content,
+                cost_ms=(time.perf_counter() - generation_started) * 1000
+            )
 
-        agent_message = MessageModel.create(
+        agent_message = uow.add_message(
             conversation_id=conversation_id,
             sender="agent",
             content=response_content,
@@ -263,30 +419,57 @@ def chat():
             agent_name=response_agent_name
         )
 
-        if selected_agent:
-            AgentModel.increment_uses(selected_agent["id"])
-
-        DecisionLogModel.create(
-            agent_name=response_agent_name,
-            action=f"Processed user request via LangGraph agent" + (" with Sokosumi collaboration" if collaboration_occurred else ""),
-            details=json.dumps({
-                "user_message": message[:100],
-                "agent": response_agent_name,
-                "response_preview": response_content[:200],
-                "collaboration": collaboration_summary if collaboration_occurred else None
-            }),
-            agent_id=selected_agent["id"] if selected_agent else None,
-            conversation_id=conversation_id,
-            status="confirmed"
-        )
-
-        TransactionModel.create(
-            from_agent_name="User",
-            to_agent_name=response_agent_name,
-            from_agent_id=None,
-            to_agent_id=selected_agent["id"] if selected_agent else None,
-            status="confirmed"
-        )
+        if response_failed:
+            # The apology is kept in the conversation, but the turn is
+            # neither counted as a use nor charged.
+            uow.add_decision_log(
+                agent_name=response_agent_name,
+                action="Failed to process user request via LangGraph agent",
+                details=json.dumps({
+                    "user_message": message[:100],
+                    "agent": response_agent_name,
+                    "error": response_content,
+                    "collaboration": collaboration_summary if collaboration_occurred else None
+                }),
+                agent_id=selected_agent["id"] if selected_agent else None,
+                conversation_id=conversation_id,
+                status="failed"
+            )
+        else:
+            if selected_agent:
+                uow.increment_uses(selected_agent["id"])
+
+            uow.add_decision_log(
+                agent_name=response_agent_name,
+                action=f"Processed user request via LangGraph agent" + (" with Sokosumi collaboration" if collaboration_occurred else ""),
+                details=json.dumps({
+                    "user_message": message[:100],
+                    "agent": response_agent_name,
+                    "response_preview": response_content[:200],
+                    "collaboration": collaboration_summary if collaboration_occurred else None,
+                    "semantic_cache_similarity": round(cached_response.similarity, 3) if cached_response else None
+                }),
+                agent_id=selected_agent["id"] if selected_agent else None,
+                conversation_id=conversation_id,
+                status="confirmed"
+            )
+
+            uow.add_transaction(
+                from_agent_name="User",
+                to_agent_name=response_agent_name,
+                from_agent_id=None,
+                to_agent_id=selected_agent["id"] if selected_agent else None,
+                status="confirmed"
+            )
+
+        uow.commit()
+        # Prior turns plus the two just written.
+        conversation_summarizer.schedule(conversation_id, len(conversation_history) + 2)
+
+        if stream_id:
+            emit_agent_stream(conversation_id, stream_id, 'end', message=serialize_record(agent_message),
+                              responseInterrupted=response_failed)
+            stream_id = None
 
         blockchain_activities = generate_blockchain_activities(
             agent_name=response_agent_name,
@@ -320,12 +503,15 @@ def chat():
             "blockchainActivities": blockchain_activities,
             "agentProfile": agent_masumi_profile,
             "isSimulationMode": False,
-            "collaboration": collaboration_summary
+            "collaboration": collaboration_summary,
+            "responseInterrupted": response_failed
         })
     except Exception as e:
         print(f"Error in chat: {e}")
         import traceback
         traceback.print_exc()
+        if stream_id:
+            emit_agent_stream(conversation_id, stream_id, 'error', error=str(e))
         return jsonify({"error": f"Failed to process chat message: {str(e)}"}), 500
 
 # Blockchain Integration Endpoints
@@ -621,22 +807,30 @@ def estimate_hydra_fees():
 
 @app.route('/api/transactions', methods=['GET'])
 def get_transactions():
-    """Get recent transactions."""
+    """Get recent transactions (keyset paginated with since/before cursors)."""
     try:
-        limit = request.args.get("limit", 20, type=int)
-        transactions = TransactionModel.get_all(limit=limit)
-        return jsonify([serialize_record(t) for t in transactions])
+        limit, since, before = page_args()
+        latest = feed_start_cursor() if not since and not before else None
+        try:
+            transactions = TransactionModel.get_all(limit=limit, since=since, before=before)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return paginated_response(transactions, limit, since, before, latest=latest)
     except Exception as e:
         print(f"Error fetching transactions: {e}")
         return jsonify({"error": "Failed to fetch transactions"}), 500
 
 @app.route('/api/decision-logs', methods=['GET'])
 def get_decision_logs():
-    """Get recent decision logs."""
+    """Get recent decision logs (keyset paginated with since/before cursors)."""
     try:
-        limit = request.args.get("limit", 20, type=int)
-        logs = DecisionLogModel.get_all(limit=limit)
-        return jsonify([serialize_record(l) for l in logs])
+        limit, since, before = page_args()
+        latest = feed_start_cursor() if not since and not before else None
+        try:
+            logs = DecisionLogModel.get_all(limit=limit, since=since, before=before)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return paginated_response(logs, limit, since, before, latest=latest)
     except Exception as e:
         print(f"Error fetching decision logs: {e}")
         return jsonify({"error": "Failed to fetch decision logs"}), 500
@@ -645,16 +839,15 @@ def get_decision_logs():
 def get_metrics():
     """Get platform metrics."""
     try:
-        agents = AgentModel.get_all()
-        transactions = TransactionModel.get_all(limit=1000)
+        totals = MetricsModel.get_totals()
 
-        total_uses_served = sum(a["uses_served"] for a in agents)
-        total_transactions = len(transactions)
-        total_cost = total_transactions * 0.004
+        total_uses_served = totals["uses_served"]
+        total_transactions = totals["transactions"]
+        total_cost = float(totals["transaction_amount"])
 
         return jsonify({
             "systemLayers": 7,
-            "specializedAgents": len(agents),
+            "specializedAgents": totals["agents"],
             "agentDomains": 4,
             "throughput": "1000+ TPS",
             "costPerService": "~$0.004",
@@ -668,6 +861,49 @@ def get_metrics():
         print(f"Error fetching metrics: {e}")
         return jsonify({"error": "Failed to fetch metrics"}), 500
 
+@app.route('/api/db/pool', methods=['GET'])
+def get_db_pool_stats():
+    """Get database connection pool size and wait-time metrics."""
+    try:
+        return jsonify(get_pool_stats())
+    except Exception as e:
+        print(f"Error fetching pool stats: {e}")
+        return jsonify({"error": "Failed to fetch pool stats"}), 500
+
+@app.route('/api/db/write-behind', methods=['GET'])
+def get_write_behind_stats():
+    """Get audit write-behind queue metrics."""
+    try:
+        return jsonify(audit_queue.stats())
+    except Exception as e:
+        print(f"Error fetching write-behind stats: {e}")
+        return jsonify({"error": "Failed to fetch write-behind stats"}), 500
+
+@app.route('/api/cache/semantic', methods=['GET'])
+def get_semantic_cache_stats():
+    """Get semantic response cache hit rate, latency saved and sizes."""
+    return jsonify(response_cache.stats())
+
+@app.route('/api/routing/stats', methods=['GET'])
+def get_routing_stats():
+    """Get routing path counters and the keyword-router confidence histogram."""
+    return jsonify(routing_stats())
+
+@app.route('/api/agents/graph-stats', methods=['GET'])
+def get_agent_graph_stats():
+    """Get compile times of the cached agent graphs and per-node timings."""
+    return jsonify(agent_graphs.stats())
+
+@app.route('/api/summarizer/stats', methods=['GET'])
+def get_summarizer_stats():
+    """Get rolling conversation summary counters."""
+    return jsonify(conversation_summarizer.stats())
+
+@app.route('/api/llm/scheduler', methods=['GET'])
+def get_llm_scheduler_stats():
+    """Get LLM admission queue, rate-limit budget and retry counters."""
+    return jsonify(llm_scheduler.stats())
+
 @app.route('/api/blockchain/network-status', methods=['GET'])
 def get_full_network_status():
     """Get comprehensive status of all blockchain networks"""
@@ -706,13 +942,19 @@ def get_sokosumi_agents():
     """Get available agents from Sokosumi marketplace"""
     try:
         category = request.args.get("category")
+        capability = request.args.get("capability")
         limit = int(request.args.get("limit", 10))
-        result = sokosumi_service.list_agents(category=category, limit=limit)
+        result = sokosumi_service.list_agents(category=category, limit=limit, capability=capability)
         return jsonify(result)
     except Exception as e:
         print(f"Error fetching Sokosumi agents: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/sokosumi/catalog', methods=['GET'])
+def get_sokosumi_catalog_stats():
+    """Get Sokosumi agent catalog counters."""
+    return jsonify(sokosumi_service.catalog.stats())
+
 @app.route('/api/sokosumi/agents/<agent_id>', methods=['GET'])
 def get_sokosumi_agent(agent_id):
     """Get details of a specific Sokosumi agent"""
@@ -736,16 +978,81 @@ def hire_sokosumi_agent():
             return jsonify({"error": "agentId and task are required"}), 400
         
         result = sokosumi_service.hire_agent(agent_id, task, requester)
+        wait = _job_wait_seconds()
+        job_id = result.get("job", {}).get("job_id")
+        if wait and job_id:
+            job = job_tracker.wait(job_id, wait)
+            if job:
+                result["job"] = job
         return jsonify(result)
     except Exception as e:
         print(f"Error hiring Sokosumi agent: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _job_wait_seconds() -> float:
+    """The ?wait= query parameter, clamped to [0, JOB_WAIT_MAX]."""
+    try:
+        return min(max(float(request.args.get("wait", 0)), 0.0), JOB_WAIT_MAX)
+    except ValueError:
+        return 0.0
+
+@app.route('/api/sokosumi/webhook', methods=['POST'])
+def sokosumi_job_webhook():
+    """Job status callback from the marketplace; resolves waiting requests at once.
+    
+    Disabled (404) unless SOKOSUMI_WEBHOOK_SECRET is set. Callbacks must
+    carry an HMAC-SHA256 of the raw body in X-Webhook-Signature.
+    """
+    if not sokosumi_service.SOKOSUMI_WEBHOOK_SECRET:
+        return jsonify({"error": "Not found"}), 404
+    body = request.get_data()
+    if not sokosumi_service.verify_webhook_signature(body, request.headers.get("X-Webhook-Signature", "")):
+        return jsonify({"error": "Invalid webhook signature"}), 401
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return jsonify({"error": "Invalid JSON body"}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON body"}), 400
+    job_id = data.get("job_id") or data.get("jobId")
+    status = data.get("status")
+    if not job_id or not status:
+        return jsonify({"error": "job_id and status are required"}), 400
+    
+    result = sokosumi_service.update_job(job_id, status, data.get("result"))
+    if not result.get("success"):
+        return jsonify(result), 404
+    job_tracker.complete(job_id)
+    return jsonify({"success": True})
+
+@app.route('/api/sokosumi/jobs/tracker', methods=['GET'])
+def get_sokosumi_job_tracker_stats():
+    """Get Sokosumi job tracker counters."""
+    return jsonify(job_tracker.stats())
+
+@app.route('/api/sokosumi/jobs/store', methods=['GET'])
+def get_sokosumi_job_store_stats():
+    """Get Sokosumi job store counters."""
+    return jsonify(job_store.stats())
+
 @app.route('/api/sokosumi/jobs', methods=['GET'])
 def get_sokosumi_jobs():
-    """Get all active Sokosumi jobs"""
+    """Get Sokosumi jobs, newest first.
+    
+    Filters by ?requester= and ?status=; paginated with ?limit= and
+    ?before=<next_cursor of the previous page>.
+    """
     try:
-        result = sokosumi_service.list_active_jobs()
+        limit, _, before = page_args()
+        try:
+            result = sokosumi_service.list_active_jobs(
+                requester=request.args.get("requester"),
+                status=request.args.get("status"),
+                limit=limit,
+                before=before
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         return jsonify(result)
     except Exception as e:
         print(f"Error fetching Sokosumi jobs: {e}")
@@ -753,8 +1060,15 @@ def get_sokosumi_jobs():
 
 @app.route('/api/sokosumi/jobs/<job_id>', methods=['GET'])
 def get_sokosumi_job(job_id):
-    """Get status of a specific Sokosumi job"""
+    """Get status of a specific Sokosumi job.
+    
+    With ?wait=<seconds> (at most JOB_WAIT_MAX), holds the request until the
+    job finishes or the wait runs out, then returns its current state.
+    """
     try:
+        wait = _job_wait_seconds()
+        if wait:
+            job_tracker.wait(job_id, wait)
         result = sokosumi_service.get_job_status(job_id)
         return jsonify(result)
     except Exception as e:
@@ -799,9 +1113,20 @@ def handle_disconnect():
 def handle_subscribe(data):
     """Subscribe to collaboration updates for a conversation"""
     conversation_id = data.get('conversation_id')
+    if conversation_id:
+        # Room for events scoped to this conversation, e.g. agent_stream tokens.
+        join_room(conversation_id)
     print(f"[WebSocket] Client subscribed to collaboration updates for {conversation_id}")
     emit('subscribed', {'conversation_id': conversation_id})
 
+@socketio.on('unsubscribe_collaboration')
+def handle_unsubscribe(data):
+    """Stop receiving events scoped to a conversation"""
+    conversation_id = data.get('conversation_id')
+    if conversation_id:
+        leave_room(conversation_id)
+    emit('unsubscribed', {'conversation_id': conversation_id})
+
 def emit_collaboration_event(event_type: str, data: dict):
     """Emit a collaboration event to all connected clients"""
     socketio.emit('collaboration_update', {
@@ -0,0 +1,223 @@
+"""
+Benchmark the hot read queries before and after the schema migration indexes.
+
+Builds copies of messages, transactions and decision_logs in a scratch
+schema, fills each with --rows synthetic rows, then runs the model queries
+with EXPLAIN ANALYZE, first with primary keys only and then after applying
+the index statements from models.MIGRATIONS. The queries are the keyset
+SQL the models run: the first page, a page behind a (created_at, id)
+cursor taken from the middle of the data, and a since-poll on (xid, seq).
+Prints the top plan node and timings for both runs. The scratch schema is
+dropped afterwards unless --keep is given.
+
+Usage (from python_backend/):
+    DATABASE_URL=postgresql://... python benchmarks/query_indexes.py --rows 1000000
+"""
+
+import os
+import re
+import sys
+import time
+import json
+import argparse
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import init_db, MIGRATIONS
+
+SCHEMA = "bench_indexes"
+TABLES = ("messages", "transactions", "decision_logs")
+CONVERSATIONS = 10_000
+REPEATS = 20
+
+CONVERSATION = "conv_4242"
+
+# (label, SQL, params) for every query the indexes are meant to serve, as
+# the models issue it. Params are built from the positions sampled by
+# sample_positions(), so cursors point into the middle of the data.
+QUERIES = [
+    ("MessageModel.get_by_conversation",
+     "SELECT * FROM messages WHERE conversation_id = %s ORDER BY created_at ASC, id ASC",
+     lambda p: (CONVERSATION,)),
+    ("MessageModel.get_recent(n=10)",
+     """SELECT * FROM (
+            SELECT * FROM messages
+            WHERE conversation_id = %s AND (created_at, id) > (%s, %s)
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        ) recent
+        ORDER BY created_at ASC, id ASC""",
+     lambda p: (CONVERSATION, *p["messages"], 10)),
+    ("MessageModel.get_page(before)",
+     """SELECT * FROM messages
+        WHERE conversation_id = %s AND (created_at, id) < (%s, %s)
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s""",
+     lambda p: (CONVERSATION, *p["messages"], 51)),
+    ("TransactionModel.get_all(limit=20)",
+     "SELECT * FROM transactions ORDER BY created_at DESC, id DESC LIMIT %s",
+     lambda p: (20,)),
+    ("TransactionModel.get_all(before)",
+     """SELECT * FROM transactions WHERE (created_at, id) < (%s, %s)
+        ORDER BY created_at DESC, id DESC LIMIT %s""",
+     lambda p: (*p["transactions"], 20)),
+    ("TransactionModel.get_all(since)",
+     """SELECT * FROM transactions
+        WHERE (xid, seq) > (%s::xid8, %s) AND xid < pg_snapshot_xmin(pg_current_snapshot())
+        ORDER BY xid ASC, seq ASC LIMIT %s""",
+     lambda p: (*p["transactions_feed"], 20)),
+    ("DecisionLogModel.get_all(limit=20)",
+     "SELECT * FROM decision_logs ORDER BY created_at DESC, id DESC LIMIT %s",
+     lambda p: (20,)),
+    ("DecisionLogModel.get_all(before)",
+     """SELECT * FROM decision_logs WHERE (created_at, id) < (%s, %s)
+        ORDER BY created_at DESC, id DESC LIMIT %s""",
+     lambda p: (*p["decision_logs"], 20)),
+    ("DecisionLogModel.get_all(since)",
+     """SELECT * FROM decision_logs
+        WHERE (xid, seq) > (%s::xid8, %s) AND xid < pg_snapshot_xmin(pg_current_snapshot())
+        ORDER BY xid ASC, seq ASC LIMIT %s""",
+     lambda p: (*p["decision_logs_feed"], 20)),
+]
+
+
+def build_dataset(cur, rows):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    for table in TABLES:
+        cur.execute(f"CREATE TABLE {table} (LIKE public.{table} INCLUDING DEFAULTS)")
+        cur.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+
+    cur.execute("""
+        INSERT INTO messages (id, conversation_id, sender, content, created_at)
+        SELECT md5('m' || g), 'conv_' || (g %% %s),
+               CASE WHEN g %% 2 = 0 THEN 'user' ELSE 'agent' END,
+               'message body ' || g,
+               NOW() - make_interval(secs => %s - g)
+        FROM generate_series(1, %s) AS g
+    """, (CONVERSATIONS, rows, rows))
+    cur.execute("""
+        INSERT INTO transactions (id, from_agent_name, to_agent_name, amount, tx_hash, status, created_at)
+        SELECT md5('t' || g), 'User', 'Agent' || (g %% 8), 0.004,
+               '0x' || left(md5(g::text), 8) || '...' || right(md5(g::text), 6),
+               'confirmed', NOW() - make_interval(secs => %s - g)
+        FROM generate_series(1, %s) AS g
+    """, (rows, rows))
+    cur.execute("""
+        INSERT INTO decision_logs (id, agent_name, action, details, tx_hash, status, created_at)
+        SELECT md5('d' || g), 'Agent' || (g %% 8), 'Processed user request', '{}',
+               '0x' || left(md5(g::text), 8) || '...' || right(md5(g::text), 6),
+               'confirmed', NOW() - make_interval(secs => %s - g)
+        FROM generate_series(1, %s) AS g
+    """, (rows, rows))
+    cur.execute("ANALYZE")
+
+
+def sample_positions(cur):
+    """Cursor positions halfway through each table (and CONVERSATION)."""
+    positions = {}
+    cur.execute("""
+        SELECT created_at, id FROM messages WHERE conversation_id = %s
+        ORDER BY created_at, id OFFSET (SELECT count(*) / 2 FROM messages WHERE conversation_id = %s) LIMIT 1
+    """, (CONVERSATION, CONVERSATION))
+    row = cur.fetchone()
+    positions["messages"] = (row["created_at"], row["id"])
+    for table in ("transactions", "decision_logs"):
+        cur.execute(f"""
+            SELECT created_at, id, xid::text AS xid, seq FROM {table}
+            ORDER BY created_at, id OFFSET (SELECT count(*) / 2 FROM {table}) LIMIT 1
+        """)
+        row = cur.fetchone()
+        positions[table] = (row["created_at"], row["id"])
+        positions[f"{table}_feed"] = (row["xid"], row["seq"])
+    return positions
+
+
+def run_queries(cur, positions):
+    results = {}
+    for label, query, build_params in QUERIES:
+        params = build_params(positions)
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+        plan = cur.fetchone()["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        top = plan[0]["Plan"]
+        node = top
+        while node.get("Plans") and node["Node Type"] in ("Limit", "Sort"):
+            node = node["Plans"][0]
+
+        started = time.perf_counter()
+        for _ in range(REPEATS):
+            cur.execute(query, params)
+            cur.fetchall()
+        elapsed_ms = (time.perf_counter() - started) / REPEATS * 1000
+
+        results[label] = {
+            "plan": f"{top['Node Type']} -> {node['Node Type']}" if node is not top else top["Node Type"],
+            "index": node.get("Index Name"),
+            "execution_ms": plan[0]["Execution Time"],
+            "roundtrip_ms": elapsed_ms,
+        }
+    return results
+
+
+def apply_indexes(cur):
+    """Run every CREATE INDEX from MIGRATIONS that targets a benchmark table."""
+    for version, description, statements in MIGRATIONS:
+        started = time.perf_counter()
+        built = 0
+        for statement in statements:
+            match = re.search(r"CREATE (?:UNIQUE )?INDEX.*?\bON\s+(\w+)", statement, re.S)
+            if match and match.group(1) in TABLES:
+                cur.execute(statement)
+                built += 1
+        if built:
+            print(f"Built {built} indexes from migration {version} in {time.perf_counter() - started:.1f}s")
+    cur.execute("ANALYZE")
+
+
+def print_results(before, after):
+    print()
+    print(f"{'query':38} {'':7} {'plan':28} {'exec ms':>10} {'round trip ms':>14}")
+    for label in before:
+        for phase, results in (("before", before), ("after", after)):
+            r = results[label]
+            print(f"{label if phase == 'before' else '':38} {phase:7} {r['plan']:28} "
+                  f"{r['execution_ms']:10.3f} {r['roundtrip_ms']:14.3f}")
+        speedup = before[label]["roundtrip_ms"] / max(after[label]["roundtrip_ms"], 1e-9)
+        print(f"{'':38} {'':7} {'speedup':28} {'':10} {speedup:13.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per table (default 1,000,000)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    init_db()
+    conn = psycopg2.connect(os.environ["DATABASE_URL"], cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        started = time.perf_counter()
+        build_dataset(cur, args.rows)
+        print(f"Loaded {args.rows:,} rows per table in {time.perf_counter() - started:.1f}s")
+
+        positions = sample_positions(cur)
+        before = run_queries(cur, positions)
+        apply_indexes(cur)
+        after = run_queries(cur, positions)
+        print_results(before, after)
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for transaction hash generation.
+
+Compares the per-call cost of the original models.generate_tx_hash (64
+uuid4() calls, one hex nibble each, joined by string concatenation) with
+hashing.tx_hash, both random and content-addressed over a record the size
+of a TransactionModel row. No database is needed.
+
+Usage (from python_backend/):
+    python benchmarks/tx_hash.py --calls 100000
+"""
+
+import os
+import sys
+import uuid
+import timeit
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hashing import tx_hash
+
+RECORD = {
+    "id": str(uuid.uuid4()),
+    "from_agent_id": None,
+    "to_agent_id": str(uuid.uuid4()),
+    "from_agent_name": "User",
+    "to_agent_name": "TradeMind",
+    "amount": "0.004",
+    "status": "confirmed",
+    "created_at": datetime.now(timezone.utc),
+}
+
+
+def legacy_generate_tx_hash():
+    """models.generate_tx_hash before the hashing module."""
+    chars = "0123456789abcdef"
+    hash_val = "0x"
+    for _ in range(64):
+        hash_val += chars[int(uuid.uuid4().hex[0], 16) % 16]
+    return hash_val
+
+
+CASES = [
+    ("legacy: 64 x uuid4 nibbles", legacy_generate_tx_hash),
+    ("tx_hash(): os.urandom", lambda: "0x" + tx_hash()),
+    ("tx_hash(record): blake2b", lambda: "0x" + tx_hash(RECORD)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100_000, help="calls per timing run (default 100,000)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case; the best is reported (default 5)")
+    args = parser.parse_args()
+
+    for _, fn in CASES:
+        value = fn()
+        assert len(value) == 66 and value.startswith("0x"), value
+
+    baseline = None
+    print(f"{'implementation':32} {'us/call':>10} {'speedup':>9}")
+    for label, fn in CASES:
+        best = min(timeit.repeat(fn, number=args.calls, repeat=args.repeat))
+        per_call_us = best / args.calls * 1e6
+        baseline = baseline or per_call_us
+        print(f"{label:32} {per_call_us:10.3f} {baseline / per_call_us:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
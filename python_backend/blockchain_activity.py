@@ -6,11 +6,12 @@ When API keys are provided, this switches to live blockchain data.
 import os
 import random
 import hashlib
-import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 
+from hashing import tx_hash
+
 MASUMI_API_KEY = os.environ.get("MASUMI_API_KEY", "")
 HYDRA_API_KEY = os.environ.get("HYDRA_API_KEY", "")
 BLOCKFROST_API_KEY = os.environ.get("BLOCKFROST_API_KEY", "")
@@ -19,9 +20,9 @@ def is_simulation_mode() -> bool:
     """Check if running in simulation mode (no API keys)"""
     return not (MASUMI_API_KEY or HYDRA_API_KEY or BLOCKFROST_API_KEY)
 
-def generate_tx_hash() -> str:
+def generate_tx_hash(payload: Optional[Any] = None) -> str:
     """Generate a realistic Cardano-style transaction hash"""
-    return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:64]
+    return tx_hash(payload)
 
 def generate_did(agent_name: str) -> str:
     """Generate a DID for an agent"""
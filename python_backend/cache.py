@@ -0,0 +1,184 @@
+"""
+In-process LRU + TTL cache with an optional SQLite backing store.
+
+TTLCache keeps up to `maxsize` entries in memory, evicting the least
+recently used, and treats entries older than `ttl` seconds as absent.
+Values are deep-copied on the way in and out, so callers may mutate what
+they get back. With a SqliteBackend, every set() is also written to disk
+and memory misses fall through to it, so cached entries survive restarts
+and are shared by workers on the same host. Values stored that way must be
+JSON-serializable.
+
+routing_cache, used by the routing and collaboration analysis calls, is
+configured from the environment:
+    ROUTING_CACHE_SIZE  entries kept in memory (default 2048, 0 disables)
+    ROUTING_CACHE_TTL   seconds an entry stays valid (default 3600)
+    ROUTING_CACHE_PATH  SQLite file for the persistent backend (default
+                        unset: memory only)
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+ROUTING_CACHE_SIZE = int(os.environ.get("ROUTING_CACHE_SIZE", "2048"))
+ROUTING_CACHE_TTL = float(os.environ.get("ROUTING_CACHE_TTL", "3600"))
+ROUTING_CACHE_PATH = os.environ.get("ROUTING_CACHE_PATH", "")
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = re.compile(r"^[\W_]+|[\W_]+$")
+
+
+def normalize_text(text: str) -> str:
+    """Cache-key form of a message: NFKC, case-folded, whitespace collapsed,
+    leading and trailing punctuation removed."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _EDGE_PUNCTUATION.sub("", text)
+
+
+class SqliteBackend:
+    """Persistent key/value store for TTLCache entries."""
+
+    def __init__(self, path: str, table: str = "cache_entries"):
+        if not re.fullmatch(r"\w+", table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        payload = json.dumps(value, default=str)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, expires_at)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and hit/miss counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0,
+                 backend: Optional[SqliteBackend] = None, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.name = name
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "persistent_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0}
+
+    def _backend_key(self, key: Hashable) -> str:
+        return json.dumps(key, default=str)
+
+    def _store(self, key: Hashable, value: Any, expires_at: float):
+        # Caller holds self._lock.
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for key, or None if absent or expired."""
+        if self.maxsize <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(entry[0])
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self.backend is not None:
+            try:
+                stored = self.backend.get(self._backend_key(key))
+            except (sqlite3.Error, ValueError) as e:
+                print(f"[{self.name}] Persistent cache read failed: {e}")
+                stored = None
+            if stored is not None:
+                value, expires_at = stored
+                with self._lock:
+                    self._store(key, value, expires_at)
+                    self._stats["persistent_hits"] += 1
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, copy.deepcopy(value), expires_at)
+            self._stats["sets"] += 1
+        if self.backend is not None:
+            try:
+                self.backend.set(self._backend_key(key), value, expires_at)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print(f"[{self.name}] Persistent cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["persistent_hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "persistent": self.backend is not None,
+                "hit_rate": round((lookups - self._stats["misses"]) / lookups, 4) if lookups else 0.0,
+            }
+
+
+routing_cache = TTLCache(
+    maxsize=ROUTING_CACHE_SIZE,
+    ttl=ROUTING_CACHE_TTL,
+    backend=SqliteBackend(ROUTING_CACHE_PATH, table="routing_cache") if ROUTING_CACHE_PATH else None,
+    name="RoutingCache",
+)
@@ -6,11 +6,12 @@ Uses Blockfrost API for blockchain interaction
 import os
 import hashlib
 import json
-import uuid
 import requests
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
+from hashing import tx_hash
+
 
 class CardanoService:
     """Service for interacting with Cardano blockchain"""
@@ -300,9 +301,9 @@ class CardanoService:
             "status": "submitted" if self._is_live else "simulated"
         }
 
-    def _generate_cardano_tx_hash(self) -> str:
+    def _generate_cardano_tx_hash(self, payload: Optional[Any] = None) -> str:
         """Generate a valid-looking Cardano transaction hash"""
-        return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()
+        return tx_hash(payload)
 
 
 cardano_service = CardanoService()
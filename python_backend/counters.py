@@ -0,0 +1,142 @@
+"""
+In-memory coalescing counters.
+
+Hot counters such as agents.uses_served are incremented in memory and
+written to Postgres periodically as one batched statement, instead of one
+UPDATE per event against the same row. Increments are spread across
+per-thread shards so request threads rarely contend on a lock.
+"""
+
+import atexit
+import itertools
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, Optional
+
+
+class _Shard:
+    __slots__ = ("lock", "counts")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[Hashable, int] = defaultdict(int)
+
+
+class ShardedCounter:
+    """Per-key counter whose pending deltas can be drained and flushed.
+
+    Deltas move through two states: pending (incremented, not yet drained)
+    and in flight (drained, being written). pending() reports both, so
+    readers that merge it with stored values never under-count while a
+    flush is running.
+    """
+
+    def __init__(self, shards: int = 16):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._in_flight: Dict[Hashable, int] = {}
+        self._in_flight_lock = threading.Lock()
+        # Thread idents are aligned addresses, so `ident % shards` would put
+        # every thread on the same shard. Hand out slots round-robin instead.
+        self._slots = itertools.count()
+        self._local = threading.local()
+
+    def _shard(self) -> _Shard:
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = self._local.slot = next(self._slots) % len(self._shards)
+        return self._shards[slot]
+
+    def add(self, key: Hashable, amount: int = 1):
+        shard = self._shard()
+        with shard.lock:
+            shard.counts[key] += amount
+
+    def pending(self, key: Hashable) -> int:
+        """Unflushed delta for one key."""
+        # Same lock order as drain(), so a delta is never seen both in a
+        # shard and in flight.
+        with self._in_flight_lock:
+            total = self._in_flight.get(key, 0)
+            for shard in self._shards:
+                with shard.lock:
+                    total += shard.counts.get(key, 0)
+        return total
+
+    def pending_all(self) -> Dict[Hashable, int]:
+        """Unflushed deltas for every key."""
+        totals: Dict[Hashable, int] = defaultdict(int)
+        with self._in_flight_lock:
+            for key, value in self._in_flight.items():
+                totals[key] += value
+            for shard in self._shards:
+                with shard.lock:
+                    for key, value in shard.counts.items():
+                        totals[key] += value
+        return dict(totals)
+
+    def drain(self) -> Dict[Hashable, int]:
+        """Take all pending deltas for writing; they stay visible as in flight."""
+        drained: Dict[Hashable, int] = defaultdict(int)
+        with self._in_flight_lock:
+            for shard in self._shards:
+                with shard.lock:
+                    counts, shard.counts = shard.counts, defaultdict(int)
+                for key, value in counts.items():
+                    if value:
+                        drained[key] += value
+            for key, value in drained.items():
+                self._in_flight[key] = self._in_flight.get(key, 0) + value
+        return dict(drained)
+
+    def commit(self, drained: Dict[Hashable, int]):
+        """Forget deltas returned by drain() once they have been stored."""
+        with self._in_flight_lock:
+            for key, value in drained.items():
+                remaining = self._in_flight.get(key, 0) - value
+                if remaining:
+                    self._in_flight[key] = remaining
+                else:
+                    self._in_flight.pop(key, None)
+
+    def restore(self, drained: Dict[Hashable, int]):
+        """Return deltas from a failed write to pending so the next flush retries them."""
+        self.commit(drained)
+        for key, value in drained.items():
+            self.add(key, value)
+
+
+class PeriodicFlusher:
+    """Daemon thread that calls flush() every `interval` seconds and once at exit."""
+
+    def __init__(self, flush: Callable[[], None], interval: float, name: str = "flusher"):
+        self.flush = flush
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        self._flush_once()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._flush_once()
+
+    def _flush_once(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[{self.name}] Flush failed, will retry: {e}")
@@ -0,0 +1,30 @@
+"""
+Transaction hash generation shared by the models and the blockchain services.
+
+Hashes are 32-byte BLAKE2b digests rendered as 64 hex characters, the
+length of a Cardano transaction id. Given a record, the digest is taken
+over its canonical JSON encoding (sorted keys, compact separators), so the
+hash is content-addressed: the same record always hashes the same and any
+change to it changes the hash. Records must therefore carry something
+unique (an id, a sequence number) if their hashes have to be distinct.
+Without a record, 32 bytes from the OS CSPRNG are used directly.
+"""
+
+import os
+import json
+import hashlib
+from typing import Any, Optional
+
+DIGEST_SIZE = 32
+
+
+def canonical_bytes(payload: Any) -> bytes:
+    """Stable byte encoding of a JSON-like record; non-JSON values use str()."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def tx_hash(payload: Optional[Any] = None) -> str:
+    """64-hex-character hash of `payload`, or a random one if no payload is given."""
+    if payload is None:
+        return os.urandom(DIGEST_SIZE).hex()
+    return hashlib.blake2b(canonical_bytes(payload), digest_size=DIGEST_SIZE).hexdigest()
@@ -3,13 +3,14 @@ Hydra Layer 2 Service
 Handles state channel operations for instant micropayments between agents
 """
 import os
-import hashlib
 import uuid
 import requests
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 
+from hashing import tx_hash
+
 
 @dataclass
 class HydraChannel:
@@ -180,11 +181,9 @@ class HydraService:
             channel.current_balance[to_agent] = channel.current_balance.get(to_agent, 0) + amount
             channel.transaction_count += 1
 
-            tx_hash = self._generate_tx_hash()
-
             tx_record = {
-                "tx_hash": tx_hash,
                 "channel_id": channel_id,
+                "sequence": channel.transaction_count,
                 "from": from_agent,
                 "to": to_agent,
                 "amount": amount,
@@ -192,6 +191,8 @@ class HydraService:
                 "finality": "instant",
                 "layer": "hydra"
             }
+            tx_hash = self._generate_tx_hash(tx_record)
+            tx_record["tx_hash"] = tx_hash
             self._tx_history.append(tx_record)
 
             result["tx_hash"] = tx_hash
@@ -356,9 +357,9 @@ class HydraService:
 
         return result
 
-    def _generate_tx_hash(self) -> str:
+    def _generate_tx_hash(self, payload: Optional[Any] = None) -> str:
         """Generate a Hydra transaction hash"""
-        return hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()
+        return tx_hash(payload)
 
 
 hydra_service = HydraService()
@@ -0,0 +1,257 @@
+"""
+Bounded store for Sokosumi job records.
+
+Jobs used to live in a module-level dict that only ever grew, full
+generated results included, and listing returned all of them at once.
+JobStore keeps the same records with bounded memory:
+
+- jobs that are still running are kept for up to JOB_STORE_MAX_RUNNING_AGE
+  seconds after they were first stored. One that never finishes (a lost
+  webhook, a job nobody tracks) is then dropped too.
+- finished jobs (TERMINAL_STATUSES) are kept in least-recently-used
+  order. One that has not been read or written for JOB_STORE_TTL seconds
+  is dropped, and so is the least recently used one whenever more than
+  JOB_STORE_MAX_FINISHED are held.
+- secondary indexes by requester and by status let listings filter
+  without a scan. Listings are newest first and keyset-paginated with the
+  same opaque cursors as the other list endpoints.
+
+With JOB_STORE_PERSIST=1 every write also goes to the sokosumi_jobs
+table. Memory then only caches running and recently used jobs, listings
+and counts come from Postgres, and a job that was evicted is loaded back
+on demand. Without it, an evicted job is gone.
+
+Configuration (environment variables):
+    JOB_STORE_TTL           seconds an unused finished job is kept (default 3600)
+    JOB_STORE_MAX_FINISHED  finished jobs kept in memory (default 1000)
+    JOB_STORE_MAX_RUNNING_AGE  seconds an unfinished job is kept (default 86400)
+    JOB_STORE_PERSIST       1 to write jobs through to Postgres (default 0)
+"""
+
+import os
+import copy
+import time
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from models import SokosumiJobModel, decode_cursor, encode_cursor
+
+JOB_STORE_TTL = float(os.environ.get("JOB_STORE_TTL", "3600"))
+JOB_STORE_MAX_FINISHED = int(os.environ.get("JOB_STORE_MAX_FINISHED", "1000"))
+JOB_STORE_MAX_RUNNING_AGE = float(os.environ.get("JOB_STORE_MAX_RUNNING_AGE", "86400"))
+JOB_STORE_PERSIST = os.environ.get("JOB_STORE_PERSIST", "0").lower() in ("1", "true", "yes")
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "error"}
+
+
+def _position(job: Dict[str, Any]) -> Tuple[str, str]:
+    return job["created_at"], job["job_id"]
+
+
+def job_cursor(job: Dict[str, Any]) -> str:
+    """Opaque cursor for a job's (created_at, job_id) position."""
+    return encode_cursor({"created_at": datetime.fromisoformat(job["created_at"]), "id": job["job_id"]})
+
+
+class JobStore:
+    """Job records by id with TTL/LRU eviction of finished jobs and an age
+    limit for unfinished ones."""
+
+    def __init__(self, ttl: float = 3600.0, max_finished: int = 1000, persist: bool = False,
+                 max_running_age: float = 86400.0):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.max_running_age = max_running_age
+        self.persist = persist
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # Finished job ids, least recently used first, with their last use.
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        # Unfinished job ids, oldest first, with when they were first stored.
+        self._running: "OrderedDict[str, float]" = OrderedDict()
+        self._by_requester: Dict[str, Set[str]] = {}
+        self._by_status: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"puts": 0, "updates": 0, "hits": 0, "misses": 0, "loaded": 0,
+                       "expired": 0, "evicted": 0, "abandoned": 0, "persist_errors": 0}
+
+    # Index maintenance; callers hold self._lock.
+
+    def _index(self, job: Dict[str, Any]):
+        self._by_requester.setdefault(job["requester"], set()).add(job["job_id"])
+        self._by_status.setdefault(job["status"], set()).add(job["job_id"])
+
+    def _unindex(self, job: Dict[str, Any]):
+        for index, key in ((self._by_requester, job["requester"]), (self._by_status, job["status"])):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(job["job_id"])
+                if not ids:
+                    del index[key]
+
+    def _touch(self, job: Dict[str, Any], now: float):
+        """Record a use; finished jobs move to the most recently used end."""
+        job_id = job["job_id"]
+        if job["status"] in TERMINAL_STATUSES:
+            self._running.pop(job_id, None)
+            self._finished[job_id] = now
+            self._finished.move_to_end(job_id)
+        else:
+            self._finished.pop(job_id, None)
+            self._running.setdefault(job_id, now)
+
+    def _drop(self, job_id: str):
+        self._finished.pop(job_id, None)
+        self._running.pop(job_id, None)
+        job = self._jobs.pop(job_id, None)
+        if job is not None:
+            self._unindex(job)
+
+    def _evict(self, now: float):
+        while self._finished:
+            job_id, last_used = next(iter(self._finished.items()))
+            if now - last_used > self.ttl:
+                self._stats["expired"] += 1
+            elif len(self._finished) > self.max_finished:
+                self._stats["evicted"] += 1
+            else:
+                break
+            self._drop(job_id)
+        while self._running:
+            job_id, stored_at = next(iter(self._running.items()))
+            if now - stored_at <= self.max_running_age:
+                break
+            self._stats["abandoned"] += 1
+            self._drop(job_id)
+
+    def _cache(self, job: Dict[str, Any]):
+        now = time.monotonic()
+        old = self._jobs.get(job["job_id"])
+        if old is not None:
+            self._unindex(old)
+        self._jobs[job["job_id"]] = job
+        self._index(job)
+        self._touch(job, now)
+        self._evict(now)
+
+    def _save(self, job: Dict[str, Any]):
+        if not self.persist:
+            return
+        try:
+            SokosumiJobModel.save(job)
+        except Exception as e:
+            with self._lock:
+                self._stats["persist_errors"] += 1
+            print(f"[JobStore] Failed to persist job {job['job_id']}: {e}")
+
+    # Public API. Jobs are handed out as deep copies so callers cannot change
+    # a stored record (or its nested result) behind the indexes' back; use
+    # update() instead.
+
+    def put(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job = copy.deepcopy(job)
+        with self._lock:
+            self._cache(job)
+            self._stats["puts"] += 1
+        self._save(job)
+        return copy.deepcopy(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict(time.monotonic())
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._touch(job, time.monotonic())
+                self._stats["hits"] += 1
+                return copy.deepcopy(job)
+            self._stats["misses"] += 1
+        if not self.persist:
+            return None
+        job = SokosumiJobModel.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            self._cache(job)
+            self._stats["loaded"] += 1
+        return copy.deepcopy(job)
+
+    def update(self, job_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Apply `fields` to a job and reindex it; None if it does not exist."""
+        if self.get(job_id) is None:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:  # evicted again before we took the lock
+                return None
+            self._unindex(job)
+            job.update(copy.deepcopy(fields))
+            self._index(job)
+            now = time.monotonic()
+            self._touch(job, now)
+            self._evict(now)
+            self._stats["updates"] += 1
+            job = copy.deepcopy(job)
+        self._save(job)
+        return job
+
+    def list(self, requester: Optional[str] = None, status: Optional[str] = None,
+             limit: int = 20, before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One newest-first page of jobs and the cursor for the next one.
+
+        Raises ValueError for a malformed `before` cursor.
+        """
+        position = decode_cursor(before) if before else None
+        if self.persist:
+            jobs = SokosumiJobModel.list(requester, status, limit, position)
+        else:
+            position = (position[0].isoformat(), position[1]) if position else None
+            with self._lock:
+                self._evict(time.monotonic())
+                candidates = [self._jobs[i] for i in self._ids(requester, status)]
+                if position:
+                    candidates = [j for j in candidates if _position(j) < position]
+                jobs = [copy.deepcopy(j) for j in heapq.nlargest(limit, candidates, key=_position)]
+        next_cursor = job_cursor(jobs[-1]) if len(jobs) == limit else None
+        return jobs, next_cursor
+
+    def count(self, requester: Optional[str] = None, status: Optional[str] = None) -> int:
+        if self.persist:
+            return SokosumiJobModel.count(requester, status)
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._ids(requester, status))
+
+    def _ids(self, requester: Optional[str], status: Optional[str]) -> Set[str]:
+        # Caller holds self._lock.
+        if requester is None and status is None:
+            return set(self._jobs)
+        sets = []
+        if requester is not None:
+            sets.append(self._by_requester.get(requester, set()))
+        if status is not None:
+            sets.append(self._by_status.get(status, set()))
+        return set.intersection(*sets)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "cached": len(self._jobs),
+                "running": len(self._running),
+                "finished": len(self._finished),
+                "by_status": {s: len(ids) for s, ids in self._by_status.items()},
+                "ttl": self.ttl,
+                "max_finished": self.max_finished,
+                "max_running_age": self.max_running_age,
+                "persist": self.persist,
+            }
+
+
+job_store = JobStore(
+    ttl=JOB_STORE_TTL,
+    max_finished=JOB_STORE_MAX_FINISHED,
+    persist=JOB_STORE_PERSIST,
+    max_running_age=JOB_STORE_MAX_RUNNING_AGE,
+)
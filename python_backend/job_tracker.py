@@ -0,0 +1,177 @@
+"""
+Completion tracking for Sokosumi jobs.
+
+Sokosumi jobs can take minutes ("5-10 minutes" is a typical
+response_time_avg), so nothing should sleep a thread per job waiting for
+them. track(job_id) returns a concurrent.futures.Future that resolves to
+the finished job record. All outstanding jobs are multiplexed on one
+asyncio loop running in a background thread. Each job is polled with
+adaptive backoff: the first check is immediate, then the delay grows by
+JOB_POLL_FACTOR with jitter up to JOB_POLL_MAX. A webhook callback
+(POST /api/sokosumi/webhook -> complete()) resolves a job at once and
+cuts its pending poll short.
+
+Callers block only on the future: chat turns through the hiring DAG in
+agent_collaboration, HTTP clients through ?wait= on the job endpoints.
+
+Configuration (environment variables):
+    JOB_POLL_INITIAL   seconds before the second status check (default 0.5)
+    JOB_POLL_FACTOR    growth of the delay per check (default 2)
+    JOB_POLL_MAX       longest delay between checks (default 30)
+    JOB_TRACK_TIMEOUT  seconds before a job is given up on (default 1800)
+    JOB_WAIT_MAX       longest ?wait= an HTTP request may hold (default 60)
+"""
+
+import os
+import random
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+import sokosumi_service
+from job_store import TERMINAL_STATUSES
+
+JOB_POLL_INITIAL = float(os.environ.get("JOB_POLL_INITIAL", "0.5"))
+JOB_POLL_FACTOR = float(os.environ.get("JOB_POLL_FACTOR", "2"))
+JOB_POLL_MAX = float(os.environ.get("JOB_POLL_MAX", "30"))
+JOB_TRACK_TIMEOUT = float(os.environ.get("JOB_TRACK_TIMEOUT", "1800"))
+JOB_WAIT_MAX = float(os.environ.get("JOB_WAIT_MAX", "60"))
+
+
+class JobTracker:
+    """One asyncio loop that watches every outstanding job until it finishes."""
+
+    def __init__(self, poll_initial: float = 0.5, poll_factor: float = 2.0,
+                 poll_max: float = 30.0, timeout: float = 1800.0):
+        self.poll_initial = poll_initial
+        self.poll_factor = poll_factor
+        self.poll_max = poll_max
+        self.timeout = timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._stats = {"tracked": 0, "polls": 0, "completed_by_poll": 0,
+                       "completed_by_webhook": 0, "failed": 0, "timed_out": 0}
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="job-tracker", daemon=True)
+            self._thread.start()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def track(self, job_id: str) -> Future:
+        """Future for the finished job record; one per job however often it is tracked."""
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is not None:
+                return future
+            future = Future()
+            self._futures[job_id] = future
+            self._stats["tracked"] += 1
+        self.start()
+        asyncio.run_coroutine_threadsafe(self._watch(job_id, future), self._loop)
+        return future
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The finished job record, or None if it is not done within timeout."""
+        try:
+            return self.track(job_id).result(timeout=max(timeout, 0))
+        except Exception:
+            return None
+
+    def complete(self, job_id: str) -> bool:
+        """Webhook path: the job's record was updated, check it now.
+
+        Returns False if the job was not being tracked.
+        """
+        with self._lock:
+            if job_id not in self._futures:
+                return False
+        job = sokosumi_service.get_job_status(job_id).get("job")
+        if job and job.get("status") in TERMINAL_STATUSES:
+            if self._resolve(job_id, job):
+                self._count("completed_by_webhook")
+        else:
+            self._wake(job_id)
+        return True
+
+    def _resolve(self, job_id: str, job: Dict[str, Any]) -> bool:
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is None or future.done():
+            return False
+        try:
+            future.set_result(job)
+        except Exception:  # lost a race with the poller
+            return False
+        self._wake(job_id)
+        return True
+
+    def _wake(self, job_id: str):
+        """Cut the job's pending poll delay short."""
+        wakeup = self._wakeups.get(job_id)
+        if wakeup is not None:
+            self._loop.call_soon_threadsafe(wakeup.set)
+
+    async def _watch(self, job_id: str, future: Future):
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeups[job_id] = asyncio.Event()
+        deadline = loop.time() + self.timeout
+        delay = self.poll_initial
+        try:
+            while not future.done():
+                self._count("polls")
+                status = await loop.run_in_executor(None, sokosumi_service.get_job_status, job_id)
+                if not status.get("success"):
+                    if not future.done():
+                        future.set_exception(LookupError(status.get("error", f"Job {job_id} not found")))
+                        self._count("failed")
+                    return
+                job = status["job"]
+                if job.get("status") in TERMINAL_STATUSES:
+                    if self._resolve(job_id, job):
+                        self._count("completed_by_poll")
+                    return
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    if not future.done():
+                        future.set_exception(TimeoutError(f"Job {job_id} still {job.get('status')} after {self.timeout:g}s"))
+                        self._count("timed_out")
+                    return
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=min(delay * random.uniform(0.8, 1.2), remaining))
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                delay = min(delay * self.poll_factor, self.poll_max)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                self._count("failed")
+        finally:
+            self._wakeups.pop(job_id, None)
+            with self._lock:
+                self._futures.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "outstanding": len(self._futures)}
+
+
+job_tracker = JobTracker(
+    poll_initial=JOB_POLL_INITIAL,
+    poll_factor=JOB_POLL_FACTOR,
+    poll_max=JOB_POLL_MAX,
+    timeout=JOB_TRACK_TIMEOUT,
+)
@@ -0,0 +1,80 @@
+"""
+Shared LLM client registry.
+
+Constructing a ChatOpenAI builds a new OpenAI client and with it a new
+HTTP connection pool, so every call that created its own model paid for
+DNS, TCP and TLS setup again. get_chat_model() hands out one ChatOpenAI
+per (model, temperature), and all of them share a single httpx.Client so
+keep-alive connections and TLS sessions stay warm across requests and
+across models.
+
+The models do not retry on their own (max_retries=0): llm_scheduler.py
+owns rate limiting and retries, and an SDK retry inside a scheduler slot
+would bypass both. Streamed calls report token usage so the scheduler can
+settle its tokens-per-minute budget.
+
+Configuration (environment variables):
+    LLM_HTTP_MAX_CONNECTIONS   concurrent connections to the API (default 20)
+    LLM_HTTP_KEEPALIVE         idle connections kept open (default 10)
+    LLM_HTTP_KEEPALIVE_EXPIRY  seconds an idle connection is kept (default 90)
+    LLM_HTTP_TIMEOUT           request timeout in seconds (default 120)
+"""
+
+import os
+import atexit
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+DEFAULT_MODEL = "gpt-4o"
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE = int(os.environ.get("LLM_HTTP_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", "90"))
+LLM_HTTP_TIMEOUT = float(os.environ.get("LLM_HTTP_TIMEOUT", "120"))
+
+_http_client: Optional[httpx.Client] = None
+_models: Dict[Tuple[str, float], ChatOpenAI] = {}
+_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """The process-wide HTTP client used by every chat model."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_HTTP_KEEPALIVE,
+                        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=LLM_HTTP_TIMEOUT,
+                )
+                atexit.register(_http_client.close)
+    return _http_client
+
+
+def get_chat_model(model: str = DEFAULT_MODEL, temperature: float = 0.7) -> ChatOpenAI:
+    """Shared ChatOpenAI for this model and temperature, created on first use."""
+    key = (model, float(temperature))
+    llm = _models.get(key)
+    if llm is None:
+        http_client = get_http_client()
+        with _lock:
+            llm = _models.get(key)
+            if llm is None:
+                llm = ChatOpenAI(
+                    model=model,
+                    api_key=OPENAI_API_KEY,
+                    temperature=temperature,
+                    http_client=http_client,
+                    max_retries=0,
+                    stream_usage=True,
+                )
+                _models[key] = llm
+    return llm
@@ -0,0 +1,312 @@
+"""
+Central scheduler for LLM calls.
+
+Every chat-model call goes through llm_scheduler.invoke(), which admits
+it only when all of these hold:
+
+- fewer than LLM_MAX_CONCURRENCY calls are in flight. The last
+  LLM_RESERVED_INTERACTIVE slots are kept for interactive chat, so
+  routing, collaboration and background calls can never occupy all of
+  them.
+- the requests-per-minute and tokens-per-minute token buckets have room.
+  A call is charged its estimated prompt tokens plus
+  LLM_EXPECTED_OUTPUT_TOKENS up front. The charge is settled against the
+  usage the API reports once the call finishes.
+- no higher-priority call is waiting. Waiting calls are admitted in order
+  of lane (interactive chat, routing, collaboration, background) and then
+  arrival.
+
+Rate-limit (429), server (5xx), timeout and connection errors are retried
+up to LLM_MAX_RETRIES times. Between attempts the call sleeps for the
+server's Retry-After or for a full-jitter exponential backoff, and gives
+up its slot while it sleeps. The OpenAI client's own retries are turned off
+(llm_clients.py) so that only one layer retries. A streamed call
+(stream()) is not retried once it has produced tokens, since the listener
+already has them. A call that cannot be admitted within LLM_QUEUE_TIMEOUT
+seconds raises SchedulerTimeout.
+
+Configuration (environment variables):
+    LLM_MAX_CONCURRENCY         calls in flight at once (default 8)
+    LLM_RESERVED_INTERACTIVE    slots only interactive chat may use (default 2)
+    LLM_RPM_LIMIT               requests per minute (default 500, 0 disables)
+    LLM_TPM_LIMIT               tokens per minute (default 30000, 0 disables)
+    LLM_EXPECTED_OUTPUT_TOKENS  completion tokens assumed at admission (default 400)
+    LLM_MAX_RETRIES             retries on 429/5xx/timeouts (default 4)
+    LLM_BACKOFF_BASE            first backoff ceiling in seconds (default 0.5)
+    LLM_BACKOFF_MAX             backoff ceiling in seconds (default 20)
+    LLM_QUEUE_TIMEOUT           seconds a call may wait for admission (default 60)
+"""
+
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import openai
+from langchain_core.messages import AIMessageChunk
+
+from prompt_budget import count_message_tokens
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_RESERVED_INTERACTIVE = int(os.environ.get("LLM_RESERVED_INTERACTIVE", "2"))
+LLM_RPM_LIMIT = float(os.environ.get("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = float(os.environ.get("LLM_TPM_LIMIT", "30000"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.environ.get("LLM_EXPECTED_OUTPUT_TOKENS", "400"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "20"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "60"))
+
+
+class Priority(IntEnum):
+    """Scheduling lanes; lower values are admitted first."""
+    INTERACTIVE = 0
+    ROUTING = 1
+    COLLABORATION = 2
+    BACKGROUND = 3
+
+
+class SchedulerTimeout(Exception):
+    """Raised when an LLM call is not admitted within the queue timeout."""
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; a limit of 0 disables it."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        # A single call larger than the whole bucket only waits for a full one.
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+    def settle(self, charged: float, actual: float):
+        """Correct an up-front charge once the real cost is known."""
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + min(charged, self.capacity) - actual)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait before retrying `error`: the Retry-After header if the
+    server sent one, 0.0 to use backoff, or None if it is not retryable."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return 0.0
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+        try:
+            return max(float(error.response.headers.get("retry-after", 0)), 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+    return None
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class LLMScheduler:
+    """Admission control, rate limiting and retries for chat-model calls."""
+
+    def __init__(self, max_concurrency: int = 8, reserved_interactive: int = 2,
+                 rpm: float = 500, tpm: float = 30000, expected_output_tokens: int = 400,
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 20.0,
+                 queue_timeout: float = 60.0):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.reserved_interactive = max(0, min(reserved_interactive, max_concurrency - 1))
+        self.expected_output_tokens = expected_output_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._in_flight = 0
+        self._seq = itertools.count()
+
+        self._lanes = {
+            lane: {"admitted": 0, "wait_total": 0.0, "wait_max": 0.0, "timeouts": 0}
+            for lane in Priority
+        }
+        self._stats = {"retries": 0, "rate_limited": 0, "server_errors": 0, "failed": 0}
+
+    def _limit(self, priority: Priority) -> int:
+        if priority == Priority.INTERACTIVE:
+            return self.max_concurrency
+        return self.max_concurrency - self.reserved_interactive
+
+    def _admission_delay(self, entry: Tuple[int, int], cost: int, now: float) -> Optional[float]:
+        """0 to admit now, seconds to wait for the buckets, or None to wait for a release.
+
+        Only the head of the queue is ever admitted. Lanes ahead of a waiter
+        never have a smaller concurrency limit, so if the head cannot run
+        nobody behind it could either.
+        """
+        if self._waiting[0] != entry or self._in_flight >= self._limit(Priority(entry[0])):
+            return None
+        return max(self._requests.wait_time(1, now), self._tokens.wait_time(cost, now))
+
+    def _acquire(self, priority: Priority, cost: int, seq: int, deadline: float):
+        entry = (int(priority), seq)
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._admission_delay(entry, cost, now)
+                    if delay == 0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._lanes[priority]["timeouts"] += 1
+                        raise SchedulerTimeout(
+                            f"LLM call not admitted within {self.queue_timeout:g}s ({priority.name.lower()} lane)"
+                        )
+                    self._cond.wait(remaining if delay is None else min(delay, remaining))
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            self._requests.take(1)
+            self._tokens.take(cost)
+            waited = time.monotonic() - started
+            lane = self._lanes[priority]
+            lane["admitted"] += 1
+            lane["wait_total"] += waited
+            lane["wait_max"] = max(lane["wait_max"], waited)
+            self._cond.notify_all()
+
+    def _release(self, cost: int, actual: Optional[int]):
+        with self._cond:
+            self._in_flight -= 1
+            self._tokens.settle(cost, cost if actual is None else actual)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def run(self, fn: Callable[[], Any], priority: Priority = Priority.INTERACTIVE,
+            estimated_tokens: int = 0, retry_if: Optional[Callable[[], bool]] = None) -> Any:
+        """Call fn() once admitted, retrying transient API errors.
+
+        If given, retry_if() is asked before each retry; False fails the call.
+        """
+        cost = estimated_tokens + self.expected_output_tokens
+        seq = next(self._seq)  # retries keep their place within the lane
+        attempt = 0
+        while True:
+            self._acquire(priority, cost, seq, time.monotonic() + self.queue_timeout)
+            try:
+                result = fn()
+            except Exception as e:
+                self._release(cost, None)
+                retry_after = _retry_after(e)
+                if (retry_after is None or attempt >= self.max_retries
+                        or (retry_if is not None and not retry_if())):
+                    with self._cond:
+                        self._stats["failed"] += 1
+                    raise
+                delay = retry_after or self._backoff(attempt)
+                attempt += 1
+                with self._cond:
+                    self._stats["retries"] += 1
+                    if isinstance(e, openai.RateLimitError):
+                        self._stats["rate_limited"] += 1
+                    elif isinstance(e, openai.APIStatusError):
+                        self._stats["server_errors"] += 1
+                print(f"[LLMScheduler] {type(e).__name__}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            self._release(cost, _usage_tokens(result))
+            return result
+
+    def invoke(self, llm, messages: list, priority: Priority = Priority.INTERACTIVE) -> Any:
+        """llm.invoke(messages) through the scheduler."""
+        return self.run(lambda: llm.invoke(messages), priority, count_message_tokens(messages))
+
+    def stream(self, llm, messages: list, priority: Priority = Priority.INTERACTIVE) -> Any:
+        """llm.stream(messages) through the scheduler, joined into one message.
+
+        Tokens reach the caller's callbacks (e.g. LangGraph's messages
+        stream) as they arrive, so a call that fails after its first token
+        is not retried: the retry would repeat text already delivered.
+        """
+        emitted = False
+
+        def call():
+            nonlocal emitted
+            message = AIMessageChunk(content="")
+            for chunk in llm.stream(messages):
+                if chunk.content:
+                    emitted = True
+                message = message + chunk
+            return message
+
+        return self.run(call, priority, count_message_tokens(messages), retry_if=lambda: not emitted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self._requests.wait_time(0, now)
+            self._tokens.wait_time(0, now)
+            return {
+                **self._stats,
+                "in_flight": self._in_flight,
+                "waiting": {lane.name.lower(): sum(1 for p, _ in self._waiting if p == lane) for lane in Priority},
+                "lanes": {
+                    lane.name.lower(): {
+                        "admitted": s["admitted"],
+                        "timeouts": s["timeouts"],
+                        "avg_wait_ms": round(s["wait_total"] / s["admitted"] * 1000, 3) if s["admitted"] else 0.0,
+                        "max_wait_ms": round(s["wait_max"] * 1000, 3),
+                    }
+                    for lane, s in self._lanes.items()
+                },
+                "max_concurrency": self.max_concurrency,
+                "reserved_interactive": self.reserved_interactive,
+                "requests_available": round(self._requests.level, 1) if self._requests.capacity > 0 else None,
+                "tokens_available": round(self._tokens.level, 1) if self._tokens.capacity > 0 else None,
+            }
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    reserved_interactive=LLM_RESERVED_INTERACTIVE,
+    rpm=LLM_RPM_LIMIT,
+    tpm=LLM_TPM_LIMIT,
+    expected_output_tokens=LLM_EXPECTED_OUTPUT_TOKENS,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE,
+    backoff_max=LLM_BACKOFF_MAX,
+    queue_timeout=LLM_QUEUE_TIMEOUT,
+)
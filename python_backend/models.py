@@ -1,18 +1,46 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import atexit
+import base64
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+import select
+import threading
+import time
 import uuid
 
-DATABASE_URL = os.environ.get("DATABASE_URL")
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
+
+from db_pool import DATABASE_URL, get_pool
+from counters import ShardedCounter, PeriodicFlusher
+from hashing import tx_hash
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+AGENT_USES_FLUSH_INTERVAL = float(os.environ.get("AGENT_USES_FLUSH_INTERVAL", "2"))
+AGENT_CATALOG_TTL = float(os.environ.get("AGENT_CATALOG_TTL", "30"))
+
+@contextmanager
+def db_cursor(commit=False):
+    """Borrow a pooled connection and yield a cursor on it.
+
+    With commit=True the transaction is committed when the block exits
+    cleanly; otherwise the pool rolls back whatever the block left open.
+    """
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            yield cur
+            if commit:
+                conn.commit()
+        finally:
+            cur.close()
 
 def init_db():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
+    with db_cursor(commit=True) as cur:
+        _create_tables(cur)
+        run_migrations(cur)
+
+def _create_tables(cur):
     cur.execute("""
         CREATE TABLE IF NOT EXISTS agents (
             id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid()::text,
@@ -79,249 +107,938 @@ def init_db():
             created_at TIMESTAMP NOT NULL DEFAULT NOW()
         )
     """)
+
+# Versioned schema migrations, applied in order by init_db() after the base
+# tables exist. Append new entries with the next version number; never edit
+# or renumber one that has already shipped.
+MIGRATIONS = [
+    (1, "Indexes for conversation history and newest-first listings", [
+        # MessageModel.get_by_conversation: WHERE conversation_id = ? ORDER BY created_at
+        """CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+           ON messages (conversation_id, created_at, id)""",
+        # TransactionModel.get_all / DecisionLogModel.get_all: ORDER BY created_at DESC LIMIT n
+        """CREATE INDEX IF NOT EXISTS idx_transactions_created
+           ON transactions (created_at DESC, id DESC)""",
+        """CREATE INDEX IF NOT EXISTS idx_decision_logs_created
+           ON decision_logs (created_at DESC, id DESC)""",
+        # ConversationModel.get_all: ORDER BY updated_at DESC
+        """CREATE INDEX IF NOT EXISTS idx_conversations_updated
+           ON conversations (updated_at DESC, id DESC)""",
+    ]),
+    (2, "Platform counters maintained by triggers for O(1) metrics", [
+        # Each counter is spread over 16 shard rows so concurrent writers
+        # rarely touch the same row; readers sum the shards.
+        """CREATE TABLE IF NOT EXISTS platform_counters (
+               name TEXT NOT NULL,
+               shard SMALLINT NOT NULL,
+               value NUMERIC NOT NULL DEFAULT 0,
+               PRIMARY KEY (name, shard)
+           )""",
+        """CREATE OR REPLACE FUNCTION bump_platform_counter(counter_name TEXT, delta NUMERIC)
+           RETURNS void AS $$
+           BEGIN
+               IF delta IS NOT NULL AND delta <> 0 THEN
+                   INSERT INTO platform_counters (name, shard, value)
+                   VALUES (counter_name, floor(random() * 16)::smallint, delta)
+                   ON CONFLICT (name, shard)
+                   DO UPDATE SET value = platform_counters.value + EXCLUDED.value;
+               END IF;
+           END
+           $$ LANGUAGE plpgsql""",
+        # Statement-level triggers with transition tables: a multi-row
+        # INSERT bumps each counter once, not once per row.
+        """CREATE OR REPLACE FUNCTION count_transactions_inserted() RETURNS trigger AS $$
+           BEGIN
+               PERFORM bump_platform_counter('transactions', (SELECT count(*) FROM new_rows));
+               PERFORM bump_platform_counter('transaction_amount', (SELECT sum(amount) FROM new_rows));
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION count_transactions_deleted() RETURNS trigger AS $$
+           BEGIN
+               PERFORM bump_platform_counter('transactions', -(SELECT count(*) FROM old_rows));
+               PERFORM bump_platform_counter('transaction_amount', -(SELECT sum(amount) FROM old_rows));
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION count_agents_inserted() RETURNS trigger AS $$
+           BEGIN
+               PERFORM bump_platform_counter('agents', (SELECT count(*) FROM new_rows));
+               PERFORM bump_platform_counter('uses_served', (SELECT sum(uses_served) FROM new_rows));
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION count_agents_updated() RETURNS trigger AS $$
+           BEGIN
+               PERFORM bump_platform_counter('uses_served',
+                   (SELECT coalesce(sum(uses_served), 0) FROM new_rows)
+                   - (SELECT coalesce(sum(uses_served), 0) FROM old_rows));
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION count_agents_deleted() RETURNS trigger AS $$
+           BEGIN
+               PERFORM bump_platform_counter('agents', -(SELECT count(*) FROM old_rows));
+               PERFORM bump_platform_counter('uses_served', -(SELECT sum(uses_served) FROM old_rows));
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql""",
+        """CREATE TRIGGER transactions_counters_insert AFTER INSERT ON transactions
+           REFERENCING NEW TABLE AS new_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION count_transactions_inserted()""",
+        """CREATE TRIGGER transactions_counters_delete AFTER DELETE ON transactions
+           REFERENCING OLD TABLE AS old_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION count_transactions_deleted()""",
+        """CREATE TRIGGER agents_counters_insert AFTER INSERT ON agents
+           REFERENCING NEW TABLE AS new_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION count_agents_inserted()""",
+        """CREATE TRIGGER agents_counters_update AFTER UPDATE ON agents
+           REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION count_agents_updated()""",
+        """CREATE TRIGGER agents_counters_delete AFTER DELETE ON agents
+           REFERENCING OLD TABLE AS old_rows
+           FOR EACH STATEMENT EXECUTE FUNCTION count_agents_deleted()""",
+        # Backfill from existing rows; the lock holds off writers until the
+        # triggers above are committed, so nothing is counted twice or missed.
+        "LOCK TABLE agents, transactions IN SHARE MODE",
+        "DELETE FROM platform_counters WHERE name IN ('transactions', 'transaction_amount', 'agents', 'uses_served')",
+        """INSERT INTO platform_counters (name, shard, value)
+           SELECT 'transactions', 0, count(*) FROM transactions
+           UNION ALL SELECT 'transaction_amount', 0, coalesce(sum(amount), 0) FROM transactions
+           UNION ALL SELECT 'agents', 0, count(*) FROM agents
+           UNION ALL SELECT 'uses_served', 0, coalesce(sum(uses_served), 0) FROM agents""",
+    ]),
+    (3, "Agent catalog version stamp with change notifications", [
+        # Single-row version stamp for the agents table. Every statement that
+        # changes agents bumps it and announces the new version on the
+        # agent_catalog channel; NOTIFY is delivered on commit, so listeners
+        # never see a version whose rows are not visible yet.
+        """CREATE TABLE IF NOT EXISTS agent_catalog_version (
+               singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+               version BIGINT NOT NULL
+           )""",
+        "INSERT INTO agent_catalog_version (singleton, version) VALUES (TRUE, 1) ON CONFLICT DO NOTHING",
+        """CREATE OR REPLACE FUNCTION bump_agent_catalog_version() RETURNS trigger AS $$
+           DECLARE
+               new_version BIGINT;
+           BEGIN
+               UPDATE agent_catalog_version SET version = version + 1 RETURNING version INTO new_version;
+               PERFORM pg_notify('agent_catalog', new_version::text);
+               RETURN NULL;
+           END
+           $$ LANGUAGE plpgsql""",
+        """CREATE TRIGGER agents_catalog_version AFTER INSERT OR UPDATE OR DELETE ON agents
+           FOR EACH STATEMENT EXECUTE FUNCTION bump_agent_catalog_version()""",
+    ]),
+    (4, "Rolling conversation summaries", [
+        # One row per conversation: the summary covers every message up to
+        # and including (through_created_at, through_id) in history order.
+        """CREATE TABLE IF NOT EXISTS conversation_summaries (
+               conversation_id VARCHAR PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+               summary TEXT NOT NULL,
+               through_created_at TIMESTAMP NOT NULL,
+               through_id VARCHAR NOT NULL,
+               message_count INTEGER NOT NULL DEFAULT 0,
+               updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+           )""",
+    ]),
+    (5, "Sokosumi job records for the persistent job store", [
+        # The full job record lives in `job`; the other columns exist only to
+        # filter and keyset-paginate listings (job_store.py).
+        """CREATE TABLE IF NOT EXISTS sokosumi_jobs (
+               job_id VARCHAR PRIMARY KEY,
+               requester VARCHAR NOT NULL,
+               status VARCHAR NOT NULL,
+               created_at TIMESTAMP NOT NULL,
+               updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+               job JSONB NOT NULL
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_sokosumi_jobs_created ON sokosumi_jobs (created_at DESC, job_id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_sokosumi_jobs_requester ON sokosumi_jobs (requester, created_at DESC, job_id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_sokosumi_jobs_status ON sokosumi_jobs (status, created_at DESC, job_id DESC)",
+    ]),
+    (6, "Commit-ordered sequence numbers for since-polling", [
+        # created_at is assigned in Python when a row is built, and the row
+        # may be committed much later (end of the chat turn, write-behind
+        # flush, spill replay). `since` polling therefore follows seq,
+        # together with the xid added in migration 7.
+        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS seq BIGSERIAL",
+        "ALTER TABLE decision_logs ADD COLUMN IF NOT EXISTS seq BIGSERIAL",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS seq BIGSERIAL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_seq ON transactions (seq)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_decision_logs_seq ON decision_logs (seq)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_seq ON conversations (seq)",
+    ]),
+    (7, "Writer transaction ids for gap-free since-polling", [
+        # seq is drawn at INSERT time, so a transaction holding seq 5 can
+        # commit after one holding seq 6. Every transaction with an xid
+        # below the snapshot xmin has finished, though, so `since` polls
+        # read only those rows, in (xid, seq) order, and nothing can later
+        # appear behind a cursor. See _keyset_page.
+        "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id()",
+        "ALTER TABLE decision_logs ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id()",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id()",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_xid_seq ON transactions (xid, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_decision_logs_xid_seq ON decision_logs (xid, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_xid_seq ON conversations (xid, seq)",
+    ]),
+]
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent workers starting up
+# do not apply the same migration twice.
+MIGRATION_LOCK_ID = 7_240_315
+
+def run_migrations(cur):
+    """Apply every migration in MIGRATIONS that is not recorded yet."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    cur.execute("SELECT version FROM schema_migrations")
+    applied = {r["version"] for r in cur.fetchall()}
     
-    conn.commit()
-    cur.close()
-    conn.close()
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        for statement in statements:
+            cur.execute(statement)
+        cur.execute(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+            (version, description)
+        )
+        print(f"Applied schema migration {version}: {description}")
 
-def generate_tx_hash():
-    chars = "0123456789abcdef"
-    hash_val = "0x"
-    for _ in range(64):
-        hash_val += chars[int(uuid.uuid4().hex[0], 16) % 16]
-    return hash_val
+def generate_tx_hash(record=None):
+    """0x-prefixed tx hash; content-addressed over `record` when one is given."""
+    return "0x" + tx_hash(record)
 
 def truncate_tx_hash(hash_val):
     return f"{hash_val[:10]}...{hash_val[-6:]}"
 
+def encode_cursor(record, column="created_at"):
+    """Opaque pagination cursor for a record's (created_at, id) position."""
+    raw = f"{record[column].isoformat()}|{record['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, record_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), record_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def encode_feed_cursor(xid, seq):
+    """Opaque `since` cursor for a feed position: (writer xid, seq)."""
+    return base64.urlsafe_b64encode(f"feed:{xid}:{seq}".encode()).decode().rstrip("=")
+
+def feed_cursor(record):
+    """encode_feed_cursor for a feed row."""
+    return encode_feed_cursor(record["xid"], record["seq"])
+
+def feed_position(record):
+    """A feed row's (xid, seq) position, comparable across rows."""
+    return int(record["xid"]), record["seq"]
+
+def decode_feed_cursor(cursor):
+    """Inverse of encode_feed_cursor. Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, xid, seq = raw.split(":", 2)
+        if prefix != "feed":
+            raise ValueError(prefix)
+        return int(xid), int(seq)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def feed_start_cursor():
+    """`since` cursor that picks up every feed row not yet visible now.
+
+    A row that is not visible yet was written by a transaction that is
+    still open or starts later, so its xid is at least the snapshot xmin.
+    Rows at or above it that are already visible are returned again by the
+    first poll; none are skipped.
+    """
+    with db_cursor() as cur:
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS xmin")
+        return encode_feed_cursor(cur.fetchone()["xmin"], 0)
+
+def _keyset_page(table, limit=None, since=None, before=None, column="created_at"):
+    """Newest-first rows of `table`, keyset-paginated.
+
+    `before` (an encode_cursor cursor) returns rows older than it on
+    (column, id). `since` (an encode_feed_cursor cursor) returns rows
+    after it in (xid, seq) order, so a row whose created_at is older than
+    rows committed before it is still picked up. Only rows written by
+    transactions below the snapshot xmin are returned: those have all
+    finished, so no row can later commit behind the cursor, and writers
+    never wait on each other. Rows after a `since` cursor are taken
+    oldest-first, so a poller that falls more than `limit` rows behind
+    catches up page by page without gaps; the page itself is returned
+    newest first.
+    """
+    conditions, params = [], []
+    if since:
+        conditions.append(sql.SQL("(xid, seq) > (%s::xid8, %s)"))
+        conditions.append(sql.SQL("xid < pg_snapshot_xmin(pg_current_snapshot())"))
+        xid, seq = decode_feed_cursor(since)
+        params.extend((str(xid), seq))
+    if before:
+        conditions.append(sql.SQL("({}, id) < (%s, %s)").format(sql.Identifier(column)))
+        params.extend(decode_cursor(before))
+    ascending = bool(since) and not before
+    if ascending:
+        order = sql.SQL("xid ASC, seq ASC")
+    else:
+        order = sql.SQL("{column} DESC, id DESC").format(column=sql.Identifier(column))
+    query = sql.SQL("SELECT * FROM {table}{where} ORDER BY {order} LIMIT %s").format(
+        table=sql.Identifier(table),
+        where=sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL(""),
+        order=order
+    )
+    with db_cursor() as cur:
+        cur.execute(query, params + [limit])
+        rows = [dict(r) for r in cur.fetchall()]
+    if ascending:
+        rows.reverse()
+    return rows
+
+def _utcnow():
+    # Timezone-aware so Postgres converts it to the session time zone,
+    # exactly like the NOW() column defaults do.
+    return datetime.now(timezone.utc)
+
+def _insert_rows(cur, table, rows):
+    """Insert rows (dicts with identical keys) with one multi-row INSERT.
+
+    Returns the inserted records in the same order as `rows`.
+    """
+    columns = list(rows[0].keys())
+    query = sql.SQL("INSERT INTO {} ({}) VALUES %s RETURNING *").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    )
+    returned = execute_values(
+        cur, query, [tuple(row[c] for c in columns) for row in rows],
+        page_size=max(len(rows), 1), fetch=True
+    )
+    by_id = {r["id"]: dict(r) for r in returned}
+    return [by_id[row["id"]] for row in rows]
+
+def bulk_insert(cur, table, rows):
+    """Insert rows with one statement, skipping ids that already exist.
+
+    Used for replayable writes (see write_behind.py) where nothing needs
+    to be returned and the same row may be submitted more than once.
+    """
+    columns = list(rows[0].keys())
+    query = sql.SQL("INSERT INTO {} ({}) VALUES %s ON CONFLICT (id) DO NOTHING").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    )
+    execute_values(cur, query, [tuple(row[c] for c in columns) for row in rows], page_size=len(rows))
+
+def _increment_agent_uses(cur, deltas):
+    """Apply {agent_id: delta} to agents.uses_served in one UPDATE."""
+    execute_values(cur, """
+        UPDATE agents AS a SET uses_served = a.uses_served + v.delta
+        FROM (VALUES %s) AS v(id, delta)
+        WHERE a.id = v.id
+    """, list(deltas.items()), template="(%s, %s::integer)")
+
+
+# uses_served increments are coalesced in memory and written by
+# AgentModel.flush_uses() every AGENT_USES_FLUSH_INTERVAL seconds as a single
+# UPDATE ... FROM (VALUES ...), instead of one row-locking UPDATE per chat turn.
+uses_counter = ShardedCounter()
+
+def _with_pending_uses(agent):
+    """Add this process's not-yet-flushed uses to an agent record."""
+    if agent:
+        agent["uses_served"] += uses_counter.pending(agent["id"])
+    return agent
+
+
+class AgentCatalog:
+    """In-process, read-through copy of the agents table.
+
+    The table is small and read on every chat turn, so lookups are served
+    from an immutable snapshot tagged with agent_catalog_version (see
+    migration 3). Writes made through AgentModel hold reloads off until
+    they have committed (see changing()); writes from other workers
+    arrive as NOTIFY agent_catalog on a dedicated listener connection.
+    While no listener is connected the stored version is re-checked at
+    most every `ttl` seconds.
+
+    uses_served flushes bump the version too, so each worker reloads at
+    most once per AGENT_USES_FLUSH_INTERVAL under load; in between, the
+    process's own unflushed uses are merged in by AgentModel.
+    """
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._snapshot = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._load_lock = threading.Lock()
+        self._listening = False
+        self._listener = None
+        self._stop = threading.Event()
+
+    def _fresh(self, snap):
+        if snap is None or self._stale:
+            return False
+        return self._listening or time.monotonic() - self._checked_at < self.ttl
+
+    def _current(self):
+        snap = self._snapshot
+        if self._fresh(snap):
+            return snap
+        with self._load_lock:
+            snap = self._snapshot
+            if self._fresh(snap):
+                return snap
+            # Cleared before reading, so an invalidation that lands while
+            # the query runs leaves the new snapshot stale again.
+            self._stale = False
+            with db_cursor() as cur:
+                cur.execute("SELECT version FROM agent_catalog_version")
+                row = cur.fetchone()
+                version = row["version"] if row else None
+                if snap is None or version is None or version != snap["version"]:
+                    cur.execute("SELECT * FROM agents ORDER BY name")
+                    agents = [dict(a) for a in cur.fetchall()]
+                    snap = {
+                        "version": version,
+                        "agents": agents,
+                        "by_id": {a["id"]: a for a in agents},
+                        "by_name": {a["name"]: a for a in agents},
+                    }
+            self._snapshot = snap
+            self._checked_at = time.monotonic()
+            return snap
+
+    @contextmanager
+    def changing(self):
+        """Hold off reloads while the caller changes agents and commits.
+
+        The snapshot is marked stale before the change and no reload can
+        run until the block exits, so a reader cannot cache rows from
+        before the commit as current once the change is visible.
+        """
+        with self._load_lock:
+            self._stale = True
+            yield
+
+    def invalidate(self, version=None):
+        """Drop the snapshot unless it is already at `version` or newer."""
+        snap = self._snapshot
+        if version is None or snap is None or snap["version"] is None or version > snap["version"]:
+            self._stale = True
+
+    def all(self):
+        return [dict(a) for a in self._current()["agents"]]
+
+    def get_by_id(self, agent_id):
+        agent = self._current()["by_id"].get(agent_id)
+        return dict(agent) if agent else None
+
+    def get_by_name(self, name):
+        agent = self._current()["by_name"].get(name)
+        return dict(agent) if agent else None
+
+    def count(self):
+        return len(self._current()["agents"])
+
+    def start_listener(self):
+        """Listen for agent_catalog notifications on a background thread (idempotent)."""
+        if self._listener and self._listener.is_alive():
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="agent-catalog-listener", daemon=True)
+        self._listener.start()
+        atexit.register(self.stop_listener)
+
+    def stop_listener(self):
+        self._stop.set()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(DATABASE_URL)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute("LISTEN agent_catalog")
+                # Anything committed while we were not listening is unknown.
+                self.invalidate()
+                self._listening = True
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5)[0]:
+                        conn.poll()
+                        versions = [int(n.payload) for n in conn.notifies if n.payload.isdigit()]
+                        conn.notifies.clear()
+                        if versions:
+                            self.invalidate(max(versions))
+            except Exception as e:
+                print(f"[AgentCatalog] Listener disconnected, falling back to {self.ttl:.0f}s version checks: {e}")
+            finally:
+                self._listening = False
+                if conn is not None:
+                    conn.close()
+            self._stop.wait(5)
+
+
+agent_catalog = AgentCatalog(ttl=AGENT_CATALOG_TTL)
+
 
 class AgentModel:
     @staticmethod
     def get_all():
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM agents ORDER BY name")
-        agents = cur.fetchall()
-        cur.close()
-        conn.close()
-        return [dict(a) for a in agents]
-    
+        pending = uses_counter.pending_all()
+        agents = agent_catalog.all()
+        for agent in agents:
+            agent["uses_served"] += pending.get(agent["id"], 0)
+        return agents
+
     @staticmethod
     def get_by_id(agent_id):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM agents WHERE id = %s", (agent_id,))
-        agent = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(agent) if agent else None
-    
+        return _with_pending_uses(agent_catalog.get_by_id(agent_id))
+
     @staticmethod
     def get_by_name(name):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM agents WHERE name = %s", (name,))
-        agent = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(agent) if agent else None
-    
+        return _with_pending_uses(agent_catalog.get_by_name(name))
+
     @staticmethod
     def create(agent_data):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        agent_id = str(uuid.uuid4())
-        cur.execute("""
-            INSERT INTO agents (id, name, description, domain, icon, system_prompt, uses_served, avg_response_ms, is_verified, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING *
-        """, (
-            agent_id,
-            agent_data['name'],
-            agent_data['description'],
-            agent_data['domain'],
-            agent_data['icon'],
-            agent_data['system_prompt'],
-            agent_data.get('uses_served', 0),
-            agent_data.get('avg_response_ms', 1000),
-            agent_data.get('is_verified', True),
-            agent_data.get('status', 'online')
-        ))
-        agent = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with agent_catalog.changing(), db_cursor(commit=True) as cur:
+            agent_id = str(uuid.uuid4())
+            cur.execute("""
+                INSERT INTO agents (id, name, description, domain, icon, system_prompt, uses_served, avg_response_ms, is_verified, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING *
+            """, (
+                agent_id,
+                agent_data['name'],
+                agent_data['description'],
+                agent_data['domain'],
+                agent_data['icon'],
+                agent_data['system_prompt'],
+                agent_data.get('uses_served', 0),
+                agent_data.get('avg_response_ms', 1000),
+                agent_data.get('is_verified', True),
+                agent_data.get('status', 'online')
+            ))
+            agent = cur.fetchone()
         return dict(agent)
     
     @staticmethod
-    def increment_uses(agent_id):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("UPDATE agents SET uses_served = uses_served + 1 WHERE id = %s", (agent_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
+    def increment_uses(agent_id, amount=1):
+        uses_counter.add(agent_id, amount)
+    
+    @staticmethod
+    def flush_uses():
+        """Write all pending uses_served increments in one statement.
+
+        The catalog is invalidated before the UPDATE commits, and the
+        in-flight deltas are dropped before any reader can reload it, so
+        readers see either the old counts plus pending or the new counts.
+        """
+        deltas = uses_counter.drain()
+        if not deltas:
+            return
+        with agent_catalog.changing():
+            try:
+                with db_cursor(commit=True) as cur:
+                    _increment_agent_uses(cur, deltas)
+            except Exception:
+                uses_counter.restore(deltas)
+                raise
+            uses_counter.commit(deltas)
     
     @staticmethod
     def count():
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) as count FROM agents")
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-        return result['count']
+        return agent_catalog.count()
 
 
 class ConversationModel:
     @staticmethod
-    def get_all():
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM conversations ORDER BY updated_at DESC")
-        conversations = cur.fetchall()
-        cur.close()
-        conn.close()
-        return [dict(c) for c in conversations]
+    def get_all(limit=None, since=None, before=None):
+        return _keyset_page("conversations", limit, since, before, column="updated_at")
     
     @staticmethod
     def get_by_id(conversation_id):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM conversations WHERE id = %s", (conversation_id,))
-        conversation = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(conversation) if conversation else None
+        with db_cursor() as cur:
+            cur.execute("SELECT * FROM conversations WHERE id = %s", (conversation_id,))
+            conversation = cur.fetchone()
+            return dict(conversation) if conversation else None
     
     @staticmethod
     def create(title="New Conversation", user_id=None):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        conversation_id = str(uuid.uuid4())
-        cur.execute("""
-            INSERT INTO conversations (id, title, user_id)
-            VALUES (%s, %s, %s)
-            RETURNING *
-        """, (conversation_id, title, user_id))
-        conversation = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return dict(conversation)
+        with db_cursor(commit=True) as cur:
+            conversation_id = str(uuid.uuid4())
+            cur.execute("""
+                INSERT INTO conversations (id, title, user_id)
+                VALUES (%s, %s, %s)
+                RETURNING *
+            """, (conversation_id, title, user_id))
+            conversation = cur.fetchone()
+            return dict(conversation)
 
 
 class MessageModel:
     @staticmethod
     def get_by_conversation(conversation_id):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT * FROM messages 
-            WHERE conversation_id = %s 
-            ORDER BY created_at ASC
-        """, (conversation_id,))
-        messages = cur.fetchall()
-        cur.close()
-        conn.close()
-        return [dict(m) for m in messages]
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT * FROM messages 
+                WHERE conversation_id = %s 
+                ORDER BY created_at ASC, id ASC
+            """, (conversation_id,))
+            messages = cur.fetchall()
+            return [dict(m) for m in messages]
+    
+    @staticmethod
+    def get_recent(conversation_id, n=10, after=None):
+        """The last n messages of a conversation, oldest first.
+
+        Walks idx_messages_conversation_created backwards, so the cost
+        depends on n rather than on the length of the conversation.
+        `after` is a (created_at, id) position; only later messages count.
+        """
+        after_at, after_id = after or (datetime.min, "")
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT * FROM (
+                    SELECT * FROM messages
+                    WHERE conversation_id = %s AND (created_at, id) > (%s, %s)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                ) recent
+                ORDER BY created_at ASC, id ASC
+            """, (conversation_id, after_at, after_id, n))
+            messages = cur.fetchall()
+            return [dict(m) for m in messages]
+    
+    @staticmethod
+    def get_after(conversation_id, after=None, limit=200):
+        """Up to `limit` messages following the (created_at, id) position `after`, oldest first."""
+        after_at, after_id = after or (datetime.min, "")
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT * FROM messages
+                WHERE conversation_id = %s AND (created_at, id) > (%s, %s)
+                ORDER BY created_at ASC, id ASC
+                LIMIT %s
+            """, (conversation_id, after_at, after_id, limit))
+            return [dict(m) for m in cur.fetchall()]
+    
+    @staticmethod
+    def get_page(conversation_id, before=None, limit=50):
+        """One page of a conversation, paging backwards from the newest message.
+
+        Returns (messages oldest first, cursor for the next older page or None).
+        `before` is a cursor returned by a previous call.
+        """
+        with db_cursor() as cur:
+            if before:
+                before_at, before_id = decode_cursor(before)
+                cur.execute("""
+                    SELECT * FROM messages
+                    WHERE conversation_id = %s AND (created_at, id) < (%s, %s)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """, (conversation_id, before_at, before_id, limit + 1))
+            else:
+                cur.execute("""
+                    SELECT * FROM messages
+                    WHERE conversation_id = %s
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """, (conversation_id, limit + 1))
+            messages = [dict(m) for m in cur.fetchall()]
+        
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1]) if has_more else None
+        messages.reverse()
+        return messages, next_cursor
+    
+    @staticmethod
+    def build(conversation_id, sender, content, agent_id=None, agent_name=None):
+        return {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "sender": sender,
+            "content": content,
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "created_at": _utcnow()
+        }
     
     @staticmethod
     def create(conversation_id, sender, content, agent_id=None, agent_name=None):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        message_id = str(uuid.uuid4())
-        cur.execute("""
-            INSERT INTO messages (id, conversation_id, sender, content, agent_id, agent_name)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING *
-        """, (message_id, conversation_id, sender, content, agent_id, agent_name))
-        message = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return dict(message)
+        row = MessageModel.build(conversation_id, sender, content, agent_id, agent_name)
+        with db_cursor(commit=True) as cur:
+            return _insert_rows(cur, "messages", [row])[0]
+
+
+class ConversationSummaryModel:
+    @staticmethod
+    def get(conversation_id):
+        with db_cursor() as cur:
+            cur.execute("SELECT * FROM conversation_summaries WHERE conversation_id = %s", (conversation_id,))
+            summary = cur.fetchone()
+            return dict(summary) if summary else None
+    
+    @staticmethod
+    def save(conversation_id, summary, through_created_at, through_id, message_count):
+        """Store a summary unless one covering more of the conversation exists.
+
+        Returns False when a concurrent summarizer already got further.
+        """
+        with db_cursor(commit=True) as cur:
+            cur.execute("""
+                INSERT INTO conversation_summaries
+                    (conversation_id, summary, through_created_at, through_id, message_count, updated_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+                ON CONFLICT (conversation_id) DO UPDATE SET
+                    summary = EXCLUDED.summary,
+                    through_created_at = EXCLUDED.through_created_at,
+                    through_id = EXCLUDED.through_id,
+                    message_count = EXCLUDED.message_count,
+                    updated_at = NOW()
+                WHERE (conversation_summaries.through_created_at, conversation_summaries.through_id)
+                    < (EXCLUDED.through_created_at, EXCLUDED.through_id)
+            """, (conversation_id, summary, through_created_at, through_id, message_count))
+            return cur.rowcount > 0
+
+
+class SokosumiJobModel:
+    @staticmethod
+    def get(job_id):
+        with db_cursor() as cur:
+            cur.execute("SELECT job FROM sokosumi_jobs WHERE job_id = %s", (job_id,))
+            row = cur.fetchone()
+            return row["job"] if row else None
+    
+    @staticmethod
+    def save(job):
+        with db_cursor(commit=True) as cur:
+            cur.execute("""
+                INSERT INTO sokosumi_jobs (job_id, requester, status, created_at, updated_at, job)
+                VALUES (%s, %s, %s, %s, NOW(), %s)
+                ON CONFLICT (job_id) DO UPDATE SET
+                    status = EXCLUDED.status,
+                    updated_at = NOW(),
+                    job = EXCLUDED.job
+            """, (job["job_id"], job["requester"], job["status"], job["created_at"], Json(job)))
+    
+    @staticmethod
+    def _filters(requester=None, status=None):
+        conditions, params = [], []
+        if requester:
+            conditions.append("requester = %s")
+            params.append(requester)
+        if status:
+            conditions.append("status = %s")
+            params.append(status)
+        return conditions, params
+    
+    @staticmethod
+    def list(requester=None, status=None, limit=20, before=None):
+        """Newest-first jobs, keyset-paginated on (created_at, job_id).
+        
+        `before` is a (created_at, job_id) position from decode_cursor.
+        """
+        conditions, params = SokosumiJobModel._filters(requester, status)
+        if before:
+            conditions.append("(created_at, job_id) < (%s, %s)")
+            params.extend(before)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with db_cursor() as cur:
+            cur.execute(
+                f"SELECT job FROM sokosumi_jobs{where} ORDER BY created_at DESC, job_id DESC LIMIT %s",
+                params + [limit]
+            )
+            return [r["job"] for r in cur.fetchall()]
+    
+    @staticmethod
+    def count(requester=None, status=None):
+        conditions, params = SokosumiJobModel._filters(requester, status)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with db_cursor() as cur:
+            cur.execute(f"SELECT count(*) AS total FROM sokosumi_jobs{where}", params)
+            return cur.fetchone()["total"]
 
 
 class TransactionModel:
     @staticmethod
-    def get_all(limit=20):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT * FROM transactions 
-            ORDER BY created_at DESC 
-            LIMIT %s
-        """, (limit,))
-        transactions = cur.fetchall()
-        cur.close()
-        conn.close()
-        return [dict(t) for t in transactions]
+    def get_all(limit=20, since=None, before=None):
+        return _keyset_page("transactions", limit, since, before)
+    
+    @staticmethod
+    def build(from_agent_name, to_agent_name, amount="0.004", from_agent_id=None, to_agent_id=None, status="pending"):
+        row = {
+            "id": str(uuid.uuid4()),
+            "from_agent_id": from_agent_id,
+            "to_agent_id": to_agent_id,
+            "from_agent_name": from_agent_name,
+            "to_agent_name": to_agent_name,
+            "amount": amount,
+            "status": status,
+            "created_at": _utcnow()
+        }
+        row["tx_hash"] = truncate_tx_hash(generate_tx_hash(row))
+        return row
     
     @staticmethod
     def create(from_agent_name, to_agent_name, amount="0.004", from_agent_id=None, to_agent_id=None, status="pending"):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        tx_id = str(uuid.uuid4())
-        tx_hash = truncate_tx_hash(generate_tx_hash())
-        cur.execute("""
-            INSERT INTO transactions (id, from_agent_id, to_agent_id, from_agent_name, to_agent_name, amount, tx_hash, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING *
-        """, (tx_id, from_agent_id, to_agent_id, from_agent_name, to_agent_name, amount, tx_hash, status))
-        transaction = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return dict(transaction)
+        row = TransactionModel.build(from_agent_name, to_agent_name, amount, from_agent_id, to_agent_id, status)
+        with db_cursor(commit=True) as cur:
+            return _insert_rows(cur, "transactions", [row])[0]
     
     @staticmethod
     def update_status(tx_id, status):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("UPDATE transactions SET status = %s WHERE id = %s", (status, tx_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_cursor(commit=True) as cur:
+            cur.execute("UPDATE transactions SET status = %s WHERE id = %s", (status, tx_id))
 
 
 class DecisionLogModel:
     @staticmethod
-    def get_all(limit=20):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT * FROM decision_logs 
-            ORDER BY created_at DESC 
-            LIMIT %s
-        """, (limit,))
-        logs = cur.fetchall()
-        cur.close()
-        conn.close()
-        return [dict(l) for l in logs]
+    def get_all(limit=20, since=None, before=None):
+        return _keyset_page("decision_logs", limit, since, before)
+    
+    @staticmethod
+    def build(agent_name, action, details=None, agent_id=None, conversation_id=None, status="pending"):
+        row = {
+            "id": str(uuid.uuid4()),
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "action": action,
+            "details": details,
+            "status": status,
+            "conversation_id": conversation_id,
+            "created_at": _utcnow()
+        }
+        row["tx_hash"] = truncate_tx_hash(generate_tx_hash(row))
+        return row
     
     @staticmethod
     def create(agent_name, action, details=None, agent_id=None, conversation_id=None, status="pending"):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        log_id = str(uuid.uuid4())
-        tx_hash = truncate_tx_hash(generate_tx_hash())
-        cur.execute("""
-            INSERT INTO decision_logs (id, agent_id, agent_name, action, details, tx_hash, status, conversation_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING *
-        """, (log_id, agent_id, agent_name, action, details, tx_hash, status, conversation_id))
-        log = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return dict(log)
+        row = DecisionLogModel.build(agent_name, action, details, agent_id, conversation_id, status)
+        with db_cursor(commit=True) as cur:
+            return _insert_rows(cur, "decision_logs", [row])[0]
     
     @staticmethod
     def update_status(log_id, status):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("UPDATE decision_logs SET status = %s WHERE id = %s", (status, log_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_cursor(commit=True) as cur:
+            cur.execute("UPDATE decision_logs SET status = %s WHERE id = %s", (status, log_id))
+
+
+class MetricsModel:
+    @staticmethod
+    def get_totals():
+        """Exact platform totals from the trigger-maintained platform_counters.
+
+        Returns {"transactions", "transaction_amount", "agents", "uses_served"};
+        the cost is a scan of a few dozen counter rows regardless of table sizes.
+        """
+        with db_cursor() as cur:
+            cur.execute("SELECT name, SUM(value) AS value FROM platform_counters GROUP BY name")
+            counters = {r["name"]: r["value"] for r in cur.fetchall()}
+        return {
+            "transactions": int(counters.get("transactions", 0)),
+            "transaction_amount": counters.get("transaction_amount", 0),
+            "agents": int(counters.get("agents", 0)),
+            "uses_served": int(counters.get("uses_served", 0)) + sum(uses_counter.pending_all().values())
+        }
+
+
+class UnitOfWork:
+    """Collects the writes of one request and flushes them in a single transaction.
+
+    add_* methods return the row dict immediately (with its id already
+    assigned); after commit() the same dict is updated in place with the
+    stored record. Rows for the same table go out as one multi-row INSERT.
+
+    If `deferred` is given (an object with submit(table, row), such as
+    write_behind.audit_queue), decision logs and transactions are handed
+    to it after the commit instead of being inserted inline. uses_served
+    increments go to the coalescing uses_counter after the commit.
+
+        with UnitOfWork() as uow:
+            msg = uow.add_message(conversation_id, "user", text)
+            ...
+        # committed here; msg now holds the database record
+    """
+    
+    # Insert order: parents before children.
+    TABLE_ORDER = ("messages", "decision_logs", "transactions")
+    DEFERRABLE_TABLES = ("decision_logs", "transactions")
+    
+    def __init__(self, deferred=None):
+        self.deferred = deferred
+        self._rows = {table: [] for table in self.TABLE_ORDER}
+        self._uses = {}
+    
+    def add_message(self, conversation_id, sender, content, agent_id=None, agent_name=None):
+        row = MessageModel.build(conversation_id, sender, content, agent_id, agent_name)
+        self._rows["messages"].append(row)
+        return row
+    
+    def add_decision_log(self, agent_name, action, details=None, agent_id=None, conversation_id=None, status="pending"):
+        row = DecisionLogModel.build(agent_name, action, details, agent_id, conversation_id, status)
+        self._rows["decision_logs"].append(row)
+        return row
+    
+    def add_transaction(self, from_agent_name, to_agent_name, amount="0.004", from_agent_id=None, to_agent_id=None, status="pending"):
+        row = TransactionModel.build(from_agent_name, to_agent_name, amount, from_agent_id, to_agent_id, status)
+        self._rows["transactions"].append(row)
+        return row
+    
+    def increment_uses(self, agent_id, amount=1):
+        self._uses[agent_id] = self._uses.get(agent_id, 0) + amount
+    
+    def commit(self):
+        """Write everything collected so far with one COMMIT."""
+        deferred_tables = self.DEFERRABLE_TABLES if self.deferred is not None else ()
+        inline_tables = [t for t in self.TABLE_ORDER if t not in deferred_tables and self._rows[t]]
+        if inline_tables:
+            with db_cursor(commit=True) as cur:
+                for table in inline_tables:
+                    rows = self._rows[table]
+                    for row, stored in zip(rows, _insert_rows(cur, table, rows)):
+                        row.update(stored)
+        for agent_id, amount in self._uses.items():
+            AgentModel.increment_uses(agent_id, amount)
+        for table in deferred_tables:
+            for row in self._rows[table]:
+                self.deferred.submit(table, row)
+        self._reset()
+    
+    def rollback(self):
+        """Discard everything collected so far."""
+        self._reset()
+    
+    def _reset(self):
+        self._rows = {table: [] for table in self.TABLE_ORDER}
+        self._uses = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+
+uses_flusher = PeriodicFlusher(AgentModel.flush_uses, AGENT_USES_FLUSH_INTERVAL, name="agent-uses-flusher")
@@ -1,18 +1,41 @@
 """OpenAI integration service for AgentHub."""
-import os
 import json
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from agents import get_agent_system_prompt, create_agent_graph
+from typing import Iterator
+from langchain_core.messages import SystemMessage, HumanMessage
+from agents import agent_graphs, AgentResponseError, ERROR_RESPONSE_PREFIX
+from llm_clients import get_chat_model
+from llm_scheduler import llm_scheduler, Priority
+from cache import routing_cache, normalize_text
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# Routing menu shared by analyze_user_request and the merged planner in routing.py.
+AGENT_SPECIALTIES = """- SocialGenie: Social media, content creation, posting, engagement
+- MailMind: Email marketing, newsletters, campaigns, email automation
+- ComplianceGuard: AML, KYC, regulatory compliance, risk monitoring
+- InsightBot: Data analytics, business intelligence, reporting, metrics
+- ShopAssist: E-commerce, customer support, orders, returns
+- StyleAdvisor: Product recommendations, styling, fashion, design
+- YieldMaximizer: DeFi, yield farming, liquidity pools, APY optimization
+- TradeMind: Trading, market analysis, technical analysis, crypto markets
+"""
+
+def _agent_state(agent_name, system_prompt, user_message, conversation_history,
+                 collaboration_context, conversation_summary) -> dict:
+    return {
+        "agent_name": agent_name,
+        "system_prompt": system_prompt,
+        "user_input": user_message,
+        "messages": conversation_history or [],
+        "collaboration_context": collaboration_context,
+        "conversation_summary": conversation_summary,
+    }
 
 def get_agent_response(
     agent_name: str,
     system_prompt: str,
     user_message: str,
     conversation_history=None,
-    collaboration_context: str = None
+    collaboration_context: str = None,
+    conversation_summary: str = None
 ) -> str:
     """
     Get a response from an agent using LangGraph and OpenAI.
@@ -23,57 +46,49 @@ def get_agent_response(
         user_message: The user's message
         conversation_history: List of previous messages [{"role": "user"|"assistant", "content": "..."}]
         collaboration_context: Optional context from hired Sokosumi agents
+        conversation_summary: Optional rolling summary of the turns before
+            conversation_history (see summarizer.py)
     
     Returns:
         The agent's response text
     """
-    if conversation_history is None:
-        conversation_history = []
-    
-    collaboration_instructions = ""
-    if collaboration_context:
-        collaboration_instructions = f"""
-
-## External Agent Collaboration
-You have hired specialized agents from the Sokosumi marketplace to help with this request.
-Use their findings to enhance your response. Reference the external agent insights naturally.
-
-{collaboration_context}
-
-IMPORTANT: 
-- Integrate the external agent results into your response naturally
-- Credit the external agents when using their specific findings
-- If results are simulated, still use them as if they were real data"""
-    
-    enhanced_system_prompt = f"""{system_prompt}
+    try:
+        return agent_graphs.run(agent_name, _agent_state(
+            agent_name, system_prompt, user_message, conversation_history,
+            collaboration_context, conversation_summary
+        ))
+    except Exception as e:
+        print(f"OpenAI API error: {e}")
+        return f"{ERROR_RESPONSE_PREFIX} {str(e)}. Please try again."
 
-Additional context:
-- You are {agent_name} on the AgentHub platform
-- Your responses are logged on-chain via Cardano blockchain
-- All transactions use Hydra Layer 2 micropayments (~$0.004)
-- You have a verified Masumi DID identity
-- You can hire specialized agents from the Sokosumi marketplace for expert assistance
-- Provide helpful, accurate, and actionable responses
-- When collaborating with external agents, mention what specialized help you obtained{collaboration_instructions}"""
+def stream_agent_response(
+    agent_name: str,
+    system_prompt: str,
+    user_message: str,
+    conversation_history=None,
+    collaboration_context: str = None,
+    conversation_summary: str = None
+) -> Iterator[str]:
+    """
+    Stream a response from an agent, yielding text chunks as the model produces them.
     
+    Takes the same arguments as get_agent_response; joining the chunks gives
+    the full response. If the call fails, AgentResponseError is raised after
+    the chunks already produced, with those chunks as its `partial` text.
+    """
+    streamed = []
     try:
-        llm = ChatOpenAI(model="gpt-4o", api_key=OPENAI_API_KEY, temperature=0.7)
-        
-        messages = [SystemMessage(content=enhanced_system_prompt)]
-        
-        for msg in conversation_history[-10:]:
-            if msg.get("role") == "user":
-                messages.append(HumanMessage(content=msg.get("content", "")))
-            else:
-                messages.append(AIMessage(content=msg.get("content", "")))
-        
-        messages.append(HumanMessage(content=user_message))
-        
-        response = llm.invoke(messages)
-        return response.content
+        for chunk in agent_graphs.stream(agent_name, _agent_state(
+            agent_name, system_prompt, user_message, conversation_history,
+            collaboration_context, conversation_summary
+        )):
+            streamed.append(chunk)
+            yield chunk
+    except AgentResponseError:
+        raise
     except Exception as e:
         print(f"OpenAI API error: {e}")
-        return f"I apologize, but I encountered an error processing your request: {str(e)}. Please try again."
+        raise AgentResponseError(str(e), partial="".join(streamed)) from e
 
 def analyze_user_request(user_message: str) -> dict:
     """
@@ -85,18 +100,15 @@ def analyze_user_request(user_message: str) -> dict:
     Returns:
         Dictionary with selected_agents list and analysis
     """
+    cache_key = ("route", normalize_text(user_message))
+    cached = routing_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     system_prompt = """You are the AgentHub routing system. Analyze user requests and determine which specialized agent should handle them.
 
 Available agents and their specialties:
-- SocialGenie: Social media, content creation, posting, engagement
-- MailMind: Email marketing, newsletters, campaigns, email automation
-- ComplianceGuard: AML, KYC, regulatory compliance, risk monitoring
-- InsightBot: Data analytics, business intelligence, reporting, metrics
-- ShopAssist: E-commerce, customer support, orders, returns
-- StyleAdvisor: Product recommendations, styling, fashion, design
-- YieldMaximizer: DeFi, yield farming, liquidity pools, APY optimization
-- TradeMind: Trading, market analysis, technical analysis, crypto markets
-
+""" + AGENT_SPECIALTIES + """
 Analyze the user's message and respond with JSON:
 {
     "selected_agents": ["AgentName"],
@@ -108,19 +120,21 @@ If the request is general or doesn't fit any agent, use "AgentHub" as the agent.
 If multiple agents should collaborate, list all relevant agents and set requires_collaboration to true."""
 
     try:
-        llm = ChatOpenAI(model="gpt-4o", api_key=OPENAI_API_KEY, temperature=0.3)
+        llm = get_chat_model("gpt-4o", temperature=0.3)
         
-        response = llm.invoke([
+        response = llm_scheduler.invoke(llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_message)
-        ])
+        ], Priority.ROUTING)
         
         result = json.loads(response.content)
-        return {
+        analysis = {
             "selected_agents": result.get("selected_agents", ["AgentHub"]),
             "analysis": result.get("analysis", "Processing your request"),
             "requires_collaboration": result.get("requires_collaboration", False)
         }
+        routing_cache.set(cache_key, analysis)
+        return analysis
     except Exception as e:
         print(f"OpenAI analysis error: {e}")
         return {
@@ -0,0 +1,127 @@
+"""
+Token budgets for agent prompts.
+
+Tokens are counted locally with tiktoken's encoding for the chat model
+when tiktoken and its encoding file are available, and estimated at four
+characters per token otherwise. The estimate is only used to decide what
+to keep, so being a little off is harmless.
+
+build_agent_messages (agents.py) spends each agent's input budget in this
+order: system prompt and platform context, the user message, the rolling
+conversation summary, collaboration results (capped on their own), and
+then as many of the most recent history messages as still fit. Older
+turns are not lost: summarizer.py folds them into the summary.
+
+Configuration (environment variables):
+    PROMPT_TOKEN_BUDGET          input tokens per agent call (default 4000)
+    PROMPT_TOKEN_BUDGETS         per-agent overrides, e.g.
+                                 "InsightBot:8000,ShopAssist:2500"
+    PROMPT_COLLABORATION_TOKENS  cap on the collaboration context (default 1200)
+    PROMPT_MESSAGE_TOKENS        cap on any single history message (default 800)
+"""
+
+import os
+import math
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: falls back to a character-based estimate
+    tiktoken = None
+
+TOKENIZER_MODEL = "gpt-4o"
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "4000"))
+PROMPT_COLLABORATION_TOKENS = int(os.environ.get("PROMPT_COLLABORATION_TOKENS", "1200"))
+PROMPT_MESSAGE_TOKENS = int(os.environ.get("PROMPT_MESSAGE_TOKENS", "800"))
+
+
+def _parse_budgets(raw: str) -> Dict[str, int]:
+    budgets = {}
+    for item in raw.split(","):
+        name, _, value = item.partition(":")
+        if name.strip() and value.strip():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+PROMPT_TOKEN_BUDGETS = _parse_budgets(os.environ.get("PROMPT_TOKEN_BUDGETS", ""))
+
+# Chat formatting overhead per message (role markers and separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = " [...truncated]"
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def load_tokenizer():
+    """tiktoken encoding for the chat model, or None to use the estimate.
+
+    The first call may download the encoding file, so call this at startup
+    rather than on the first request.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                if tiktoken is not None:
+                    try:
+                        _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+                    except Exception as e:
+                        # The encoding file is downloaded on first use.
+                        print(f"[PromptBudget] tiktoken unavailable, estimating tokens: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+
+def budget_for(agent_name: str) -> int:
+    """Input token budget for one call of this agent."""
+    return PROMPT_TOKEN_BUDGETS.get(agent_name, PROMPT_TOKEN_BUDGET)
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    encoding = load_tokenizer()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def count_message_tokens(messages: List) -> int:
+    """Prompt tokens for a list of LangChain messages."""
+    return sum(count_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def truncate_to_tokens(text: Optional[str], max_tokens: int) -> str:
+    """text cut to at most max_tokens (marker included) when it is longer."""
+    if not text or count_tokens(text) <= max_tokens:
+        return text or ""
+    keep = max(max_tokens - count_tokens(TRUNCATION_MARKER), 0)
+    encoding = load_tokenizer()
+    if encoding is not None:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+    else:
+        head = text[:keep * 4]
+    return head.rstrip() + TRUNCATION_MARKER
+
+
+def fit_history(history: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+    """The most recent messages of history whose tokens fit in budget, oldest first.
+
+    Each message is capped at PROMPT_MESSAGE_TOKENS first. Stops at the
+    first message that does not fit so the kept turns stay contiguous.
+    """
+    kept = []
+    remaining = budget
+    for msg in reversed(history):
+        content = truncate_to_tokens(msg.get("content", ""), PROMPT_MESSAGE_TOKENS)
+        cost = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if cost > remaining:
+            break
+        kept.append({**msg, "content": content})
+        remaining -= cost
+    kept.reverse()
+    return kept
@@ -0,0 +1,346 @@
+"""
+Speculative routing pipeline for chat turns.
+
+Without an explicit agent, a chat turn used to make three LLM calls in
+series: routing (analyze_user_request), collaboration analysis for the
+routed agent (analyze_collaboration_need), then the response. The
+collaboration analysis only needs the agent's name, so while the routing
+call is in flight we start it for the most likely agents, ranked by
+keyword overlap with AGENT_TO_SOKOSUMI_MAPPING. When routing picks one of
+them its analysis is usually ready already, which takes a full LLM round
+trip off the critical path. Losing candidates are cancelled if they have
+not started yet; ones already running finish in the background and their
+results are discarded. Collaboration analysis has no side effects, so a
+wasted speculation costs only tokens.
+
+Before any of that, plan_request() tries to do both jobs in one call: a
+single prompt that lists the AgentHub agents and the Sokosumi agents once
+and asks for the routed agent, the hires and the strategy together. The
+speculative two-step path above is the fallback when the plan call fails
+or returns something unusable.
+
+And before any LLM is involved, KeywordRouter scores the message against
+the keyword lists in AGENT_TO_SOKOSUMI_MAPPING. Messages it matches with
+confidence at or above ROUTING_LOCAL_THRESHOLD are routed without a
+network call; only the rest are escalated to the LLM. routing_stats()
+reports a confidence histogram of every message seen, for tuning the
+threshold.
+
+The LLM stages are cached per normalized message (and agent) in
+cache.routing_cache, so repeated prompts skip them entirely.
+
+Configuration (environment variables):
+    ROUTING_LOCAL_THRESHOLD    keyword-router confidence needed to skip the
+                               LLM (default 0.75; above 1 disables it)
+    ROUTING_PLANNER            use the merged plan call first (default 1)
+    ROUTING_SPECULATION_WIDTH  candidate agents analyzed speculatively (default 2, 0 disables)
+    ROUTING_WORKERS            threads for speculative analyses (default 8)
+"""
+
+import os
+import re
+import json
+import math
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+import sokosumi_service
+from cache import routing_cache, normalize_text
+from llm_clients import get_chat_model
+from llm_scheduler import llm_scheduler, Priority
+from openai_service import AGENT_SPECIALTIES, analyze_user_request
+from agent_collaboration import (
+    AGENT_TO_SOKOSUMI_MAPPING,
+    analyze_collaboration_need,
+    attach_agent_details,
+    describe_sokosumi_agents,
+)
+
+ROUTING_LOCAL_THRESHOLD = float(os.environ.get("ROUTING_LOCAL_THRESHOLD", "0.75"))
+ROUTING_PLANNER = os.environ.get("ROUTING_PLANNER", "1") not in ("0", "false", "no")
+ROUTING_SPECULATION_WIDTH = int(os.environ.get("ROUTING_SPECULATION_WIDTH", "2"))
+ROUTING_WORKERS = int(os.environ.get("ROUTING_WORKERS", "8"))
+
+PLAN_PROMPT = """You are the AgentHub planner. For each user request, pick the AgentHub agent that should answer it and the Sokosumi marketplace agents it should hire to help.
+
+AgentHub agents and their specialties:
+{specialties}
+Use "AgentHub" if the request is general or fits none of them.
+
+Preferred Sokosumi partners per AgentHub agent:
+{partners}
+
+Available Sokosumi agents:
+{sokosumi_agents}
+
+Unless the selected agent is "AgentHub", always recommend at least one relevant Sokosumi agent (at most 3), with confidence 0.85 or higher for substantive requests.
+
+Respond with JSON only:
+{{
+    "selected_agent": "AgentName",
+    "analysis": "Brief explanation of why this agent was selected",
+    "collaboration": {{
+        "needs_collaboration": true,
+        "confidence": 0.85,
+        "reason": "Why the hires help",
+        "recommended_agents": [
+            {{
+                "agent_id": "id from list",
+                "agent_name": "name",
+                "task_description": "specific task for this agent",
+                "priority": 1,
+                "depends_on": ["agent_id of each agent whose output this task needs"]
+            }}
+        ],
+        "collaboration_strategy": "parallel" or "sequential"
+    }}
+}}
+
+Use "sequential" when a task needs another hired agent's output, and list those agents in its depends_on; otherwise use "parallel" and leave depends_on empty."""
+
+_executor = ThreadPoolExecutor(max_workers=ROUTING_WORKERS, thread_name_prefix="routing")
+
+_stats_lock = threading.Lock()
+_stats = {
+    "routed": 0,
+    "routed_locally": 0,
+    "escalated": 0,
+    "planned": 0,
+    "plan_fallbacks": 0,
+    "speculated": 0,
+    "speculation_hits": 0,
+    "speculation_misses": 0,
+    "speculations_cancelled": 0,
+    "speculations_discarded": 0,
+}
+
+
+# Keyword-router confidence of every routed message, in tenths (0.0-0.1, ..., 0.9-1.0).
+_confidence_histogram = [0] * 10
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            _stats[key] += value
+
+
+def routing_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {
+            **_stats,
+            "local_threshold": ROUTING_LOCAL_THRESHOLD,
+            "cache": routing_cache.stats(),
+            "confidence_histogram": {
+                f"{i / 10:.1f}-{(i + 1) / 10:.1f}": n for i, n in enumerate(_confidence_histogram)
+            },
+        }
+
+
+class KeywordRouter:
+    """Deterministic agent classifier over per-agent keyword lists.
+
+    All keywords are compiled into one case-insensitive alternation,
+    longest first and on word boundaries, so a message is scanned once and
+    "market research" wins over "market". Each distinct keyword found adds
+    its inverse document frequency to every agent that lists it: "crypto",
+    listed by two agents, counts for less than "kyc", listed by one.
+
+    Confidence combines the winner's share of the total score with how much
+    evidence there is: share * (1 - exp(-score / w)), where w is the weight
+    of a keyword unique to one agent. One unique keyword gives 0.63, two
+    give 0.86; a tie between two agents never exceeds 0.5.
+    """
+
+    def __init__(self, mapping: Dict[str, Dict[str, Any]]):
+        agents_for: Dict[str, List[str]] = defaultdict(list)
+        for agent_name, entry in mapping.items():
+            for keyword in entry["keywords"]:
+                if agent_name not in agents_for[keyword.lower()]:
+                    agents_for[keyword.lower()].append(agent_name)
+        n = len(mapping)
+        self.agents_for = dict(agents_for)
+        self.weights = {kw: math.log((1 + n) / (1 + len(agents))) + 1 for kw, agents in agents_for.items()}
+        self.unit = max(self.weights.values()) if self.weights else 1.0
+        self.order = {agent_name: i for i, agent_name in enumerate(mapping)}
+        alternation = "|".join(re.escape(kw) for kw in sorted(self.weights, key=len, reverse=True))
+        self.pattern = re.compile(r"\b(?:" + alternation + r")\b", re.IGNORECASE) if alternation else None
+
+    def scores(self, text: str) -> Tuple[Dict[str, float], List[str]]:
+        """Per-agent scores and the distinct keywords matched."""
+        if not self.pattern:
+            return {}, []
+        matched = sorted({m.group(0).lower() for m in self.pattern.finditer(text)})
+        scores: Dict[str, float] = defaultdict(float)
+        for keyword in matched:
+            for agent_name in self.agents_for[keyword]:
+                scores[agent_name] += self.weights[keyword]
+        return dict(scores), matched
+
+    def ranked(self, text: str) -> List[Tuple[str, float]]:
+        """Matching agents, best first; ties keep the mapping's order."""
+        scores, _ = self.scores(text)
+        return sorted(scores.items(), key=lambda item: (-item[1], self.order[item[0]]))
+
+    def classify(self, text: str) -> Tuple[Optional[str], float, List[str]]:
+        """Best agent (or None), its confidence in [0, 1) and the matched keywords."""
+        scores, matched = self.scores(text)
+        if not scores:
+            return None, 0.0, matched
+        agent_name, top = min(scores.items(), key=lambda item: (-item[1], self.order[item[0]]))
+        share = top / sum(scores.values())
+        confidence = share * (1 - math.exp(-top / self.unit))
+        return agent_name, confidence, matched
+
+
+keyword_router = KeywordRouter(AGENT_TO_SOKOSUMI_MAPPING)
+
+
+def rank_candidates(user_message: str, limit: int) -> List[str]:
+    """Agents whose collaboration keywords appear in the message, best match first."""
+    return [name for name, _ in keyword_router.ranked(user_message)[:limit]]
+
+
+@dataclass
+class RoutingDecision:
+    """Routing result plus any collaboration analysis computed alongside it."""
+    analysis: Dict[str, Any]
+    collaboration: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def agent_name(self) -> str:
+        selected = self.analysis.get("selected_agents") or ["AgentHub"]
+        return selected[0]
+
+    def collaboration_for(self, agent_name: str) -> Optional[Dict[str, Any]]:
+        """Precomputed analyze_collaboration_need result for this agent, if any."""
+        return self.collaboration.get(agent_name)
+
+
+def _decision_from_plan(plan: Dict[str, Any]) -> RoutingDecision:
+    selected = plan["selected_agent"]
+    collaboration = plan["collaboration"]
+    decision = RoutingDecision(analysis={
+        "selected_agents": [selected],
+        "analysis": plan.get("analysis") or "Processing your request",
+        "requires_collaboration": bool(collaboration.get("needs_collaboration"))
+    })
+    if selected != "AgentHub":
+        decision.collaboration[selected] = collaboration
+    return decision
+
+
+def plan_request(user_message: str) -> Optional[RoutingDecision]:
+    """Route and plan collaboration in one LLM call; None if the plan is unusable."""
+    cache_key = ("plan", normalize_text(user_message))
+    cached = routing_cache.get(cache_key)
+    if cached is not None:
+        return _decision_from_plan(cached)
+
+    agent_list = sokosumi_service.list_agents(limit=20).get("agents", [])
+    partners = "\n".join(
+        f"- {name}: {', '.join(mapping['preferred_agents'])}"
+        for name, mapping in AGENT_TO_SOKOSUMI_MAPPING.items()
+    )
+    system_prompt = PLAN_PROMPT.format(
+        specialties=AGENT_SPECIALTIES,
+        partners=partners,
+        sokosumi_agents=describe_sokosumi_agents(agent_list)
+    )
+    try:
+        llm = get_chat_model("gpt-4o", temperature=0.3).bind(response_format={"type": "json_object"})
+        response = llm_scheduler.invoke(llm, [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"User request: {user_message}")
+        ], Priority.ROUTING)
+        plan = json.loads(response.content)
+    except Exception as e:
+        print(f"[Routing] Plan call failed, falling back to two-step routing: {e}")
+        return None
+
+    if not isinstance(plan, dict):
+        plan = {}
+    selected = plan.get("selected_agent")
+    collaboration = plan.get("collaboration") or {}
+    if (selected != "AgentHub" and selected not in AGENT_TO_SOKOSUMI_MAPPING) or not isinstance(collaboration, dict):
+        print(f"[Routing] Unusable plan, falling back to two-step routing: {str(plan)[:200]}")
+        return None
+
+    attach_agent_details(collaboration)
+    plan = {"selected_agent": selected, "analysis": plan.get("analysis"), "collaboration": collaboration}
+    routing_cache.set(cache_key, plan)
+    return _decision_from_plan(plan)
+
+
+def route_request(user_message: str, plan_collaboration: bool = True) -> RoutingDecision:
+    """Route a message, planning collaboration in the same call when possible.
+
+    Falls back to routing and collaboration analysis as separate calls,
+    with the latter started speculatively for likely agents. With
+    plan_collaboration=False only the routing call is made. Messages the
+    keyword router is confident about skip all of this and make no call.
+    """
+    agent_name, confidence, matched = keyword_router.classify(user_message)
+    with _stats_lock:
+        _confidence_histogram[min(int(confidence * 10), 9)] += 1
+    if agent_name and confidence >= ROUTING_LOCAL_THRESHOLD:
+        _count(routed=1, routed_locally=1)
+        return RoutingDecision(analysis={
+            "selected_agents": [agent_name],
+            "analysis": f"Matched keywords: {', '.join(matched)} (confidence {confidence:.2f})",
+            "requires_collaboration": False
+        })
+    _count(escalated=1)
+
+    if plan_collaboration and ROUTING_PLANNER:
+        decision = plan_request(user_message)
+        if decision is not None:
+            _count(routed=1, planned=1)
+            return decision
+        _count(plan_fallbacks=1)
+
+    candidates = rank_candidates(user_message, ROUTING_SPECULATION_WIDTH) if plan_collaboration else []
+    futures: Dict[str, Future] = {
+        name: _executor.submit(analyze_collaboration_need, name, user_message)
+        for name in candidates
+    }
+
+    try:
+        analysis = analyze_user_request(user_message)
+    except BaseException:
+        for future in futures.values():
+            future.cancel()
+        raise
+    decision = RoutingDecision(analysis=analysis)
+    winner = decision.agent_name
+
+    cancelled = discarded = 0
+    for name, future in futures.items():
+        if name == winner:
+            continue
+        if future.cancel():
+            cancelled += 1
+        else:
+            discarded += 1
+
+    hit = winner in futures
+    if hit:
+        decision.collaboration[winner] = futures[winner].result()
+
+    _count(
+        routed=1,
+        speculated=len(futures),
+        speculation_hits=int(hit),
+        speculation_misses=int(bool(futures) and not hit),
+        speculations_cancelled=cancelled,
+        speculations_discarded=discarded,
+    )
+    if futures:
+        print(f"[Routing] Routed to {winner}; speculated on {', '.join(futures)} "
+              f"({'hit' if hit else 'miss'})")
+    return decision
@@ -0,0 +1,256 @@
+"""
+Opt-in semantic cache for agent responses.
+
+FAQ-style questions ("what is your return policy?", "how do returns
+work?") get near-identical answers, so for agents listed in
+SEMANTIC_CACHE_AGENTS a chat turn first looks for a cached answer to a
+similar question. On a hit, the turn skips collaboration and the LLM call.
+
+Questions are embedded locally with a hashing vectorizer: word unigrams
+and bigrams, plus character trigrams for robustness to typos, are hashed
+into DIMENSIONS buckets with a sign bit, weighted 1 + log(tf) and
+L2-normalized. Nothing is fitted and nothing leaves the process.
+Similarity is cosine. Each agent has its own index, a NumPy matrix when
+numpy is installed and a sparse pure-Python scan otherwise. Answers are
+reused only within the same conversation context: the digest of the
+last few history messages must match exactly, so a follow-up question is
+never answered from a different conversation.
+
+Entries expire after SEMANTIC_CACHE_TTL seconds. Each agent keeps at most
+SEMANTIC_CACHE_MAX_ENTRIES, evicting the least recently used.
+
+Configuration (environment variables):
+    SEMANTIC_CACHE_AGENTS       comma-separated agent names, e.g.
+                                "ShopAssist,AgentHub" (default: none, disabled)
+    SEMANTIC_CACHE_THRESHOLD    minimum cosine similarity for a hit (default 0.85)
+    SEMANTIC_CACHE_TTL          seconds an answer stays valid (default 86400)
+    SEMANTIC_CACHE_MAX_ENTRIES  answers kept per agent (default 1000)
+    SEMANTIC_CACHE_HISTORY      history messages in the context digest (default 2)
+"""
+
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional: falls back to a sparse pure-Python index
+    np = None
+
+from cache import normalize_text
+
+SEMANTIC_CACHE_AGENTS = {
+    name.strip() for name in os.environ.get("SEMANTIC_CACHE_AGENTS", "").split(",") if name.strip()
+}
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_HISTORY = int(os.environ.get("SEMANTIC_CACHE_HISTORY", "2"))
+
+DIMENSIONS = 1024
+_WORD = re.compile(r"\w+")
+
+
+def _features(text: str) -> Counter:
+    words = _WORD.findall(normalize_text(text))
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        features.update(f"#3:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+def embed(text: str) -> Dict[int, float]:
+    """Sparse, L2-normalized hashing-vectorizer embedding {bucket: weight}."""
+    vector: Dict[int, float] = {}
+    for feature, tf in _features(text).items():
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        bucket = value % DIMENSIONS
+        sign = 1.0 if (value >> 63) & 1 else -1.0
+        vector[bucket] = vector.get(bucket, 0.0) + sign * (1.0 + math.log(tf))
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {i: w / norm for i, w in vector.items() if w} if norm else {}
+
+
+def history_digest(history: Optional[List[Dict[str, str]]], depth: int = SEMANTIC_CACHE_HISTORY) -> str:
+    """Digest of the last `depth` history messages (role and normalized content)."""
+    h = hashlib.blake2b(digest_size=16)
+    recent = (history or [])[-depth:] if depth > 0 else []
+    for message in recent:
+        h.update(message.get("role", "").encode())
+        h.update(b"\0")
+        h.update(normalize_text(message.get("content", "")).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@dataclass
+class CacheHit:
+    response: str
+    similarity: float
+    question: str
+    saved_ms: float
+
+
+@dataclass
+class _Entry:
+    question: str
+    context: str
+    response: str
+    vector: Dict[int, float]
+    cost_ms: float
+    expires_at: float
+    last_used: float = field(default_factory=time.monotonic)
+
+
+def _dense(vector: Dict[int, float]):
+    row = np.zeros(DIMENSIONS, dtype=np.float32)
+    for i, w in vector.items():
+        row[i] = w
+    return row
+
+
+class _AgentIndex:
+    """Entries for one agent plus, with numpy, a dense matrix of their vectors."""
+
+    def __init__(self):
+        self.entries: List[_Entry] = []
+        self._matrix = None
+
+    def append(self, entry: _Entry):
+        self.entries.append(entry)
+        if np is not None and self._matrix is not None:
+            self._matrix = np.vstack([self._matrix, _dense(entry.vector)])
+
+    def keep(self, rows: List[int]):
+        """Drop every entry whose position is not in `rows`."""
+        self.entries = [self.entries[i] for i in rows]
+        if np is not None and self._matrix is not None:
+            self._matrix = self._matrix[rows]
+
+    def similarities(self, vector: Dict[int, float]) -> List[float]:
+        if not self.entries:
+            return []
+        if np is not None:
+            if self._matrix is None:
+                self._matrix = np.vstack([_dense(e.vector) for e in self.entries])
+            return (self._matrix @ _dense(vector)).tolist()
+        return [sum(w * entry.vector.get(i, 0.0) for i, w in vector.items()) for entry in self.entries]
+
+
+class SemanticCache:
+    """Per-agent nearest-neighbour cache of agent responses."""
+
+    def __init__(self, agents=(), threshold: float = 0.85, ttl: float = 86400.0, max_entries: int = 1000):
+        self.agents = set(agents)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._indexes: Dict[str, _AgentIndex] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "latency_saved_ms": 0.0,
+            "lookup_ms_total": 0.0,
+        }
+
+    def enabled_for(self, agent_name: str) -> bool:
+        return agent_name in self.agents
+
+    def lookup(self, agent_name: str, question: str, history=None) -> Optional[CacheHit]:
+        """Cached answer to a similar question in the same context, or None."""
+        if not self.enabled_for(agent_name):
+            return None
+        started = time.perf_counter()
+        vector = embed(question)
+        context = history_digest(history)
+        now = time.time()
+        hit = None
+        with self._lock:
+            index = self._indexes.get(agent_name)
+            if index and index.entries:
+                self._expire(index, now)
+                best, best_score = None, self.threshold
+                for entry, score in zip(index.entries, index.similarities(vector)):
+                    if entry.context == context and score >= best_score:
+                        best, best_score = entry, score
+                if best is not None:
+                    best.last_used = time.monotonic()
+                    hit = CacheHit(best.response, best_score, best.question, best.cost_ms)
+            self._stats["lookups"] += 1
+            self._stats["lookup_ms_total"] += (time.perf_counter() - started) * 1000
+            if hit:
+                self._stats["hits"] += 1
+                self._stats["latency_saved_ms"] += hit.saved_ms
+            else:
+                self._stats["misses"] += 1
+        return hit
+
+    def store(self, agent_name: str, question: str, history, response: str, cost_ms: float):
+        """Remember an answer; cost_ms is the latency a future hit will save."""
+        if not self.enabled_for(agent_name) or self.max_entries <= 0:
+            return
+        entry = _Entry(
+            question=question,
+            context=history_digest(history),
+            response=response,
+            vector=embed(question),
+            cost_ms=cost_ms,
+            expires_at=time.time() + self.ttl,
+        )
+        with self._lock:
+            index = self._indexes.setdefault(agent_name, _AgentIndex())
+            self._expire(index, time.time())
+            if len(index.entries) >= self.max_entries:
+                victim = min(range(len(index.entries)), key=lambda i: index.entries[i].last_used)
+                index.keep([i for i in range(len(index.entries)) if i != victim])
+                self._stats["evictions"] += 1
+            index.append(entry)
+            self._stats["stores"] += 1
+
+    def _expire(self, index: _AgentIndex, now: float):
+        # Caller holds self._lock.
+        live = [i for i, e in enumerate(index.entries) if e.expires_at > now]
+        if len(live) != len(index.entries):
+            self._stats["expirations"] += len(index.entries) - len(live)
+            index.keep(live)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "avg_lookup_ms": round(self._stats["lookup_ms_total"] / lookups, 3) if lookups else 0.0,
+                "entries": {agent: len(index.entries) for agent, index in self._indexes.items()},
+                "enabled_agents": sorted(self.agents),
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "backend": "numpy" if np is not None else "python",
+            }
+
+
+response_cache = SemanticCache(
+    agents=SEMANTIC_CACHE_AGENTS,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl=SEMANTIC_CACHE_TTL,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+)
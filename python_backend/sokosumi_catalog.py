@@ -0,0 +1,178 @@
+"""
+Indexed catalog of Sokosumi marketplace agents.
+
+Agent discovery (get_agent, list_agents, matching the agents a
+collaboration plan names) used to scan the agent list on every call.
+SokosumiCatalog serves it from an immutable snapshot with lookup tables
+built once per refresh: by id, by name, by category and by capability.
+Names, categories and capabilities are matched case-insensitively.
+
+The snapshot merges the built-in agent list with the entries fetched from
+the live marketplace; a live entry replaces the built-in one with the
+same id. Live entries are re-fetched when the snapshot is older than
+SOKOSUMI_CATALOG_TTL seconds. The fetch runs on a background thread
+while lookups keep using the current snapshot, so no request waits on
+the marketplace. A failed fetch keeps the last good entries and is
+retried after another TTL.
+
+Configuration (environment variables):
+    SOKOSUMI_CATALOG_TTL  seconds between live marketplace refreshes (default 300)
+"""
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+SOKOSUMI_CATALOG_TTL = float(os.environ.get("SOKOSUMI_CATALOG_TTL", "300"))
+
+DEFAULT_PRICING = {"per_task": 2.50, "currency": "USD"}
+
+# Fields hire_agent, the result simulator, prompts and the marketplace UI
+# read from every agent; live entries may omit any of them.
+AGENT_DEFAULTS = {
+    "category": "Other",
+    "description": "",
+    "did": None,
+    "response_time_avg": "5-10 minutes",
+    "rating": 0.0,
+    "total_jobs": 0,
+    "verified": False,
+}
+
+
+def _key(value: Optional[str]) -> str:
+    return (value or "").strip().casefold()
+
+
+def _normalize(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Live entry with the fields callers rely on, or None if it has no id or name."""
+    if not isinstance(entry, dict) or not entry.get("id") or not entry.get("name"):
+        return None
+    agent = {**AGENT_DEFAULTS, **entry}
+    agent["capabilities"] = list(agent.get("capabilities") or [])
+    agent["pricing"] = {**DEFAULT_PRICING, **(agent.get("pricing") or {})}
+    return agent
+
+
+def _build(agents: Sequence[Dict[str, Any]], version: int, live: int) -> Dict[str, Any]:
+    by_category: Dict[str, List[Dict[str, Any]]] = {}
+    by_capability: Dict[str, List[Dict[str, Any]]] = {}
+    for agent in agents:
+        by_category.setdefault(_key(agent["category"]), []).append(agent)
+        for capability in {_key(c) for c in agent["capabilities"]}:
+            by_capability.setdefault(capability, []).append(agent)
+    return {
+        "version": version,
+        "live": live,
+        "agents": tuple(agents),
+        "by_id": {a["id"]: a for a in agents},
+        "by_name": {_key(a["name"]): a for a in agents},
+        "by_category": {k: tuple(v) for k, v in by_category.items()},
+        "by_capability": {k: tuple(v) for k, v in by_capability.items()},
+    }
+
+
+class SokosumiCatalog:
+    """Read-only marketplace agent catalog with O(1) lookups.
+
+    `fetch_live` returns the live marketplace's agent entries, or None when
+    there is no live marketplace to ask.
+    """
+
+    def __init__(self, seed: Sequence[Dict[str, Any]],
+                 fetch_live: Optional[Callable[[], Optional[List[Dict[str, Any]]]]] = None,
+                 ttl: float = 300.0):
+        self.ttl = ttl
+        self._seed = [a for a in (_normalize(e) for e in seed) if a]
+        self._fetch_live = fetch_live
+        self._snapshot = _build(self._seed, 1, 0)
+        self._fetched_at: Optional[float] = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._stats = {"refreshes": 0, "refresh_errors": 0}
+
+    def _current(self) -> Dict[str, Any]:
+        if self._fetch_live is not None and self._due():
+            with self._lock:
+                start = self._due() and not self._refreshing
+                if start:
+                    self._refreshing = True
+            if start:
+                threading.Thread(target=self._refresh_in_background, name="sokosumi-catalog", daemon=True).start()
+        return self._snapshot
+
+    def _due(self) -> bool:
+        return self._fetched_at is None or time.monotonic() - self._fetched_at >= self.ttl
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh(self) -> bool:
+        """Fetch live entries and rebuild the snapshot; False if the fetch failed."""
+        try:
+            entries = self._fetch_live() if self._fetch_live else None
+        except Exception as e:
+            with self._lock:
+                self._fetched_at = time.monotonic()
+                self._stats["refresh_errors"] += 1
+            print(f"[SokosumiCatalog] Live refresh failed, keeping {len(self._snapshot['agents'])} agents: {e}")
+            return False
+        with self._lock:
+            self._fetched_at = time.monotonic()
+            if entries is not None:
+                merged = {a["id"]: a for a in self._seed}
+                live = [a for a in (_normalize(e) for e in entries) if a]
+                merged.update((a["id"], a) for a in live)
+                self._snapshot = _build(list(merged.values()), self._snapshot["version"] + 1, len(live))
+                self._stats["refreshes"] += 1
+        return True
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        agent = self._current()["by_id"].get(agent_id)
+        return dict(agent) if agent else None
+
+    def get_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        agent = self._current()["by_name"].get(_key(name))
+        return dict(agent) if agent else None
+
+    def _matching(self, category: Optional[str], capability: Optional[str]) -> Sequence[Dict[str, Any]]:
+        snap = self._current()
+        if category and capability:
+            in_category = snap["by_category"].get(_key(category), ())
+            with_capability = snap["by_capability"].get(_key(capability), ())
+            smaller, larger = sorted((in_category, with_capability), key=len)
+            ids = {a["id"] for a in larger}
+            return [a for a in smaller if a["id"] in ids]
+        if category:
+            return snap["by_category"].get(_key(category), ())
+        if capability:
+            return snap["by_capability"].get(_key(capability), ())
+        return snap["agents"]
+
+    def list(self, category: Optional[str] = None, capability: Optional[str] = None,
+             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Agents in catalog order, optionally filtered by category and capability."""
+        agents = self._matching(category, capability)
+        return [dict(a) for a in (agents[:limit] if limit is not None else agents)]
+
+    def count(self, category: Optional[str] = None, capability: Optional[str] = None) -> int:
+        return len(self._matching(category, capability))
+
+    def stats(self) -> Dict[str, Any]:
+        snap = self._snapshot
+        with self._lock:
+            return {
+                **self._stats,
+                "version": snap["version"],
+                "agents": len(snap["agents"]),
+                "live_agents": snap["live"],
+                "categories": len(snap["by_category"]),
+                "capabilities": len(snap["by_capability"]),
+                "last_refresh_age_s": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at is not None else None,
+                "ttl": self.ttl,
+            }
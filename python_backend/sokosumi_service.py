@@ -13,10 +13,18 @@ import json
 from datetime import datetime
 from typing import Optional, Dict, List, Any
 import hashlib
+import hmac
 import random
 
+from job_store import job_store
+from sokosumi_catalog import SokosumiCatalog, SOKOSUMI_CATALOG_TTL
+
 SOKOSUMI_API_URL = os.environ.get("SOKOSUMI_API_URL", "https://app.sokosumi.com")
 SOKOSUMI_API_KEY = os.environ.get("SOKSUMI_API_KEY", "")
+# Key for the HMAC-SHA256 signature the marketplace sends in
+# X-Webhook-Signature on job callbacks (POST /api/sokosumi/webhook).
+# Unset disables the webhook endpoint.
+SOKOSUMI_WEBHOOK_SECRET = os.environ.get("SOKOSUMI_WEBHOOK_SECRET", "")
 
 print(f"[Sokosumi] API Key configured: {bool(SOKOSUMI_API_KEY)}, Length: {len(SOKOSUMI_API_KEY) if SOKOSUMI_API_KEY else 0}")
 
@@ -32,6 +40,25 @@ def get_headers() -> Dict[str, str]:
         "Accept": "application/json"
     }
 
+def verify_webhook_signature(body: bytes, signature: str) -> bool:
+    """
+    Check a webhook callback's signature.
+    
+    Args:
+        body: The raw request body
+        signature: Hex HMAC-SHA256 of the body keyed with
+            SOKOSUMI_WEBHOOK_SECRET, optionally prefixed with "sha256="
+    
+    Returns:
+        True if a secret is configured and the signature matches
+    """
+    if not SOKOSUMI_WEBHOOK_SECRET or not signature:
+        return False
+    if signature.startswith("sha256="):
+        signature = signature[len("sha256="):]
+    expected = hmac.new(SOKOSUMI_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature.strip().lower(), expected)
+
 def generate_job_id() -> str:
     """Generate a unique job ID."""
     timestamp = datetime.now().isoformat()
@@ -145,31 +172,53 @@ SIMULATED_SOKOSUMI_AGENTS = [
     }
 ]
 
-ACTIVE_JOBS: Dict[str, Dict] = {}
+def fetch_marketplace_agents() -> Optional[List[Dict]]:
+    """
+    Fetch the agents listed on the live Sokosumi marketplace.
+    
+    Returns:
+        List of agent entries, or None when no API key is configured
+    """
+    if not SOKOSUMI_API_KEY:
+        return None
+    response = requests.get(
+        f"{SOKOSUMI_API_URL}/api/agents",
+        headers=get_headers(),
+        timeout=10
+    )
+    response.raise_for_status()
+    data = response.json()
+    if isinstance(data, dict):
+        data = data.get("agents") or data.get("data") or []
+    return data
+
+catalog = SokosumiCatalog(
+    SIMULATED_SOKOSUMI_AGENTS,
+    fetch_live=fetch_marketplace_agents,
+    ttl=SOKOSUMI_CATALOG_TTL
+)
 
-def list_agents(category: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+def list_agents(category: Optional[str] = None, limit: int = 10,
+                capability: Optional[str] = None) -> Dict[str, Any]:
     """
     List available agents on the Sokosumi marketplace.
     
     Args:
         category: Filter by category (Research, Analysis, Design/UX, Security)
         limit: Maximum number of agents to return
+        capability: Filter by capability (e.g. "keyword analysis")
     
     Returns:
         Dict containing agents list and metadata
     """
     live_mode = is_live()
     
-    agents = SIMULATED_SOKOSUMI_AGENTS
-    if category:
-        agents = [a for a in agents if a["category"].lower() == category.lower()]
-    
     return {
         "success": True,
         "is_live": live_mode,
         "is_simulated": False,
-        "agents": agents[:limit],
-        "total": len(agents),
+        "agents": catalog.list(category, capability, limit),
+        "total": catalog.count(category, capability),
         "source": "sokosumi_masumi" if live_mode else "sokosumi"
     }
 
@@ -185,15 +234,15 @@ def get_agent(agent_id: str) -> Dict[str, Any]:
     """
     live_mode = is_live()
     
-    for agent in SIMULATED_SOKOSUMI_AGENTS:
-        if agent["id"] == agent_id:
-            return {
-                "success": True,
-                "is_live": live_mode,
-                "is_simulated": False,
-                "agent": agent,
-                "source": "sokosumi_masumi" if live_mode else "sokosumi"
-            }
+    agent = catalog.get(agent_id)
+    if agent:
+        return {
+            "success": True,
+            "is_live": live_mode,
+            "is_simulated": False,
+            "agent": agent,
+            "source": "sokosumi_masumi" if live_mode else "sokosumi"
+        }
     
     return {
         "success": False,
@@ -238,7 +287,7 @@ def hire_agent(agent_id: str, task_description: str, requester_agent: Optional[s
         "result": generate_simulated_result({"agent_id": agent_id, "task": task_description})
     }
     
-    ACTIVE_JOBS[job_id] = job
+    job = job_store.put(job)
     
     return {
         "success": True,
@@ -254,7 +303,7 @@ def hire_agent(agent_id: str, task_description: str, requester_agent: Optional[s
                 "description": f"Task initiated via Sokosumi marketplace",
                 "details": {
                     "agent_id": agent_id,
-                    "agent_did": agent["did"],
+                    "agent_did": agent.get("did"),
                     "cost": f"${agent['pricing']['per_task']} USD",
                     "job_id": job_id
                 },
@@ -291,17 +340,18 @@ def get_job_status(job_id: str) -> Dict[str, Any]:
     """
     live_mode = is_live()
     
-    if job_id not in ACTIVE_JOBS:
+    job = job_store.get(job_id)
+    if job is None:
         return {"success": False, "error": "Job not found"}
     
-    job = ACTIVE_JOBS[job_id]
-    
     if job["status"] == "processing":
-        job["status"] = "completed"
-        job["completed_at"] = datetime.now().isoformat()
-        job["result"] = generate_simulated_result(job)
-        job["is_simulated"] = False
-        ACTIVE_JOBS[job_id] = job
+        job = job_store.update(
+            job_id,
+            status="completed",
+            completed_at=datetime.now().isoformat(),
+            result=generate_simulated_result(job),
+            is_simulated=False
+        ) or job
     
     return {
         "success": True,
@@ -311,6 +361,30 @@ def get_job_status(job_id: str) -> Dict[str, Any]:
         "source": "sokosumi_masumi" if live_mode else "sokosumi"
     }
 
+def update_job(job_id: str, status: str, result: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Apply a job update pushed by the marketplace (webhook callback).
+    
+    Args:
+        job_id: The job ID to update
+        status: New job status
+        result: Job result, if the update carries one
+    
+    Returns:
+        Dict containing the updated job
+    """
+    fields = {"status": status}
+    if result is not None:
+        fields["result"] = result
+    if status == "completed":
+        fields["completed_at"] = datetime.now().isoformat()
+    
+    job = job_store.update(job_id, **fields)
+    if job is None:
+        return {"success": False, "error": "Job not found"}
+    
+    return {"success": True, "job": job}
+
 def generate_simulated_result(job: Dict) -> Dict[str, Any]:
     """Generate a simulated result based on the agent type and task."""
     agent_id = job.get("agent_id", "")
@@ -367,12 +441,30 @@ def generate_simulated_result(job: Dict) -> Dict[str, Any]:
             "data": {"analysis": "Complete", "quality_score": 0.88}
         }
 
-def list_active_jobs() -> Dict[str, Any]:
-    """List all active jobs."""
+def list_active_jobs(requester: Optional[str] = None, status: Optional[str] = None,
+                     limit: int = 20, before: Optional[str] = None) -> Dict[str, Any]:
+    """
+    List jobs, newest first, one page at a time.
+    
+    Args:
+        requester: Only jobs hired by this AgentHub agent
+        status: Only jobs in this status
+        limit: Maximum number of jobs to return
+        before: Cursor from a previous page's next_cursor
+    
+    Returns:
+        Dict containing the page of jobs, the total matching the filters
+        and next_cursor (None on the last page)
+    
+    Raises:
+        ValueError: If `before` is not a valid cursor
+    """
+    jobs, next_cursor = job_store.list(requester, status, limit, before)
     return {
         "success": True,
-        "jobs": list(ACTIVE_JOBS.values()),
-        "total": len(ACTIVE_JOBS)
+        "jobs": jobs,
+        "total": job_store.count(requester, status),
+        "next_cursor": next_cursor
     }
 
 def get_account_info() -> Dict[str, Any]:
@@ -0,0 +1,173 @@
+"""
+Rolling conversation summaries.
+
+Agent prompts carry at most the last 10 raw messages, and prompt_budget
+may keep fewer. Everything older used to be dropped. Instead, once a
+conversation has more than SUMMARY_TRIGGER_MESSAGES messages that the
+stored summary does not cover, a background worker folds all but the
+newest SUMMARY_KEEP_RECENT of them into the summary with a small model and
+saves it in conversation_summaries. Chat turns read the summary and only
+the messages after it, so the prompt stays short however long the chat
+gets.
+
+Messages are folded oldest first, at most SUMMARY_FOLD_TOKENS of transcript
+per model call, and a pass keeps folding until no more than
+SUMMARY_TRIGGER_MESSAGES remain unsummarized. A conversation that was
+already long when summaries were introduced is therefore summarized from
+its first message, not from an arbitrary recent cut-off.
+
+Summarization runs off the request path and at most once at a time per
+conversation. If it fails, the next turn simply tries again.
+
+Configuration (environment variables):
+    SUMMARY_TRIGGER_MESSAGES  unsummarized messages before folding (default 10, 0 disables)
+    SUMMARY_KEEP_RECENT       newest messages left out of the summary (default 4)
+    SUMMARY_MAX_TOKENS        cap on the stored summary (default 400)
+    SUMMARY_MODEL             chat model used for summaries (default gpt-4o-mini)
+    SUMMARY_WORKERS           background summarizer threads (default 2)
+    SUMMARY_FOLD_TOKENS       transcript tokens folded per model call (default 6000)
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from llm_clients import get_chat_model
+from llm_scheduler import llm_scheduler, Priority
+from models import ConversationSummaryModel, MessageModel
+from prompt_budget import PROMPT_MESSAGE_TOKENS, count_tokens, truncate_to_tokens
+
+SUMMARY_TRIGGER_MESSAGES = int(os.environ.get("SUMMARY_TRIGGER_MESSAGES", "10"))
+SUMMARY_KEEP_RECENT = int(os.environ.get("SUMMARY_KEEP_RECENT", "4"))
+SUMMARY_MAX_TOKENS = int(os.environ.get("SUMMARY_MAX_TOKENS", "400"))
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "2"))
+SUMMARY_FOLD_TOKENS = int(os.environ.get("SUMMARY_FOLD_TOKENS", "6000"))
+
+# Unsummarized messages read per fold, oldest first.
+SUMMARY_SCAN_LIMIT = 200
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a user and the AI agents of the AgentHub platform.
+Update the current summary with the new messages. Keep facts the user shared, their goals and preferences, decisions, figures and recommendations given, and open questions. Drop greetings and filler.
+Write plain prose in the third person, at most {words} words. Respond with the updated summary only."""
+
+
+def _transcript_line(message: Dict[str, Any]) -> str:
+    speaker = "User" if message["sender"] == "user" else (message.get("agent_name") or "Agent")
+    return f"{speaker}: {truncate_to_tokens(message['content'], PROMPT_MESSAGE_TOKENS)}"
+
+
+def _fold_prefix(messages: List[Dict[str, Any]], max_tokens: int) -> List[Dict[str, Any]]:
+    """The oldest messages whose transcript fits in max_tokens (at least one)."""
+    total = 0
+    for i, message in enumerate(messages):
+        total += count_tokens(_transcript_line(message))
+        if total > max_tokens and i > 0:
+            return messages[:i]
+    return messages
+
+
+class ConversationSummarizer:
+    """Background worker that folds old turns into each conversation's summary."""
+
+    def __init__(self, trigger: int = 10, keep_recent: int = 4, max_tokens: int = 400,
+                 model: str = "gpt-4o-mini", workers: int = 2):
+        self.trigger = trigger
+        self.keep_recent = keep_recent
+        self.max_tokens = max_tokens
+        self.model = model
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarizer")
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "already_running": 0, "summarized": 0,
+                       "messages_folded": 0, "superseded": 0, "failed": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def schedule(self, conversation_id: str, unsummarized: int):
+        """Queue a summary pass if `unsummarized` messages exceed the trigger."""
+        if self.trigger <= 0 or unsummarized <= self.trigger:
+            return
+        with self._lock:
+            if conversation_id in self._inflight:
+                self._stats["already_running"] += 1
+                return
+            self._inflight.add(conversation_id)
+            self._stats["scheduled"] += 1
+        self._executor.submit(self._run, conversation_id)
+
+    def _run(self, conversation_id: str):
+        try:
+            self.summarize(conversation_id)
+        except Exception as e:
+            self._count("failed")
+            print(f"[Summarizer] Failed for conversation {conversation_id}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard(conversation_id)
+
+    def summarize(self, conversation_id: str) -> bool:
+        """Fold old unsummarized messages into the summary, oldest first, until
+        at most `trigger` remain; True if it changed."""
+        changed = False
+        while self._fold_next(conversation_id):
+            changed = True
+        return changed
+
+    def _fold_next(self, conversation_id: str) -> bool:
+        """Fold the oldest unsummarized messages; False when there is nothing to fold."""
+        existing = ConversationSummaryModel.get(conversation_id)
+        after = (existing["through_created_at"], existing["through_id"]) if existing else None
+        window = MessageModel.get_after(conversation_id, after, SUMMARY_SCAN_LIMIT + self.keep_recent)
+        if len(window) <= self.trigger:
+            return False
+        if len(window) == SUMMARY_SCAN_LIMIT + self.keep_recent:
+            # More may follow; the newest keep_recent are at least these.
+            foldable = window[:SUMMARY_SCAN_LIMIT]
+        else:
+            foldable = window[:len(window) - self.keep_recent] if self.keep_recent > 0 else window
+        if not foldable:
+            return False
+        fold = _fold_prefix(foldable, SUMMARY_FOLD_TOKENS)
+
+        llm = get_chat_model(self.model, temperature=0)
+        response = llm_scheduler.invoke(llm, [
+            SystemMessage(content=SUMMARY_PROMPT.format(words=int(self.max_tokens * 0.75))),
+            HumanMessage(content=f"Current summary:\n{existing['summary'] if existing else '(none yet)'}\n\n"
+                                 f"New messages:\n" + "\n".join(_transcript_line(m) for m in fold)),
+        ], Priority.BACKGROUND)
+        summary = truncate_to_tokens(response.content.strip(), self.max_tokens)
+
+        last = fold[-1]
+        message_count = (existing["message_count"] if existing else 0) + len(fold)
+        if not ConversationSummaryModel.save(conversation_id, summary, last["created_at"], last["id"], message_count):
+            self._count("superseded")
+            return False
+        self._count("summarized")
+        self._count("messages_folded", len(fold))
+        print(f"[Summarizer] Folded {len(fold)} messages into the summary of {conversation_id}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": len(self._inflight),
+                "trigger": self.trigger,
+                "keep_recent": self.keep_recent,
+                "model": self.model,
+            }
+
+
+conversation_summarizer = ConversationSummarizer(
+    trigger=SUMMARY_TRIGGER_MESSAGES,
+    keep_recent=SUMMARY_KEEP_RECENT,
+    max_tokens=SUMMARY_MAX_TOKENS,
+    model=SUMMARY_MODEL,
+    workers=SUMMARY_WORKERS,
+)
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """The Flask app module; needs a Postgres database in DATABASE_URL."""
+    if not os.environ.get("DATABASE_URL"):
+        pytest.skip("DATABASE_URL is not set")
+    import app
+    return app
+
+
+@pytest.fixture
+def turn_writes(app_module, monkeypatch):
+    """Record the decision logs and transactions chat() adds to its unit of work."""
+    writes = {"decision_logs": [], "transactions": []}
+
+    class RecordingUnitOfWork(app_module.UnitOfWork):
+        def add_decision_log(self, *args, **kwargs):
+            writes["decision_logs"].append(kwargs)
+            return super().add_decision_log(*args, **kwargs)
+
+        def add_transaction(self, *args, **kwargs):
+            writes["transactions"].append(kwargs)
+            return super().add_transaction(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, "UnitOfWork", RecordingUnitOfWork)
+    return writes
+
+
+@pytest.fixture
+def post_chat(app_module):
+    """POST /api/chat in a new conversation; returns the JSON response."""
+    client = app_module.app.test_client()
+
+    def post(message, **fields):
+        conversation = client.post("/api/conversations", json={}).get_json()
+        response = client.post("/api/chat", json={"conversationId": conversation["id"], "message": message, **fields})
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    return post
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import (
+    decode_cursor,
+    decode_feed_cursor,
+    encode_cursor,
+    encode_feed_cursor,
+    feed_cursor,
+    feed_position,
+)
+
+
+def test_cursor_round_trip():
+    record = {"created_at": datetime(2026, 3, 1, 12, 30, 5, 123456, tzinfo=timezone.utc), "id": "a|b"}
+    assert decode_cursor(encode_cursor(record)) == (record["created_at"], "a|b")
+
+
+def test_cursor_round_trip_other_column():
+    updated_at = datetime(2026, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=2)))
+    record = {"updated_at": updated_at, "id": "conv-1"}
+    assert decode_cursor(encode_cursor(record, "updated_at")) == (updated_at, "conv-1")
+
+
+def test_feed_cursor_round_trip():
+    assert decode_feed_cursor(encode_feed_cursor(9_000_000_001, 42)) == (9_000_000_001, 42)
+    # xid8 values come back from psycopg2 as text.
+    record = {"xid": "775", "seq": 3}
+    assert decode_feed_cursor(feed_cursor(record)) == feed_position(record) == (775, 3)
+
+
+def test_feed_position_orders_by_xid_first():
+    rows = [{"xid": "10", "seq": 5}, {"xid": "9", "seq": 7}, {"xid": "10", "seq": 4}]
+    assert max(rows, key=feed_position) == {"xid": "10", "seq": 5}
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_feed_cursor(1, 2)])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("cursor", ["", "c2VxOjU", encode_cursor({"created_at": datetime.now(), "id": "x"})])
+def test_malformed_feed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_feed_cursor(cursor)
+
+
+def test_latest_cursor_only_on_first_and_since_pages(app_module):
+    rows = [
+        {"id": "b", "created_at": datetime(2026, 3, 1, 12, 1), "xid": "12", "seq": 8},
+        {"id": "a", "created_at": datetime(2026, 3, 1, 12, 0), "xid": "11", "seq": 9},
+    ]
+    start = encode_feed_cursor(10, 0)
+    with app_module.app.test_request_context():
+        first = app_module.paginated_response(rows, 2, latest=start)
+        since = app_module.paginated_response(rows, 2, since=start)
+        empty = app_module.paginated_response([], 2, since=start)
+        older = app_module.paginated_response(rows, 2, before=encode_cursor(rows[0]))
+
+    assert first.headers["X-Latest-Cursor"] == start
+    assert decode_cursor(first.headers["X-Next-Cursor"]) == (rows[1]["created_at"], "a")
+    assert decode_feed_cursor(since.headers["X-Latest-Cursor"]) == (12, 8)
+    assert empty.headers["X-Latest-Cursor"] == start
+    assert "X-Latest-Cursor" not in older.headers
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+import agent_collaboration
+from agent_collaboration import _PendingJob, _job_result, get_collaboration_summary
+from agents import AGENT_DEFINITIONS
+
+REC = {"agent_name": "Sentiment Detector Pro", "agent_details": {"id": "sok_1", "pricing": {"per_task": 3.0}}}
+
+
+class _Events:
+    def __init__(self):
+        self.closed = None
+
+    def emit(self, event_type, data):
+        pass
+
+    def close(self, event_type=None, data=None):
+        self.closed = data
+        return True
+
+
+def _result(job_status):
+    events = _Events()
+    pending = _PendingJob("job_1", {"blockchain_tx": "tx_1"}, time.perf_counter())
+    return _job_result(REC, "question", events, pending, job_status), events.closed
+
+
+def test_completed_job_carries_result_and_cost():
+    result, event = _result({"status": "completed", "result": {"score": 0.8}})
+    assert result["status"] == event["status"] == "completed"
+    assert result["result"] == {"score": 0.8}
+    assert result["cost"] == 3.0
+    assert "error" not in result
+
+
+@pytest.mark.parametrize("status", ["failed", "cancelled", "error"])
+def test_unsuccessful_job_keeps_its_status(status):
+    result, event = _result({"status": status, "result": {"partial": True}})
+    assert result["status"] == event["status"] == status
+    assert result["result"] is None
+    assert result["cost"] == event["cost"] == 0
+    assert result["error"]
+
+
+def test_job_that_never_finished_counts_as_failed():
+    result, _ = _result({"status": "processing"})
+    assert result["status"] == "failed"
+    assert result["cost"] == 0
+
+
+def test_summary_counts_only_completed_hires():
+    summary = get_collaboration_summary([
+        {"agent_name": "A", "status": "failed", "cost": 0},
+        {"agent_name": "B", "status": "timed_out", "cost": 0},
+    ])
+    assert summary["agents_hired"] == 2
+    assert summary["successful_hires"] == 0
+    assert summary["total_cost_usd"] == 0
+
+    summary = get_collaboration_summary([
+        {"agent_name": "A", "status": "completed", "cost": 3.0},
+        {"agent_name": "B", "status": "cancelled", "cost": 0},
+    ])
+    assert summary["successful_hires"] == 1
+    assert summary["total_cost_usd"] == 3.0
+
+
+def test_rejected_hire_is_failed_and_free(monkeypatch):
+    monkeypatch.setattr(agent_collaboration.sokosumi_service, "hire_agent",
+                        lambda **kwargs: {"success": False, "error": "Agent not found"})
+    events = _Events()
+    result = agent_collaboration._hire_one(
+        {**REC, "agent_id": "sok_1", "task_description": "t"}, "question", "TradeMind", events
+    )
+    assert result["status"] == events.closed["status"] == "failed"
+    assert result["cost"] == 0
+    assert result["error"] == "Agent not found"
+
+
+def test_chat_pays_only_completed_hires(app_module, monkeypatch, post_chat, turn_writes):
+    agent = AGENT_DEFINITIONS[0]["name"]
+    hires = [
+        {"agent_name": "Done Agent", "status": "completed", "cost": 3.0, "job_id": "job_ok"},
+        {"agent_name": "Cancelled Agent", "status": "cancelled", "cost": 0, "job_id": "job_cancelled",
+         "error": "Job cancelled"},
+        {"agent_name": "Slow Agent", "status": "timed_out", "cost": 0, "error": "No result within 30s"},
+    ]
+    monkeypatch.setattr(app_module, "execute_collaboration", lambda **kwargs: (True, hires, "context"))
+    monkeypatch.setattr(app_module, "get_agent_response", lambda **kwargs: "Answer.")
+
+    result = post_chat("How do people feel about our launch?", agentName=agent)
+
+    hire_logs = [log for log in turn_writes["decision_logs"] if log["action"].startswith("Hired")]
+    assert [log["status"] for log in hire_logs] == ["confirmed", "failed", "failed"]
+    paid = [tx["to_agent_name"] for tx in turn_writes["transactions"]]
+    assert paid == ["Done Agent", agent]
+    assert result["collaboration"]["successful_hires"] == 1
@@ -0,0 +1,86 @@
+import pytest
+
+from agents import AGENT_DEFINITIONS, AgentResponseError, ERROR_RESPONSE_PREFIX
+from semantic_cache import SemanticCache
+
+AGENT = AGENT_DEFINITIONS[0]["name"]
+HISTORY = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(agents={AGENT}, threshold=0.7)
+
+
+def test_similar_question_hits(cache):
+    cache.store(AGENT, "What is your return policy?", HISTORY, "30 days.", cost_ms=900)
+    hit = cache.lookup(AGENT, "what is your return policy", HISTORY)
+    assert hit is not None
+    assert hit.response == "30 days."
+    assert hit.similarity >= 0.7
+
+
+def test_unrelated_question_misses(cache):
+    cache.store(AGENT, "What is your return policy?", HISTORY, "30 days.", cost_ms=900)
+    assert cache.lookup(AGENT, "Schedule a post about our product launch", HISTORY) is None
+
+
+def test_different_context_misses(cache):
+    cache.store(AGENT, "What is your return policy?", HISTORY, "30 days.", cost_ms=900)
+    assert cache.lookup(AGENT, "What is your return policy?", []) is None
+
+
+def test_disabled_agent_is_not_cached(cache):
+    cache.store("SomeOtherAgent", "What is your return policy?", HISTORY, "30 days.", cost_ms=900)
+    assert cache.lookup("SomeOtherAgent", "What is your return policy?", HISTORY) is None
+    assert cache.stats()["stores"] == 0
+
+
+# chat() integration; the LLM is stubbed.
+
+@pytest.fixture
+def chat_cache(app_module, monkeypatch):
+    cache = SemanticCache(agents={AGENT}, threshold=0.7)
+    monkeypatch.setattr(app_module, "response_cache", cache)
+    return cache
+
+
+def test_chat_stores_answer_and_hit_skips_llm(app_module, monkeypatch, chat_cache, post_chat):
+    calls = []
+
+    def answer(**kwargs):
+        calls.append(kwargs["user_message"])
+        return "Returns are accepted within 30 days."
+
+    monkeypatch.setattr(app_module, "get_agent_response", answer)
+    first = post_chat("What is your return policy?", agentName=AGENT, enableCollaboration=False)
+    second = post_chat("what is your return policy", agentName=AGENT, enableCollaboration=False)
+
+    assert calls == ["What is your return policy?"]
+    assert first["agentMessage"]["content"] == second["agentMessage"]["content"]
+    assert chat_cache.stats()["hits"] == 1
+
+
+def test_chat_does_not_store_error_response(app_module, monkeypatch, chat_cache, post_chat, turn_writes):
+    monkeypatch.setattr(app_module, "get_agent_response",
+                        lambda **kwargs: f"{ERROR_RESPONSE_PREFIX} rate limited. Please try again.")
+    result = post_chat("What is your return policy?", agentName=AGENT, enableCollaboration=False)
+
+    assert result["responseInterrupted"] is True
+    assert chat_cache.stats()["stores"] == 0
+    assert turn_writes["transactions"] == []
+    assert [log["status"] for log in turn_writes["decision_logs"]] == ["failed"]
+
+
+def test_chat_does_not_store_interrupted_stream(app_module, monkeypatch, chat_cache, post_chat, turn_writes):
+    def interrupted(**kwargs):
+        yield "Returns are accepted "
+        raise AgentResponseError("connection reset", partial="Returns are accepted ")
+
+    monkeypatch.setattr(app_module, "stream_agent_response", interrupted)
+    result = post_chat("What is your return policy?", agentName=AGENT, enableCollaboration=False, stream=True)
+
+    assert result["responseInterrupted"] is True
+    assert result["agentMessage"]["content"].startswith(ERROR_RESPONSE_PREFIX)
+    assert chat_cache.stats()["stores"] == 0
+    assert turn_writes["transactions"] == []
@@ -0,0 +1,313 @@
+"""
+Write-behind queue for audit records.
+
+Decision logs and transactions are not needed to answer the user, so chat
+turns hand them to a bounded in-process queue instead of inserting them
+inline. A background flusher drains the queue and batch-inserts each table
+with a single execute_values statement.
+
+When the queue is full or the database is unavailable, the rows are
+appended to a JSON-lines spill file on disk and replayed once the database
+accepts writes again. Inserts use ON CONFLICT (id) DO NOTHING, so replaying
+a batch that was partly written is harmless. Everything still queued is
+flushed when the interpreter exits.
+
+A batch that Postgres rejects because of its data (a constraint or type
+violation) is retried row by row; rows that are rejected on their own are
+appended to a dead-letter file for inspection and never retried, so one
+bad row cannot hold back the rest.
+
+Configuration (environment variables):
+    WRITE_BEHIND_QUEUE_SIZE      maximum queued rows (default 10000)
+    WRITE_BEHIND_BATCH_SIZE      rows per flush (default 500)
+    WRITE_BEHIND_RETRY_INTERVAL  seconds between spill replays after a
+                                 database failure (default 5)
+    WRITE_BEHIND_SPILL_PATH      spill file location
+    WRITE_BEHIND_DEAD_LETTER_PATH  file for rows Postgres rejects
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from models import db_cursor, bulk_insert
+
+WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_RETRY_INTERVAL = float(os.environ.get("WRITE_BEHIND_RETRY_INTERVAL", "5"))
+WRITE_BEHIND_SPILL_PATH = os.environ.get(
+    "WRITE_BEHIND_SPILL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "write_behind_spill.jsonl")
+)
+WRITE_BEHIND_DEAD_LETTER_PATH = os.environ.get(
+    "WRITE_BEHIND_DEAD_LETTER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "write_behind_dead_letter.jsonl")
+)
+
+# Tables that may be written behind, in insert order.
+AUDIT_TABLES = ("decision_logs", "transactions")
+
+# Errors caused by the rows themselves; retrying them never succeeds.
+REJECTED_ERRORS = (psycopg2.IntegrityError, psycopg2.DataError)
+
+
+def _encode_row(table: str, row: Dict[str, Any], error: Optional[str] = None) -> str:
+    def default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+    entry = {"table": table, "row": row}
+    if error is not None:
+        entry["error"] = error
+    return json.dumps(entry, default=default)
+
+
+def _decode_row(line: str) -> Tuple[str, Dict[str, Any]]:
+    entry = json.loads(line)
+    row = entry["row"]
+    if isinstance(row.get("created_at"), str):
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return entry["table"], row
+
+
+class WriteBehindQueue:
+    """Bounded queue plus background flusher for audit table inserts."""
+
+    def __init__(self, maxsize: int = 10000, batch_size: int = 500,
+                 retry_interval: float = 5.0, spill_path: Optional[str] = None,
+                 dead_letter_path: Optional[str] = None):
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path
+
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue(maxsize=maxsize)
+        self._spill_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._last_failure = 0.0
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "dead_lettered": 0,
+            "failed_flushes": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def start(self):
+        """Start the flusher thread (idempotent) and replay any spilled rows."""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def submit(self, table: str, row: Dict[str, Any]):
+        """Queue a row for insertion; spill it to disk if the queue is full."""
+        if table not in AUDIT_TABLES:
+            raise ValueError(f"{table} is not a write-behind table")
+        self._count("submitted")
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            self._spill([(table, row)])
+
+    def flush(self) -> int:
+        """Write one batch from the queue. Returns the number of rows taken."""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+        return len(batch)
+
+    def shutdown(self, timeout: float = 10.0):
+        """Stop the flusher and write (or spill) everything still queued."""
+        self._stop.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        while self.flush():
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            counters = dict(self._stats)
+        return {
+            **counters,
+            "queued": self._queue.qsize(),
+            "spill_pending": self._spill_files_exist(),
+        }
+
+    def _run(self):
+        self._replay_spill()
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.retry_interval)
+            except queue.Empty:
+                first = None
+            if first is not None:
+                batch = [first]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._write(batch)
+            if time.monotonic() - self._last_failure >= self.retry_interval:
+                self._replay_spill()
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        with self._flush_lock:
+            try:
+                self._count("written", self._store(batch))
+            except Exception as e:
+                print(f"[WriteBehind] Flush of {len(batch)} rows failed, spilling to disk: {e}")
+                self._count("failed_flushes")
+                self._last_failure = time.monotonic()
+                self._spill(batch)
+
+    def _store(self, batch: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Insert a batch, dead-lettering rows Postgres rejects. Returns rows written.
+
+        Any other error (the database being unreachable) is raised, and the
+        caller keeps the whole batch for a later retry.
+        """
+        try:
+            self._insert(batch)
+            return len(batch)
+        except REJECTED_ERRORS as e:
+            if len(batch) == 1:
+                self._dead_letter(batch[0], e)
+                return 0
+        written = 0
+        for item in batch:
+            try:
+                self._insert([item])
+                written += 1
+            except REJECTED_ERRORS as e:
+                self._dead_letter(item, e)
+        return written
+
+    def _insert(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        by_table: Dict[str, List[Dict[str, Any]]] = {table: [] for table in AUDIT_TABLES}
+        for table, row in batch:
+            by_table[table].append(row)
+        with db_cursor(commit=True) as cur:
+            for table in AUDIT_TABLES:
+                if by_table[table]:
+                    bulk_insert(cur, table, by_table[table])
+
+    def _spill(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        if not self.spill_path:
+            print(f"[WriteBehind] No spill file configured, dropping {len(batch)} rows")
+            return
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for table, row in batch:
+                        f.write(_encode_row(table, row) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._count("spilled", len(batch))
+        except OSError as e:
+            print(f"[WriteBehind] Could not spill {len(batch)} rows: {e}")
+
+    def _dead_letter(self, item: Tuple[str, Dict[str, Any]], error: Exception):
+        table, row = item
+        reason = str(error).strip()
+        print(f"[WriteBehind] {table} row {row.get('id')} rejected, dead-lettering: {reason.splitlines()[0] if reason else error!r}")
+        self._count("dead_lettered")
+        if not self.dead_letter_path:
+            return
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(_encode_row(table, row, reason) + "\n")
+        except OSError as e:
+            print(f"[WriteBehind] Could not dead-letter {table} row {row.get('id')}: {e}")
+
+    def _spill_files_exist(self) -> bool:
+        return bool(self.spill_path) and (
+            os.path.exists(self.spill_path) or os.path.exists(self.spill_path + ".replaying")
+        )
+
+    def _replay_spill(self):
+        """Move the spill file aside and insert its rows in batches."""
+        if not self._spill_files_exist():
+            return
+        replaying = self.spill_path + ".replaying"
+        with self._spill_lock:
+            # A leftover .replaying file means an earlier replay failed;
+            # finish that one before taking the current spill file.
+            if not os.path.exists(replaying):
+                os.replace(self.spill_path, replaying)
+        with self._flush_lock:
+            try:
+                with open(replaying, encoding="utf-8") as f:
+                    rows = [_decode_row(line) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                print(f"[WriteBehind] Could not read spill file, will retry: {e}")
+                self._last_failure = time.monotonic()
+                return
+            written = 0
+            for i in range(0, len(rows), self.batch_size):
+                try:
+                    written += self._store(rows[i:i + self.batch_size])
+                except Exception as e:
+                    print(f"[WriteBehind] Spill replay failed, will retry: {e}")
+                    self._last_failure = time.monotonic()
+                    # Keep only the rows not handled yet, so rows written or
+                    # dead-lettered so far are not processed again.
+                    self._rewrite_replaying(replaying, rows[i:])
+                    self._count("replayed", written)
+                    return
+            os.remove(replaying)
+            self._count("replayed", written)
+            if rows:
+                print(f"[WriteBehind] Replayed {written} of {len(rows)} spilled rows")
+
+    def _rewrite_replaying(self, replaying: str, rows: List[Tuple[str, Dict[str, Any]]]):
+        try:
+            tmp = replaying + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for table, row in rows:
+                    f.write(_encode_row(table, row) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, replaying)
+        except OSError as e:
+            print(f"[WriteBehind] Could not trim spill file: {e}")
+
+
+audit_queue = WriteBehindQueue(
+    maxsize=WRITE_BEHIND_QUEUE_SIZE,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    retry_interval=WRITE_BEHIND_RETRY_INTERVAL,
+    spill_path=WRITE_BEHIND_SPILL_PATH,
+    dead_letter_path=WRITE_BEHIND_DEAD_LETTER_PATH,
+)